@@ -0,0 +1,30 @@
+"""
+Dedicated AI job worker pool.
+
+Runs OpenAI jobs from the shared AIJob queue in a separate process, so the
+gunicorn workers only ever enqueue and poll. Start the web app with
+AI_JOB_WORKERS=0 and run:  python ai_worker.py [thread_count]
+"""
+import os
+import sys
+import time
+
+thread_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+# Importing app auto-starts the Telegram bot and embedded workers — this
+# process must do neither (a second bot would fight over getUpdates).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, logger
+from services import ai_jobs
+
+
+if __name__ == '__main__':
+    ai_jobs.start_workers(app, count=thread_count)
+    logger.info("AI worker pool running with %s thread(s). Ctrl+C to stop.", thread_count)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -44,7 +44,7 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     "pool_pre_ping": True,
 }
 
-from models import db, User, ExclusiveTitle, AdminLog
+from models import db, User, ExclusiveTitle, AdminLog, AIJob
 db.init_app(app)
 
 # Create database tables + enable WAL mode for SQLite (C-06)
@@ -59,6 +59,10 @@ with app.app_context():
         except Exception as e:
             logger.warning("Could not enable SQLite WAL mode: %s", e)
 
+    # Trigram index behind the admin user search (no-op once it exists)
+    from services import user_search
+    user_search.ensure_index()
+
     # ── Super Admin Auto-Promotion ────────────────────────────────────────
     super_admin_email = os.environ.get('SUPER_ADMIN_EMAIL')
     if super_admin_email:
@@ -130,8 +134,33 @@ def start_bot_thread():
     logger.info("🤖 Telegram bot thread started")
 
 
+# ── AI Job Workers (run OpenAI calls off the request threads) ───────────────
+def start_ai_workers():
+    """Start the in-process AI job worker threads (AI_JOB_WORKERS, 0 = off).
+    Set AI_JOB_WORKERS=0 when running the dedicated `python ai_worker.py` pool."""
+    from services import ai_jobs
+    with app.app_context():
+        try:
+            ai_jobs.recover_stale_jobs()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("AI job recovery skipped: %s", e)
+    ai_jobs.start_workers(app)
+
+
+def start_scheduler():
+    """Start the periodic task scheduler (SCHEDULER_ENABLED=0 = off).
+    Tasks are leased in the database, so each runs once across all processes."""
+    from services import scheduler
+    # Importing a service module registers its periodic tasks
+    from services import daily_pregen, wellbeing_pool, quiz_cache, explanation_cache, chat_context, xp_ledger  # noqa: F401
+    scheduler.start(app)
+
+
 # Auto-start bot when module is loaded (works with both `python app.py` and `gunicorn app:app`)
 start_bot_thread()
+start_ai_workers()
+start_scheduler()
 
 if __name__ == '__main__':
     # C-04: debug=False for production safety
@@ -0,0 +1,104 @@
+"""
+Benchmark: concurrent XP awards to a single user.
+Run: python bench_awards.py [--threads 8] [--awards 200] [--xp 15] [--database-url URL]
+
+Hammers one user from several threads (like the web app and the bot awarding
+at once), first with the old read-modify-write code, then with the atomic
+award engine (services/awards.py). Reports throughput, errors and how much
+XP was lost. Uses a throw-away SQLite database unless --database-url points
+at a (disposable!) Postgres / SQLite database.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+parser = argparse.ArgumentParser(description="Concurrent award benchmark")
+parser.add_argument('--threads', type=int, default=8)
+parser.add_argument('--awards', type=int, default=200, help="awards per thread")
+parser.add_argument('--xp', type=int, default=15, help="XP per award")
+parser.add_argument('--database-url', default=None)
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ.pop('BOT_TOKEN', None)
+
+from app import app, db
+from models import User
+from services import awards
+
+
+def legacy_award(user_id, xp):
+    """The award code the routes used before the engine."""
+    user = db.session.get(User, user_id)
+    user.xp += xp
+    user.coins += xp // 2
+    while user.xp >= 100:
+        user.level += 1
+        user.xp -= 100
+    db.session.commit()
+
+
+def engine_award(user_id, xp):
+    awards.award(user_id, xp)
+    db.session.commit()
+
+
+def run(name, award_fn):
+    with app.app_context():
+        user = User(username=f'bench_{name}_{time.time_ns()}', email=f'{time.time_ns()}@bench.local', password='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    errors = []
+
+    def worker():
+        with app.app_context():
+            for _ in range(args.awards):
+                try:
+                    award_fn(user_id, args.xp)
+                except Exception as e:  # e.g. "database is locked"
+                    db.session.rollback()
+                    errors.append(type(e).__name__)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        granted = (user.level - 1) * awards.XP_PER_LEVEL + user.xp
+        coins = user.coins
+        db.session.delete(user)
+        db.session.commit()
+
+    attempted = args.threads * args.awards
+    expected = (attempted - len(errors)) * args.xp
+    print(f"{name:>7}: {attempted / elapsed:8.0f} awards/s | errors {len(errors):4d} | "
+          f"XP granted {granted} of {expected} (lost {expected - granted}) | coins {coins}")
+    return expected - granted
+
+
+def main():
+    with app.app_context():
+        backend = db.engine.url.get_backend_name()
+    print(f"{args.threads} threads × {args.awards} awards of {args.xp} XP on {backend}")
+    run('legacy', legacy_award)
+    lost = run('engine', engine_award)
+    if lost:
+        print("❌ The award engine lost updates!")
+        sys.exit(1)
+    print("✅ No lost updates with the award engine.")
+
+
+if __name__ == '__main__':
+    main()
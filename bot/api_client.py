@@ -11,8 +11,9 @@ Security fixes applied:
 """
 
 import asyncio
+import json
 import logging
-from typing import Any
+from typing import Any, AsyncIterator
 
 import aiohttp
 
@@ -93,6 +94,64 @@ async def _get(path: str) -> dict[str, Any]:
         return {"error": f"Connection error: {exc}"}
 
 
+async def _run_job(path: str, payload: dict[str, Any], max_wait: float = 120.0) -> dict[str, Any]:
+    """Enqueue an AI job on the backend ({"async": true}) and poll it until it
+    finishes. Returns the job result (same shape as the synchronous endpoint)
+    or an error dict. Keeps gunicorn workers free during the OpenAI call.
+    Cached answers come back directly (no job_id) and are returned as-is."""
+    job = await _post(path, {**payload, "async": True})
+    if "error" in job or "job_id" not in job:
+        return job
+
+    job_id = job.get("job_id")
+    delay = 0.5
+    waited = 0.0
+    while waited < max_wait:
+        await asyncio.sleep(delay)
+        waited += delay
+        status = await _get(f"/api/bot/jobs/{job_id}")
+        if "error" in status and "status" not in status:
+            return status
+        if status.get("status") == "done":
+            return status.get("result") or {}
+        if status.get("status") == "failed":
+            return {"error": status.get("error", "AI job failed")}
+        delay = min(delay * 1.5, 3.0)
+
+    logger.error("AI job %s on %s did not finish within %ss", job_id, path, max_wait)
+    return {"error": "Request timed out. The server may be overloaded."}
+
+
+async def _stream(path: str, payload: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+    """POST JSON and yield Server-Sent Events from the response as dicts.
+    Errors are yielded as a single {"type": "error", ...} event."""
+    session = await get_session()
+    # No total deadline for a stream — only bound the gap between chunks
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+    try:
+        async with session.post(path, json=payload, timeout=timeout) as resp:
+            if resp.status >= 400:
+                text = await resp.text()
+                logger.warning("API stream %s → HTTP %s  %s", path, resp.status, text[:200])
+                yield {"type": "error", "error": f"Server error (HTTP {resp.status})"}
+                return
+
+            async for raw_line in resp.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data: "):
+                    continue
+                try:
+                    yield json.loads(line[6:])
+                except ValueError:
+                    logger.error("Malformed SSE frame from %s: %s", path, line[:200])
+    except asyncio.TimeoutError:
+        logger.error("Timeout streaming %s", path)
+        yield {"type": "error", "error": "Request timed out. The server may be overloaded."}
+    except aiohttp.ClientError as exc:
+        logger.error("API stream to %s failed: %s", path, exc)
+        yield {"type": "error", "error": f"Connection error: {exc}"}
+
+
 # ─── Public API functions ───────────────────────────────────────────────────
 
 async def check_user(telegram_id: int) -> dict:
@@ -107,7 +166,15 @@ async def get_state(telegram_id: int) -> dict:
 
 async def send_chat(telegram_id: int, message: str) -> dict:
     """Send a chat message to the ORIA AI on behalf of a user."""
-    return await _post("/api/bot/chat", {
+    return await _run_job("/api/bot/chat", {
+        "telegram_id": telegram_id,
+        "message": message,
+    })
+
+
+def stream_chat(telegram_id: int, message: str) -> AsyncIterator[dict[str, Any]]:
+    """Stream the ORIA AI reply as SSE events ('delta', 'quest', 'done', 'error')."""
+    return _stream("/api/bot/chat/stream", {
         "telegram_id": telegram_id,
         "message": message,
     })
@@ -140,7 +207,7 @@ async def complete_miniquest(telegram_id: int, global_index: int, mini_index: in
 
 async def refresh_daily_quests(telegram_id: int) -> dict:
     """Request new daily quests from the backend."""
-    return await _post("/api/bot/user/daily_refresh", {
+    return await _run_job("/api/bot/user/daily_refresh", {
         "telegram_id": telegram_id,
     })
 
@@ -155,21 +222,27 @@ async def claim_reward(telegram_id: int, level: int) -> dict:
 
 async def generate_quiz(topic: str) -> dict:
     """Generate a quiz for the given topic."""
-    return await _post("/api/bot/quiz/generate", {"topic": topic})
+    return await _run_job("/api/bot/quiz/generate", {"topic": topic})
 
 
 async def explain_quiz(question: str, user_answer: str, correct_answer: str) -> dict:
     """Get an AI explanation for a quiz answer."""
-    return await _post("/api/bot/quiz/explain", {
+    return await _run_job("/api/bot/quiz/explain", {
         "question": question,
         "user_answer": user_answer,
         "correct_answer": correct_answer,
     })
 
 
-async def get_leaderboard() -> dict:
-    """Fetch the leaderboard."""
-    return await _get("/api/bot/leaderboard")
+async def get_leaderboard(telegram_id: Optional[int] = None, period: Optional[str] = None) -> dict:
+    """Fetch the leaderboard (with the user's own rank when telegram_id is given).
+    period='day' / 'week' / 'month' ranks by XP gained in the current period instead."""
+    params = []
+    if telegram_id is not None:
+        params.append(f"telegram_id={telegram_id}")
+    if period:
+        params.append(f"period={period}")
+    return await _get("/api/bot/leaderboard" + ("?" + "&".join(params) if params else ""))
 
 
 async def register_user(telegram_id: int) -> dict:
@@ -22,6 +22,7 @@ from bot.middleware import AuthMiddleware
 
 from bot.handlers.start import router as start_router
 from bot.handlers.admin import router as admin_router
+from bot.handlers.chat import router as chat_router
 
 logger = logging.getLogger("oria_bot")
 
@@ -56,6 +57,8 @@ async def _main() -> None:
 
     dp.include_router(start_router)
     dp.include_router(admin_router)
+    # Catch-all free-text chat must come last so menu buttons and FSM flows win
+    dp.include_router(chat_router)
 
     # Start the proactive notifier aiohttp server
     from bot.utils.notifier import setup_notifier_app
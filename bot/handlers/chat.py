@@ -0,0 +1,69 @@
+"""
+ORIA Bot — free-text chat with the ORIA AI
+
+Replies are streamed from the backend and shown by progressively editing a
+single placeholder message, so the user sees the first tokens right away.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import StateFilter
+from aiogram.types import Message
+
+from bot import api_client
+
+router = Router(name="chat")
+logger = logging.getLogger(__name__)
+
+# Telegram rate-limits edits of the same message — keep them at least this far apart
+EDIT_INTERVAL = 1.0
+# Hard Telegram limit for a single message
+MAX_MESSAGE_LENGTH = 4096
+
+
+async def _safe_edit(message: Message, text: str) -> None:
+    """Edit a message, ignoring 'message is not modified' and similar errors."""
+    try:
+        await message.edit_text(text[:MAX_MESSAGE_LENGTH], parse_mode=None)
+    except TelegramAPIError as e:
+        logger.debug("Skipping chat edit: %s", e)
+
+
+@router.message(StateFilter(None), F.text, ~F.text.startswith("/"))
+async def chat_with_oria(message: Message, oria_user: dict | None) -> None:
+    """Forward a free-text message to ORIA and stream the reply back."""
+    if not message.from_user or not oria_user:
+        return
+
+    placeholder = await message.answer("⌛ ORIA is thinking…", parse_mode=None)
+
+    text = ""
+    quest_title = None
+    last_edit = 0.0
+
+    async for event in api_client.stream_chat(message.from_user.id, message.text):
+        kind = event.get("type")
+        if kind == "delta":
+            text += event.get("content", "")
+            now = time.monotonic()
+            if text.strip() and now - last_edit >= EDIT_INTERVAL:
+                await _safe_edit(placeholder, text)
+                last_edit = now
+        elif kind == "quest":
+            quest_title = (event.get("quest") or {}).get("title", "")
+            # The follow-up reply after the tool call replaces what we had so far
+            text = ""
+        elif kind == "done":
+            text = event.get("reply") or text
+        elif kind == "error":
+            await _safe_edit(placeholder, f"❌ {event.get('error', 'Neural link error.')}")
+            return
+
+    if quest_title is not None:
+        text += f"\n\n✅ Quest saved: {quest_title}"
+    await _safe_edit(placeholder, text or "…")
@@ -1,3 +1,12 @@
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
 from app import app, db, User
 from werkzeug.security import generate_password_hash
 
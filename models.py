@@ -17,18 +17,22 @@ class User(db.Model):
     level = db.Column(db.Integer, default=1)
     xp = db.Column(db.Integer, default=0)
     coins = db.Column(db.Integer, default=0)
-    chat_history = db.Column(db.Text, default='[]')
-    quests = db.Column(db.Text, default='[]')
+    # Large text columns are deferred: loaded on first access, one group at a time
+    chat_history = db.deferred(db.Column(db.Text, default='[]'), group='chat')   # Legacy, see ChatMessage
+    chat_summary = db.deferred(db.Column(db.Text, nullable=True), group='chat')  # Running summary of the folded chat messages
+    chat_summary_upto = db.Column(db.Integer, nullable=True)  # Last ChatMessage.id folded into chat_summary
+    quests = db.deferred(db.Column(db.Text, default='[]'), group='state')  # Legacy, see Quest
     owned_skins = db.Column(db.Text, default='["default"]')
     equipped_skin = db.Column(db.String(50), default='default')
-    daily_quests = db.Column(db.Text, default='[]')
+    daily_quests = db.deferred(db.Column(db.Text, default='[]'), group='state')
     last_daily_date = db.Column(db.String(20), default='')
     current_streak = db.Column(db.Integer, default=0)
     last_active_date = db.Column(db.String(20), default='')
     achievements = db.Column(db.Text, default='[]')
-    onboarding_data = db.Column(db.Text, default='{}')
+    onboarding_data = db.deferred(db.Column(db.Text, default='{}'), group='state')
     claimed_rewards = db.Column(db.Text, default='[1]')
     equipped_title = db.Column(db.String(64), default='')
+    state_version = db.Column(db.Integer, default=0, nullable=False)  # Bumped on every change to the state document
     telegram_id = db.Column(db.String(64), unique=True, nullable=True)
     role = db.Column(db.String(20), default='user', nullable=False)
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
@@ -155,6 +159,10 @@ class AdminLog(db.Model):
     """Audit trail for all admin panel actions."""
     __table_args__ = (
         db.Index('idx_adminlog_created', 'created_at'),
+        # Filtered views of the log tab, each read newest first
+        db.Index('idx_adminlog_action_created', 'action', 'created_at'),
+        db.Index('idx_adminlog_admin_created', 'admin_id', 'created_at'),
+        db.Index('idx_adminlog_target_created', 'target_id', 'created_at'),
     )
 
     id = db.Column(db.Integer, primary_key=True)
@@ -171,3 +179,318 @@ class AdminLog(db.Model):
     def __repr__(self):
         return f'<AdminLog {self.action} by {self.admin_name}>'
 
+
+class AdminLogFacet(db.Model):
+    """Running count of audit log entries per action / per admin: the log
+    tab's filter lists and totals. Kept up to date by services/audit_log.py."""
+    kind = db.Column(db.String(16), primary_key=True)     # 'action' or 'admin'
+    value = db.Column(db.String(80), primary_key=True)    # action name / admin id
+    label = db.Column(db.String(80), nullable=False)      # what the filter list shows
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AdminLogFacet {self.kind}={self.value} ×{self.count}>'
+
+
+class AIJob(db.Model):
+    """Persisted background AI job, executed by the worker pool in services/ai_jobs.py."""
+    __table_args__ = (
+        db.Index('idx_aijob_status_created', 'status', 'created_at'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)          # uuid4 hex, handed to clients
+    kind = db.Column(db.String(40), nullable=False)         # e.g. 'chat', 'quiz_generate'
+    user_id = db.Column(db.Integer, nullable=True)          # Owner (None for bot-only jobs)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued | running | done | failed
+    payload = db.Column(db.Text, default='{}')
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.String(300), nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def get_payload(self):
+        try:
+            return json.loads(self.payload or '{}')
+        except Exception:
+            return {}
+
+    def get_result(self):
+        try:
+            return json.loads(self.result) if self.result else None
+        except Exception:
+            return None
+
+    def __repr__(self):
+        return f'<AIJob {self.kind} {self.status}>'
+
+
+class TaskLease(db.Model):
+    """Cluster-wide lease for a periodic background task (services/scheduler.py).
+    Whoever holds an unexpired lease is the only process running that task."""
+    name = db.Column(db.String(64), primary_key=True)
+    owner = db.Column(db.String(120), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<TaskLease {self.name} → {self.owner}>'
+
+
+class PreparedDailyQuests(db.Model):
+    """Daily quest set generated ahead of time by the scheduler, swapped in
+    by /api/user/state on the first load of that day."""
+    user_id = db.Column(db.Integer, primary_key=True)
+    for_date = db.Column(db.String(20), primary_key=True)
+    quests = db.Column(db.Text, nullable=False, default='[]')
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def get_quests(self):
+        try:
+            return json.loads(self.quests)
+        except Exception:
+            return []
+
+    def __repr__(self):
+        return f'<PreparedDailyQuests user={self.user_id} {self.for_date}>'
+
+
+class DailyQuestRun(db.Model):
+    """Progress and failure counters of one daily-quest pre-generation run."""
+    for_date = db.Column(db.String(20), primary_key=True)
+    status = db.Column(db.String(20), default='running', nullable=False)  # running | done
+    total = db.Column(db.Integer, default=0, nullable=False)
+    generated = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    started_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<DailyQuestRun {self.for_date} {self.generated}/{self.total}>'
+
+
+class WellbeingTask(db.Model):
+    """Shared AI-generated wellbeing task used as the 3rd daily quest
+    (services/wellbeing_pool.py). One pool per language."""
+    __table_args__ = (
+        db.UniqueConstraint('language', 'task_key', name='uq_wellbeing_language_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(db.String(8), nullable=False)
+    task = db.Column(db.String(300), nullable=False)
+    task_key = db.Column(db.String(300), nullable=False)    # normalised text, for dedupe
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<WellbeingTask {self.language} {self.task[:30]}>'
+
+
+class WellbeingTaskHistory(db.Model):
+    """Which pool task a user got on which day — keeps picks from repeating."""
+    __table_args__ = (
+        db.Index('idx_wellbeing_hist_user_date', 'user_id', 'for_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    task_id = db.Column(db.Integer, nullable=False)
+    for_date = db.Column(db.String(20), nullable=False)
+
+    def __repr__(self):
+        return f'<WellbeingTaskHistory user={self.user_id} task={self.task_id} {self.for_date}>'
+
+
+class QuizCacheEntry(db.Model):
+    """One cached quiz variant for a normalised topic (services/quiz_cache.py).
+    Shared by every web worker; the bot's shorter quizzes are kept apart
+    (style 'bot' / 'web')."""
+    __table_args__ = (
+        db.Index('idx_quizcache_key', 'topic_key', 'language', 'style', 'created_at'),
+        db.Index('idx_quizcache_last_used', 'last_used_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    topic_key = db.Column(db.String(300), nullable=False)
+    language = db.Column(db.String(8), nullable=False)
+    style = db.Column(db.String(8), nullable=False, default='web')
+    questions = db.Column(db.Text, nullable=False, default='[]')
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    last_used_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def get_questions(self):
+        try:
+            return json.loads(self.questions)
+        except Exception:
+            return []
+
+    def __repr__(self):
+        return f'<QuizCacheEntry {self.style}/{self.language}:{self.topic_key[:30]}>'
+
+
+class ExplanationCacheEntry(db.Model):
+    """Memoised quiz-answer explanation (services/explanation_cache.py),
+    keyed by a hash of (style, question, user answer, correct answer)."""
+    __table_args__ = (
+        db.Index('idx_explcache_last_used', 'last_used_at'),
+    )
+
+    key = db.Column(db.String(64), primary_key=True)        # sha256 hex
+    explanation = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    last_used_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<ExplanationCacheEntry {self.key[:12]}>'
+
+
+class Quest(db.Model):
+    """One quest of a user (services/quest_store.py rebuilds the JSON shape).
+    Hot fields are columns; any other client keys live in `extra`. The
+    counters back quest progress without rescanning every step."""
+    __table_args__ = (
+        db.Index('idx_quest_user_status', 'user_id', 'status'),
+        db.Index('idx_quest_user_position', 'user_id', 'position'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)         # index in the user's quest list
+    title = db.Column(db.String(300), nullable=True)
+    category = db.Column(db.String(50), nullable=True)
+    difficulty = db.Column(db.String(20), nullable=True)
+    status = db.Column(db.String(20), nullable=True)         # None = active, 'completed'
+    progress = db.Column(db.Integer, nullable=True)
+    xp_reward = db.Column(db.Integer, nullable=True)
+    sub_total = db.Column(db.Integer, nullable=True)         # None = no 'sub_tasks' list
+    sub_done = db.Column(db.Integer, default=0, nullable=False)
+    step_total = db.Column(db.Integer, default=0, nullable=False)  # progress units (micro-steps, or the sub-task itself)
+    step_done = db.Column(db.Integer, default=0, nullable=False)
+    extra = db.Column(db.Text, default='{}')
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<Quest {self.user_id}#{self.position} {self.title}>'
+
+
+class SubTask(db.Model):
+    """A module of a quest."""
+    __table_args__ = (
+        db.Index('idx_subtask_quest_position', 'quest_id', 'position'),
+        db.Index('idx_subtask_user', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    quest_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    task = db.Column(db.Text, nullable=True)
+    completed = db.Column(db.Boolean, nullable=True)
+    xp_reward = db.Column(db.Integer, nullable=True)
+    micro_total = db.Column(db.Integer, nullable=True)       # None = no 'micro_steps' list
+    micro_done = db.Column(db.Integer, default=0, nullable=False)
+    extra = db.Column(db.Text, default='{}')
+
+    def __repr__(self):
+        return f'<SubTask quest={self.quest_id}#{self.position}>'
+
+
+class MicroStep(db.Model):
+    """A 10-minute step of a sub-task."""
+    __table_args__ = (
+        db.Index('idx_microstep_subtask_position', 'sub_task_id', 'position'),
+        db.Index('idx_microstep_user', 'user_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sub_task_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    task = db.Column(db.Text, nullable=True)
+    task_description = db.Column(db.Text, nullable=True)
+    completed = db.Column(db.Boolean, nullable=True)
+    extra = db.Column(db.Text, default='{}')
+
+    def __repr__(self):
+        return f'<MicroStep sub_task={self.sub_task_id}#{self.position}>'
+
+
+class ChatMessage(db.Model):
+    """One chat message (append-only). Read per user as an index range scan on
+    (user_id, id); services/chat_context.py trims old rows in the background."""
+    __table_args__ = (
+        db.Index('idx_chat_message_user_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},   # never reuse ids — chat_summary_upto points at them
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    role = db.Column(db.String(20), nullable=False)          # user / assistant / tool
+    content = db.Column(db.Text, nullable=True)
+    tool_calls = db.Column(db.Text, nullable=True)           # JSON list (assistant tool calls)
+    tool_call_id = db.Column(db.String(100), nullable=True)  # tool results
+    name = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+    def to_message(self):
+        """The message dict in the format the chat API expects."""
+        message = {'role': self.role, 'content': self.content}
+        if self.tool_calls:
+            message['tool_calls'] = json.loads(self.tool_calls)
+        if self.tool_call_id:
+            message['tool_call_id'] = self.tool_call_id
+        if self.name:
+            message['name'] = self.name
+        return message
+
+    def __repr__(self):
+        return f'<ChatMessage {self.user_id}#{self.id} {self.role}>'
+
+
+class XPEvent(db.Model):
+    """One XP / coin award (append-only ledger, written with the award by
+    services/awards.py). services/xp_ledger.py rolls events up into XPRollup."""
+    __table_args__ = (
+        db.Index('idx_xp_event_user_id', 'user_id', 'id'),
+        {'sqlite_autoincrement': True},   # ids only grow — the rollup cursor relies on it
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    xp = db.Column(db.Integer, nullable=False, default=0)
+    coins = db.Column(db.Integer, nullable=False, default=0)
+    source = db.Column(db.String(32), nullable=False)   # action / miniquest / daily / reward / admin
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)
+
+    def __repr__(self):
+        return f'<XPEvent {self.user_id} +{self.xp}xp +{self.coins}c {self.source}>'
+
+
+class XPRollup(db.Model):
+    """XP / coins a user gained in one day, week (from Monday) or month (UTC).
+    Windowed leaderboards read (period, period_start) ordered by xp."""
+    __table_args__ = (
+        db.Index('idx_xp_rollup_board', 'period', 'period_start', 'xp'),
+    )
+
+    period = db.Column(db.String(8), primary_key=True)   # day / week / month
+    period_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    xp = db.Column(db.Integer, nullable=False, default=0)
+    coins = db.Column(db.Integer, nullable=False, default=0)
+    events = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<XPRollup {self.period} {self.period_start} user={self.user_id} {self.xp}xp>'
+
+
+class XPRollupCursor(db.Model):
+    """Last XPEvent id folded into XPRollup (one row per rollup job)."""
+    name = db.Column(db.String(32), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def __repr__(self):
+        return f'<XPRollupCursor {self.name} @{self.last_event_id}>'
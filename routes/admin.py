@@ -2,13 +2,17 @@
 Admin Panel Blueprint — ORIA RBAC.
 Full title management + user attribute editing + search/sort + audit logging.
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, g, jsonify
+import os
+from flask import Blueprint, render_template, request, redirect, url_for, flash, g, jsonify, Response, stream_with_context
 from models import db, User, ExclusiveTitle, AdminLog
 from routes.decorators import admin_required, superadmin_required
+from services import quest_store, chat_context, user_queries, awards, keyset, user_search, audit_log, bulk_users, export
 from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
+ADMIN_PAGE_SIZE = int(os.environ.get('ADMIN_PAGE_SIZE', '50'))
+
 
 # ── Audit Helper ─────────────────────────────────────────────────────────────
 def log_action(action, target_user=None, old_value=None, new_value=None, details=None):
@@ -24,6 +28,8 @@ def log_action(action, target_user=None, old_value=None, new_value=None, details
         details=details,
     )
     db.session.add(entry)
+    # Whatever the action changed, the dashboard totals shouldn't lag behind it
+    user_queries.invalidate_user_stats()
 
 
 # ── Dashboard ────────────────────────────────────────────────────────────────
@@ -31,93 +37,127 @@ def log_action(action, target_user=None, old_value=None, new_value=None, details
 @admin_required
 def dashboard():
     """Main admin panel — list users, manage titles."""
-    search_q = request.args.get('q', '').strip()
+    filters = _user_filters(request.args)
     sort_by = request.args.get('sort', 'id')
     sort_dir = request.args.get('dir', 'asc')
-    role_filter = request.args.get('role', '')
-
-    query = User.query
-
-    if search_q:
-        if search_q.isdigit():
-            query = query.filter(User.id == int(search_q))
-        else:
-            query = query.filter(
-                db.or_(
-                    User.username.ilike(f'%{search_q}%'),
-                    User.email.ilike(f'%{search_q}%'),
-                )
-            )
-
-    if role_filter in ('user', 'admin', 'superadmin'):
-        query = query.filter(User.role == role_filter)
-
-    sort_columns = {
-        'id': User.id, 'username': User.username,
-        'level': User.level, 'coins': User.coins,
-        'xp': User.xp, 'role': User.role,
-    }
-    sort_col = sort_columns.get(sort_by, User.id)
-    query = query.order_by(sort_col.desc() if sort_dir == 'desc' else sort_col.asc())
 
-    users = query.all()
+    query = user_queries.with_columns(User.query)
+    if filters:
+        query = query.filter(_user_condition(filters))
+
+    # Keyset pages on (sort column, id): ?after= / ?before= carry the edge row's key
+    sort_col = user_queries.DASHBOARD_SORTS.get(sort_by, User.id)
+    keys = [sort_col] if sort_col is User.id else [sort_col, User.id]
+    page = keyset.paginate(
+        query, keys, descending=sort_dir == 'desc',
+        after=request.args.get('after'), before=request.args.get('before'),
+        limit=ADMIN_PAGE_SIZE,
+    )
     titles = ExclusiveTitle.query.order_by(ExclusiveTitle.id.asc()).all()
 
-    all_users = User.query.all()
-    stats = {
-        'total_users': len(all_users),
-        'total_admins': sum(1 for u in all_users if u.role in ('admin', 'superadmin')),
-        'total_titled': sum(1 for u in all_users if u.equipped_title),
-        'total_tg_linked': sum(1 for u in all_users if u.telegram_id),
-        'avg_level': round(sum(u.level for u in all_users) / max(len(all_users), 1), 1),
-        'total_coins': sum(u.coins for u in all_users),
-    }
+    stats = user_queries.user_stats()
+    total = query.order_by(None).count() if filters else stats['total_users']
 
     return render_template(
         'admin/dashboard.html',
-        users=users, titles=titles, stats=stats,
+        users=page.items, page=page, total=total, filtered=bool(filters), filters=filters,
+        titles=titles, stats=stats,
         current_user=g.user,
-        search_q=search_q, sort_by=sort_by,
-        sort_dir=sort_dir, role_filter=role_filter,
+        search_q=filters.get('q', ''), sort_by=sort_by,
+        sort_dir=sort_dir, role_filter=filters.get('role', ''),
+        level_min=filters.get('level_min'), level_max=filters.get('level_max'),
         active_tab='users',
     )
 
 
+def _user_filters(source):
+    """The dashboard's user filter (search / role / level range) from query
+    args or a form, with empty and invalid fields dropped."""
+    filters = {}
+    q = source.get('q', '').strip()
+    if q:
+        filters['q'] = q
+    if source.get('role') in ('user', 'admin', 'superadmin'):
+        filters['role'] = source['role']
+    for name in ('level_min', 'level_max'):
+        value = source.get(name, type=int)
+        if value is not None:
+            filters[name] = value
+    return filters
+
+
+def _user_condition(filters):
+    """WHERE clause selecting the users a filter matches."""
+    conditions = []
+    q = filters.get('q')
+    if q:
+        conditions.append(User.id == int(q) if q.isdigit() else user_search.condition(q))
+    if 'role' in filters:
+        conditions.append(User.role == filters['role'])
+    if 'level_min' in filters:
+        conditions.append(User.level >= filters['level_min'])
+    if 'level_max' in filters:
+        conditions.append(User.level <= filters['level_max'])
+    return db.and_(*conditions) if conditions else db.true()
+
+
+@admin_bp.route('/users/search')
+@admin_required
+def search_users():
+    """Typeahead for the dashboard search box: best matches first (JSON)."""
+    q = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    rows = user_search.search(q, limit) if len(q) <= 120 else []
+    return jsonify({'results': [
+        {'id': r.id, 'username': r.username, 'email': r.email, 'role': r.role, 'level': r.level}
+        for r in rows
+    ]})
+
+
 # ── Admin Logs Tab ───────────────────────────────────────────────────────────
 @admin_bp.route('/logs')
 @admin_required
 def logs():
-    """View audit logs with optional filtering."""
+    """View audit logs, newest first, filtered by action / admin / target / date range."""
     action_filter = request.args.get('action', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = 50
-
-    query = AdminLog.query
-
-    if action_filter:
-        query = query.filter(AdminLog.action == action_filter)
-
-    query = query.order_by(AdminLog.created_at.desc())
-    total = query.count()
-    logs_list = query.offset((page - 1) * per_page).limit(per_page).all()
-
-    # Get distinct action types for filter dropdown
-    action_types = db.session.query(AdminLog.action).distinct().order_by(AdminLog.action).all()
-    action_types = [a[0] for a in action_types]
-
-    total_pages = (total + per_page - 1) // per_page
+    admin_filter = request.args.get('admin', type=int)
+    target_filter = request.args.get('target', type=int)
+    since = _parse_date(request.args.get('since'))
+    until = _parse_date(request.args.get('until'))
+
+    page = audit_log.entries(
+        action=action_filter or None, admin_id=admin_filter, target_id=target_filter,
+        since=since, until=until,
+        after=request.args.get('after'), before=request.args.get('before'),
+    )
+    # Only the facet counts are read for totals; other filters show no total
+    total = None if (target_filter is not None or since or until) \
+        else audit_log.total(action_filter or None, admin_filter)
 
+    filters = {
+        'action': action_filter, 'admin': admin_filter, 'target': target_filter,
+        'since': since.isoformat() if since else '', 'until': until.isoformat() if until else '',
+    }
     return render_template(
         'admin/logs.html',
-        logs=logs_list,
-        action_types=action_types,
-        action_filter=action_filter,
-        page=page, total_pages=total_pages,
+        logs=page.items, page=page, total=total,
+        action_types=[f.value for f in audit_log.facets('action')],
+        admins=audit_log.facets('admin'),
+        action_filter=action_filter, filters={k: v for k, v in filters.items() if v not in ('', None)},
+        admin_filter=admin_filter, target_filter=target_filter,
+        since=filters['since'], until=filters['until'],
         current_user=g.user,
         active_tab='logs',
     )
 
 
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+
+
 # ── Title Management ─────────────────────────────────────────────────────────
 
 @admin_bp.route('/title/create', methods=['POST'])
@@ -152,9 +192,7 @@ def delete_title(title_id):
         flash("Cannot delete a system title.", "error")
         return redirect(url_for('admin.dashboard'))
 
-    affected = User.query.filter_by(equipped_title=title.name).all()
-    for u in affected:
-        u.equipped_title = ''
+    affected = bulk_users.set_title(User.equipped_title == title.name, '')
 
     log_action('delete_title', details=f'Deleted title: {title.name}, cleared from {len(affected)} user(s)')
     db.session.delete(title)
@@ -234,8 +272,13 @@ def modify_user(user_id):
 
     attr, min_val = field_map[field]
     old = getattr(target, attr)
-    new = max(min_val, old + delta)
-    setattr(target, attr, new)
+    if field == 'xp' and delta > 0:
+        # Through the award engine, so XP past a level boundary levels up
+        result = awards.award(target, delta, coins=0, source='admin')
+        new = f"{result.xp} (level {result.level})" if result.leveled_up else result.xp
+    else:
+        new = max(min_val, old + delta)
+        setattr(target, attr, new)
     log_action(f'modify_{field}', target, old_value=old, new_value=new)
     db.session.commit()
     flash(f"{target.username}: {field} {old} → {new}", "success")
@@ -250,9 +293,9 @@ def reset_quests(user_id):
         flash("User not found.", "error")
         return redirect(url_for('admin.dashboard'))
 
-    quest_count = len(target.get_quests())
+    quest_count = quest_store.count(target)
     daily_count = len(target.get_daily_quests())
-    target.quests = '[]'
+    quest_store.delete_all(target.id)
     target.daily_quests = '[]'
     target.last_daily_date = ''
     log_action('reset_quests', target, details=f'Cleared {quest_count} quests + {daily_count} daily')
@@ -269,14 +312,98 @@ def reset_chat(user_id):
         flash("User not found.", "error")
         return redirect(url_for('admin.dashboard'))
 
-    msg_count = len(target.get_chat_history())
-    target.chat_history = '[]'
+    msg_count = chat_context.count_messages(target.id) + len(target.get_chat_history())
+    chat_context.delete_history(target)
     log_action('reset_chat', target, details=f'Cleared {msg_count} messages')
     db.session.commit()
     flash(f"Chat history cleared for {target.username}.", "success")
     return redirect(url_for('admin.dashboard'))
 
 
+# ── Bulk Operations ──────────────────────────────────────────────────────────
+
+@admin_bp.route('/users/bulk', methods=['POST'])
+@admin_required
+def bulk_update():
+    """Apply one change to every user matching the dashboard filter — a single
+    UPDATE, logged with one multi-row insert."""
+    filters = _user_filters(request.form)
+    back = redirect(url_for('admin.dashboard', **filters))
+    if not filters and request.form.get('all_users') != '1':
+        flash("No filter set — tick 'All users' to apply this to everyone.", "error")
+        return back
+
+    operation = request.form.get('operation', '').strip()
+    condition = _user_condition(filters)
+    if operation in bulk_users.DELTA_FIELDS:
+        try:
+            delta = int(request.form.get('delta', 0))
+        except (ValueError, TypeError):
+            flash("Invalid value.", "error")
+            return back
+        if delta == 0:
+            flash("No change (delta is 0).", "info")
+            return back
+        affected = bulk_users.apply_delta(condition, operation, delta)
+        action, summary = f'bulk_modify_{operation}', f"{operation} {delta:+d}"
+    elif operation == 'force_title':
+        title_name = request.form.get('title_name', '').strip()
+        if not title_name or len(title_name) > 64:
+            flash("Invalid title.", "error")
+            return back
+        affected = bulk_users.set_title(condition, title_name)
+        action, summary = 'bulk_force_title', f"title '{title_name}'"
+    elif operation == 'remove_title':
+        affected = bulk_users.set_title(condition, '')
+        action, summary = 'bulk_remove_title', "title removed"
+    else:
+        flash("Unknown operation.", "error")
+        return back
+
+    scope = ', '.join(f'{k}={v}' for k, v in filters.items()) or 'all users'
+    audit_log.add_many(g.user, action, affected, details=f'{summary} ({scope})')
+    user_queries.invalidate_user_stats()
+    db.session.commit()
+    flash(f"Bulk {summary}: {len(affected)} user(s) updated.", "success")
+    return back
+
+
+# ── Export ───────────────────────────────────────────────────────────────────
+
+@admin_bp.route('/export/<dataset>.<fmt>')
+@admin_required
+def export_data(dataset, fmt):
+    """Stream users or the audit log as CSV / NDJSON.
+    ?after_id= / ?until_id= select an id range (resume), ?include=quests,achievements
+    adds those to a user export."""
+    models = {'users': User, 'logs': AdminLog}
+    if dataset not in models or fmt not in export.FORMATS:
+        return jsonify({'error': 'Unknown export'}), 404
+
+    after_id = max(request.args.get('after_id', 0, type=int), 0)
+    until_id = request.args.get('until_id', type=int)
+    if until_id is None:
+        until_id = export.max_id(models[dataset])
+    include = tuple(name for name in request.args.get('include', '').split(',') if name in export.USER_EXTRAS) \
+        if dataset == 'users' else ()
+
+    log_action(f'export_{dataset}', details=f"{fmt}, ids {after_id + 1}–{until_id}" + (f", with {', '.join(include)}" if include else ''))
+    db.session.commit()
+
+    chunks = export.stream(dataset, fmt, after_id, until_id, include)
+    headers = {
+        'Content-Disposition': f'attachment; filename="oria-{dataset}-{after_id + 1}-{until_id}.{fmt}"',
+        'X-Export-Until-Id': str(until_id),
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',  # disable proxy buffering (nginx)
+        'Vary': 'Accept-Encoding',
+    }
+    if 'gzip' in request.accept_encodings:
+        chunks = export.gzipped(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), content_type=export.FORMATS[fmt], headers=headers)
+
+
 # ── Role Management (superadmin ONLY) ────────────────────────────────────────
 @admin_bp.route('/role/update/<int:user_id>', methods=['POST'])
 @superadmin_required
@@ -300,3 +427,12 @@ def update_role(user_id):
     db.session.commit()
     flash(f"Role for {target.username} → '{new_role}'.", "success")
     return redirect(url_for('admin.dashboard'))
+
+
+# ── Background Tasks ─────────────────────────────────────────────────────────
+@admin_bp.route('/scheduler/daily-quests')
+@admin_required
+def daily_quest_pregen_status():
+    """Progress and failure counts of the nightly daily-quest pre-generation."""
+    from services import daily_pregen
+    return jsonify(daily_pregen.status())
@@ -9,11 +9,11 @@ import hmac
 import hashlib
 from urllib.parse import parse_qsl
 
-from flask import Blueprint, request, jsonify, session
-from openai import OpenAI
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm.attributes import flag_modified
-from models import db, User, TelegramUser
+from models import db, User, TelegramUser, AIJob, PreparedDailyQuests
+from services import ai_jobs, llm, chat_context, wellbeing_pool, quiz_cache, explanation_cache, quest_store, user_queries, awards, user_state, leaderboard, xp_ledger
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
@@ -50,6 +50,21 @@ def extract_json(text):
     raise ValueError(f"No JSON object found in AI response: {text[:300]}")
 
 
+def _not_modified(etag):
+    """A bodyless 304 if the client's If-None-Match already names `etag`, else None."""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return _with_etag(Response(status=304), etag)
+
+
+def _with_etag(response, etag):
+    # Per-user data behind a shared URL: browsers may keep it but must revalidate
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
 # Maximum XP the backend will award in a single action call.
 # Prevents clients from cheating by sending inflated values.
 MAX_XP_PER_ACTION = 200
@@ -129,76 +144,157 @@ CREATE_QUEST_TOOL = {
 
 # ─── Daily Quest Generation ──────────────────────────────────────────────────
 
-def _generate_daily_quests(user):
-    today_str = datetime.date.today().isoformat()
-    active_quests = [q for q in user.get_quests() if q.get('status') != 'completed']
-    all_incomplete_subtasks = []
-    for quest in active_quests:
-        for sub_task in quest.get('sub_tasks', []):
-            if not sub_task.get('completed', False):
-                all_incomplete_subtasks.append(sub_task.get('task', 'Unknown Task'))
-
-    static_tasks_pool = [
-        "випити води",
-        "зробити 5-хвилинну розминку",
-        "провітрити кімнату",
-        "прочитати 10 сторінок книги",
-        "вийти на 15-хвилинну прогулянку",
-        "записати три речі, за які ви вдячні сьогодні"
-    ]
+DAILY_STATIC_TASKS = [
+    "випити води",
+    "зробити 5-хвилинну розминку",
+    "провітрити кімнату",
+    "прочитати 10 сторінок книги",
+    "вийти на 15-хвилинну прогулянку",
+    "записати три речі, за які ви вдячні сьогодні"
+]
+
+
+def _pick_daily_tasks(user):
+    """Choose the first two daily tasks from the user's incomplete sub-tasks,
+    topped up from the static pool."""
+    all_incomplete_subtasks = quest_store.incomplete_sub_task_names(user)
 
     if len(all_incomplete_subtasks) >= 2:
-        chosen_tasks = random.sample(all_incomplete_subtasks, 2)
+        return random.sample(all_incomplete_subtasks, 2)
     elif len(all_incomplete_subtasks) == 1:
-        chosen_tasks = [all_incomplete_subtasks[0], random.choice(static_tasks_pool)]
-    else:
-        chosen_tasks = random.sample(static_tasks_pool, 2)
+        return [all_incomplete_subtasks[0], random.choice(DAILY_STATIC_TASKS)]
+    return random.sample(DAILY_STATIC_TASKS, 2)
+
+
+def _ai_daily_task(chosen_tasks):
+    """Ask the AI for the 3rd (wellbeing) daily task. Raises on failure."""
+    response = llm.complete(
+        [
+            {"role": "system", "content": (
+                f'You are ORIA, a Cyberpunk System Guide. Here are two daily tasks the user already has: '
+                f'"{chosen_tasks[0]}" and "{chosen_tasks[1]}". '
+                'Generate a 3rd unique, very simple daily physical/mental wellbeing task. '
+                'Return ONLY a valid JSON object: {"task": "Task name here", "completed": false, "xp_reward": 20} '
+                'CRITICAL LANGUAGE RULE: You MUST generate the daily quests entirely in Ukrainian.'
+            )}
+        ],
+        temperature=0.7
+    )
+    ai_data = extract_json(response.content)
+    ai_data["id"] = "daily_3"
+    if "completed" not in ai_data:
+        ai_data["completed"] = False
+    if "xp_reward" not in ai_data:
+        ai_data["xp_reward"] = 20
+    return ai_data
+
+
+def _local_daily_task(chosen_tasks):
+    """Cheap non-AI 3rd daily task from the static pool."""
+    options = [t for t in DAILY_STATIC_TASKS if t not in chosen_tasks] or ["Посміхніться своєму відображенню"]
+    return {"id": "daily_3", "task": random.choice(options), "completed": False, "xp_reward": 20}
+
+
+def build_daily_quests(user, use_ai=True, raise_on_ai_error=False, for_date=None):
+    """Build (but do not save) a fresh set of three daily quests for a user.
+
+    daily_3 comes from the shared wellbeing pool (services/wellbeing_pool.py).
+    Only while the pool is still empty is it generated per user: use_ai=False
+    skips that OpenAI call (local fallback), and an AI failure falls back to
+    the local task too, unless raise_on_ai_error is set.
+    """
+    chosen_tasks = _pick_daily_tasks(user)
+    for_date = for_date or datetime.date.today().isoformat()
 
     daily_quests = [
         {"id": "daily_1", "task": chosen_tasks[0], "completed": False, "xp_reward": 20},
         {"id": "daily_2", "task": chosen_tasks[1], "completed": False, "xp_reward": 20}
     ]
 
-    try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": (
-                    f'You are ORIA, a Cyberpunk System Guide. Here are two daily tasks the user already has: '
-                    f'"{chosen_tasks[0]}" and "{chosen_tasks[1]}". '
-                    'Generate a 3rd unique, very simple daily physical/mental wellbeing task. '
-                    'Return ONLY a valid JSON object: {"task": "Task name here", "completed": false, "xp_reward": 20} '
-                    'CRITICAL LANGUAGE RULE: You MUST generate the daily quests entirely in Ukrainian.'
-                )}
-            ],
-            temperature=0.7
-        )
-        raw = response.choices[0].message.content
-        ai_data = extract_json(raw)
-        ai_data["id"] = "daily_3"
-        if "completed" not in ai_data:
-            ai_data["completed"] = False
-        if "xp_reward" not in ai_data:
-            ai_data["xp_reward"] = 20
-        daily_quests.append(ai_data)
-    except Exception as e:
-        logger.error("Error generating AI daily task: %s", e)
-        daily_quests.append({"id": "daily_3", "task": "Посміхніться своєму відображенню", "completed": False, "xp_reward": 20})
+    third = wellbeing_pool.pick_task(user.id, wellbeing_pool.user_language(user), for_date, exclude=chosen_tasks)
+    if third is None and use_ai:
+        try:
+            third = _ai_daily_task(chosen_tasks)
+        except Exception as e:
+            if raise_on_ai_error:
+                raise
+            logger.error("Error generating AI daily task: %s", e)
+    daily_quests.append(third or _local_daily_task(chosen_tasks))
+    return daily_quests
+
+
+def _generate_daily_quests(user):
+    user.set_daily_quests(build_daily_quests(user))
+    user.last_daily_date = datetime.date.today().isoformat()
+    db.session.commit()
+
+
+def _rollover_daily_quests(user, today_str):
+    """Start a new day's dailies without an inline AI call: swap in the set
+    pre-generated by services/daily_pregen.py, or build a local one."""
+    prepared = db.session.get(PreparedDailyQuests, (user.id, today_str))
+    if prepared:
+        daily_quests = prepared.get_quests()
+        db.session.delete(prepared)
+    else:
+        daily_quests = build_daily_quests(user, use_ai=False)
 
     user.set_daily_quests(daily_quests)
     user.last_daily_date = today_str
     db.session.commit()
 
 
-# ─── Onboarding Context Builder ─────────────────────────────────────────────
+# ─── Chat Prompt Assembly ───────────────────────────────────────────────────
+#
+# Every chat prompt starts with a byte-identical static system message (one
+# per surface), so provider-side prompt caching can reuse it across users.
+# Per-user context follows in its own system message, then the running
+# summary and the history (services/chat_context.py).
+
+WEB_CHAT_PREFIX = {
+    "role": "system",
+    "content": (
+        "You are ORIA, a opossum and Productivity Assistant and girl. "
+        "You are an AI connected to the user's chat, helping them level up in real life. "
+        "You act slightly edgy but deeply supportive, breaking tasks into actionable step-by-step quests. "
+        "Your persona should shine through in every response. "
+        "IMPORTANT: If the user asks you to create a quest, or if you suggest a quest and the user agrees, "
+        "you MUST call the `create_rpg_quest` tool to save it to the system. Do not just output it as plain text. "
+        "When you generate a quest, you MUST use the new nested JSON structure. "
+        "You MUST categorize the quest EXACTLY into one of these 4 strings: 'Study & Exams', 'Project & Coding', 'Habits & Routine', 'General'. DO NOT create custom categories under any circumstances. "
+        "You MUST evaluate the complexity of the user's goal and assign the difficulty field to exactly one of these strings: 'Easy', 'Medium', 'Hard', or 'Epic'. Do not always default to Medium. "
+        "Break the main goal into 3-5 high-level 'Modules' (sub_tasks). "
+        "For EACH module, generate 4-8 concrete, actionable 'micro_steps'. "
+        "MUST USE THE EXACT JSON FORMAT DEFINED BY THE TOOL: "
+        "CRITICAL: You have full access to the user's past messages provided in this conversation context. "
+        "NEVER say that you do not have memory of past dialogues. Use the history to provide personalized answers. "
+        "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
+    )
+}
 
-def _build_onboarding_context(user):
-    """Build onboarding context string for AI system prompts."""
-    onboarding = user.get_onboarding_data()
+BOT_CHAT_PREFIX = {
+    "role": "system",
+    "content": (
+        "You are ORIA, a Cyberpunk Productivity Assistant. "
+        "You are interacting with the user via Telegram. "
+        "Act slightly edgy but deeply supportive. "
+        "If the user asks to create a quest, use 'create_rpg_quest' tool. "
+        "Respond strictly in Ukrainian or English."
+    )
+}
+
+
+@functools.lru_cache(maxsize=2048)
+def _render_onboarding_context(onboarding_raw):
+    """Render the USER PROFILE block from the raw onboarding_data JSON.
+    Cached on the raw text, so it is re-parsed only when onboarding changes."""
+    try:
+        onboarding = json.loads(onboarding_raw or '{}')
+    except (TypeError, ValueError):
+        return ""
     if onboarding and any(onboarding.values()):
         return (
-            "\n\nUSER PROFILE (from onboarding — use this to personalise every response):\n"
+            "USER PROFILE (from onboarding — use this to personalise every response):\n"
             f"• About themselves: {onboarding.get('q1', 'N/A')}\n"
             f"• Main goals: {onboarding.get('q2', 'N/A')}\n"
             f"• Favourite hobby: {onboarding.get('q3', 'N/A')}\n"
@@ -208,6 +304,679 @@ def _build_onboarding_context(user):
     return ""
 
 
+def _chat_system_messages(user, prefix):
+    """Static prefix first, then the user's cached profile context (if any)."""
+    messages = [prefix]
+    context = _render_onboarding_context(user.onboarding_data)
+    if context:
+        messages.append({"role": "system", "content": context})
+    return messages
+
+
+def _web_chat_system_messages(user):
+    """System messages for the web app chat."""
+    return _chat_system_messages(user, WEB_CHAT_PREFIX)
+
+
+def _bot_chat_system_messages(user):
+    """System messages for the Telegram bot chat."""
+    return _chat_system_messages(user, BOT_CHAT_PREFIX)
+
+
+# ─── Chat Streaming (Server-Sent Events) ────────────────────────────────────
+
+def _sse(event):
+    """Serialise one event dict as a Server-Sent Events frame."""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def _stream_chat_reply(user_id, user_msg, system_messages):
+    """Generator behind the /chat/stream endpoints.
+
+    Forwards text deltas to the client as they arrive, handles the
+    create_rpg_quest tool call (saving the quest and streaming the follow-up
+    reply) and stores the turn's messages only once the whole turn has finished.
+
+    Takes a user id rather than a User: the view's session is torn down before
+    the response body is streamed, so the user is re-loaded here.
+    """
+    try:
+        user = db.session.get(User, user_id)
+        if not _ai_configured():
+            yield _sse({'type': 'error', 'error': 'AI service configuration error'})
+            return
+
+        chat_history = chat_context.load_history(user)
+        turn_start = len(chat_history)
+        messages = chat_context.build_messages(system_messages, chat_history, user.chat_summary, user_msg)
+
+        reply_parts = []
+        quest_call = None
+        for kind, value in llm.stream(messages, tools=[CREATE_QUEST_TOOL]):
+            if kind == 'content':
+                reply_parts.append(value)
+                yield _sse({'type': 'delta', 'content': value})
+            elif value['name'] == "create_rpg_quest" and quest_call is None:
+                quest_call = value
+
+        chat_history.append({"role": "user", "content": user_msg})
+
+        quest_args = None
+        if quest_call:
+            quest_args = json.loads(quest_call['arguments'])
+            quest_store.append_quest(user, quest_args)
+
+            chat_history.append({
+                "role": "assistant",
+                "content": "".join(reply_parts),
+                "tool_calls": [{
+                    "id": quest_call['id'],
+                    "type": "function",
+                    "function": {
+                        "name": "create_rpg_quest",
+                        "arguments": quest_call['arguments']
+                    }
+                }]
+            })
+            chat_history.append({
+                "role": "tool",
+                "tool_call_id": quest_call['id'],
+                "name": "create_rpg_quest",
+                "content": "Quest successfully saved to database."
+            })
+            yield _sse({'type': 'quest', 'quest': quest_args})
+
+            reply_parts = []
+            followup = chat_context.build_messages(system_messages, chat_history, user.chat_summary)
+            for kind, value in llm.stream(followup):
+                if kind == 'content':
+                    reply_parts.append(value)
+                    yield _sse({'type': 'delta', 'content': value})
+
+        final_reply = "".join(reply_parts)
+        chat_history.append({"role": "assistant", "content": final_reply})
+        _save_chat_turn(user, chat_history, turn_start)
+
+        done = {'type': 'done', 'reply': final_reply, 'quest_added': quest_args is not None}
+        if quest_args is not None:
+            done['quest'] = quest_args
+        yield _sse(done)
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error in chat stream")
+        yield _sse({'type': 'error', 'error': 'An internal error occurred. Please try again.'})
+
+
+def _sse_response(generator):
+    """Wrap an SSE generator in a non-buffered streaming response."""
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # disable proxy buffering (nginx)
+        },
+    )
+
+
+# ─── AI Tasks (shared by the routes and the AI job queue) ──────────────────
+
+def _ai_configured():
+    return llm.configured()
+
+
+def _save_chat_turn(user, chat_history, turn_start):
+    """Append the messages of a finished chat turn (chat_history[turn_start:]);
+    queue summarisation once the unsummarised history has grown."""
+    needs_summary = chat_context.store_turn(user, chat_history[:turn_start], chat_history[turn_start:])
+    db.session.commit()
+    if needs_summary:
+        ai_jobs.enqueue('chat_summary', {'user_id': user.id}, user_id=user.id)
+
+
+def _chat_reply(user, user_msg, system_messages):
+    """Run one chat turn, including the create_rpg_quest tool call.
+    Stores the turn's messages and returns the JSON response payload."""
+    chat_history = chat_context.load_history(user)
+    turn_start = len(chat_history)
+    messages = chat_context.build_messages(system_messages, chat_history, user.chat_summary, user_msg)
+
+    response = llm.complete(messages, tools=[CREATE_QUEST_TOOL])
+    chat_history.append({"role": "user", "content": user_msg})
+
+    tool_call = response.tool_calls[0] if response.tool_calls else None
+    if tool_call and tool_call['name'] == "create_rpg_quest":
+        quest_args = json.loads(tool_call['arguments'])
+        quest_store.append_quest(user, quest_args)
+
+        chat_history.append({
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{
+                "id": tool_call['id'],
+                "type": "function",
+                "function": {
+                    "name": "create_rpg_quest",
+                    "arguments": tool_call['arguments']
+                }
+            }]
+        })
+        chat_history.append({
+            "role": "tool",
+            "tool_call_id": tool_call['id'],
+            "name": "create_rpg_quest",
+            "content": "Quest successfully saved to database."
+        })
+
+        followup = chat_context.build_messages(system_messages, chat_history, user.chat_summary)
+        final_reply = llm.complete(followup).content
+        chat_history.append({"role": "assistant", "content": final_reply})
+
+        _save_chat_turn(user, chat_history, turn_start)
+        return {'reply': final_reply, 'quest_added': True, 'quest': quest_args}
+
+    ai_msg = response.content
+    chat_history.append({"role": "assistant", "content": ai_msg})
+    _save_chat_turn(user, chat_history, turn_start)
+    return {'reply': ai_msg}
+
+
+def _quick_quest(user, goal):
+    """Generate a structured quest for a short goal (Quick Quest).
+    Returns the quest dict, or None if the AI output could not be parsed."""
+
+    quick_quest_prompt = {
+        "role": "user",
+        "content": (
+            f"Analyze the user's goal: '{goal}'. "
+            "You MUST categorize the quest EXACTLY into one of these 4 strings: 'Study & Exams', 'Project & Coding', 'Habits & Routine', 'General'. DO NOT create custom categories under any circumstances. "
+            "You MUST evaluate the complexity of the user's goal and assign the difficulty field to exactly one of these strings: 'Easy', 'Medium', 'Hard', or 'Epic'. Do not always default to Medium. "
+            "Adopt the relevant expert persona (e.g., strict academic tutor for Study). "
+            "Break the master goal into 3-5 high-level 'Modules' (sub_tasks). "
+            "For EACH module, immediately generate 5-8 concrete, actionable 10-minute 'micro_steps'. "
+            "You MUST bypass normal conversation and return the result STRICTLY as a valid JSON object. "
+            "The JSON must have the following structure: "
+            '{"category": "Study & Exams", "title": "Quest Title", "difficulty": "Hard/Medium/Easy/Epic", "progress": 0, "sub_tasks": [{"id": 1, "task": "Module 1: Name", "completed": false, "xp_reward": 50, "micro_steps": [{"id": 101, "task": "Actionable step", "task_description": "A detailed explanation.", "completed": false}, {"id": 102, "task": "Another step", "task_description": "Another explanation.", "completed": false}]}]} '
+            "ALL text values MUST be strictly in English."
+        )
+    }
+
+    raw = llm.complete(_web_chat_system_messages(user) + [quick_quest_prompt], json_mode=True).content
+    try:
+        return extract_json(raw)
+    except (ValueError, json.JSONDecodeError) as parse_err:
+        logger.warning("Quick quest JSON parse error: %s — raw: %s", parse_err, raw[:300])
+        return None
+
+
+def _generate_quiz(topic, for_bot=False):
+    """Generate a multiple-choice quiz for a topic. Returns the list of questions."""
+
+    if for_bot:
+        system_prompt = {
+            "role": "system",
+            "content": (
+                "You are an educational AI assistant. Generate a quiz strictly based on the provided topic. Return ONLY JSON. "
+                "Structure: "
+                '{"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "correct_option_index": 0}]} '
+                "Language: Ukrainian or English (match prompt)."
+            )
+        }
+
+        user_prompt = {
+            "role": "user",
+            "content": f"Create a 3 question multiple-choice quiz about: '{topic}'"
+        }
+    else:
+        system_prompt = {
+            "role": "system",
+            "content": (
+                "You are an educational AI assistant that creates engaging multiple-choice quizzes. "
+                "Generate a quiz strictly based on the provided topic. Return ONLY a valid JSON object. "
+                "The JSON MUST have the structure: "
+                '{"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "correct_option_index": 0}]} '
+                "Ensure there are exactly 4 options for each question, and the correct_option_index is between 0 and 3. "
+                "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
+            )
+        }
+
+        user_prompt = {
+            "role": "user",
+            "content": f"Create a 3-5 question multiple-choice quiz about this specific sub-quest topic: '{topic}'"
+        }
+
+    response = llm.complete([system_prompt, user_prompt], json_mode=True)
+
+    quiz_data = json.loads(response.content)
+    return quiz_data.get('questions', [])
+
+
+def _store_quiz(topic, questions, for_bot=False):
+    """Cache a new quiz variant and queue pre-computed wrong-answer explanations."""
+    if quiz_cache.store(topic, questions, for_bot) and explanation_cache.QUIZ_PRECOMPUTE_EXPLANATIONS:
+        ai_jobs.enqueue('quiz_explanations', {'questions': questions, 'for_bot': for_bot})
+
+
+def _cached_quiz(topic, for_bot=False, generate=True):
+    """Serve a quiz from the shared cache, generating it on a miss (or returning
+    None when generate=False). While the topic has fewer than
+    QUIZ_CACHE_VARIANTS variants, another one is queued."""
+    questions, wants_more = quiz_cache.lookup(topic, for_bot)
+    if questions is None:
+        if not generate:
+            return None
+        questions = _generate_quiz(topic, for_bot)
+        _store_quiz(topic, questions, for_bot)
+    elif wants_more:
+        ai_jobs.enqueue('quiz_variant', {'topic': topic, 'for_bot': for_bot})
+    return questions
+
+
+def _cached_explanation(question, user_answer, correct_answer, for_bot=False):
+    """Explain a quiz answer, memoised in the shared explanation cache."""
+    explanation = explanation_cache.get(question, user_answer, correct_answer, for_bot)
+    if explanation is None:
+        explanation = _explain_quiz_answer(question, user_answer, correct_answer, for_bot)
+        explanation_cache.put(question, user_answer, correct_answer, explanation, for_bot)
+    return explanation
+
+
+def _explain_quiz_answer(question, user_answer, correct_answer, for_bot=False):
+    """Ask the AI to explain a quiz answer. Returns the explanation text."""
+
+    if for_bot:
+        system_prompt = {
+            "role": "system",
+            "content": "You are ORIA. Explain why the user's answer was wrong/correct in 1-2 punchy sentences. Language: Ukrainian or English."
+        }
+
+        user_prompt = {
+            "role": "user",
+            "content": f"Question: {question}\nUser's Answer: {user_answer}\nCorrect Answer: {correct_answer}"
+        }
+    else:
+        system_prompt = {
+            "role": "system",
+            "content": (
+                "You are ORIA, an opossum System Guide. Provide a short, punchy, 1-2 sentence explanation. "
+                "Explain why the user's answer was wrong (if it was) and why the correct answer is right. "
+                "Keep the tone encouraging but slightly edgy. "
+                "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
+            )
+        }
+
+        user_prompt = {
+            "role": "user",
+            "content": f"Question: {question}\nUser's Answer: {user_answer}\nCorrect Answer: {correct_answer}\nPlease explain."
+        }
+
+    return llm.complete([system_prompt, user_prompt]).content
+
+
+# ─── AI Job Handlers (executed by services/ai_jobs.py workers) ─────────────
+
+def _job_user(payload):
+    user = db.session.get(User, payload['user_id'])
+    if not user:
+        raise LookupError(f"User {payload['user_id']} not found")
+    return user
+
+
+@ai_jobs.job_handler('chat')
+def _chat_job(payload):
+    user = _job_user(payload)
+    system_messages = _bot_chat_system_messages(user) if payload.get('for_bot') else _web_chat_system_messages(user)
+    return _chat_reply(user, payload['message'], system_messages)
+
+
+@ai_jobs.job_handler('chat_summary')
+def _chat_summary_job(payload):
+    return {'folded': chat_context.summarize(_job_user(payload))}
+
+
+@ai_jobs.job_handler('quick_quest')
+def _quick_quest_job(payload):
+    quest_data = _quick_quest(_job_user(payload), payload['message'])
+    if quest_data is None:
+        raise ValueError("AI returned an unparseable quick quest")
+    return {'quest': quest_data}
+
+
+@ai_jobs.job_handler('quiz_generate')
+def _quiz_generate_job(payload):
+    return {'quiz': _cached_quiz(payload['topic'], for_bot=payload.get('for_bot', False))}
+
+
+@ai_jobs.job_handler('quiz_variant')
+def _quiz_variant_job(payload):
+    # Several hits may queue a variant at once — re-check before paying for it
+    for_bot = payload.get('for_bot', False)
+    if not quiz_cache.wants_variant(payload['topic'], for_bot):
+        return {'stored': False}
+    _store_quiz(payload['topic'], _generate_quiz(payload['topic'], for_bot=for_bot), for_bot)
+    return {'stored': True}
+
+
+@ai_jobs.job_handler('quiz_explain')
+def _quiz_explain_job(payload):
+    explanation = _cached_explanation(
+        payload['question'], payload['user_answer'], payload['correct_answer'],
+        for_bot=payload.get('for_bot', False),
+    )
+    return {'explanation': explanation}
+
+
+@ai_jobs.job_handler('quiz_explanations')
+def _quiz_explanations_job(payload):
+    """Pre-compute the explanation of every wrong option of a new quiz."""
+    for_bot = payload.get('for_bot', False)
+    computed = 0
+    for question, wrong, correct in explanation_cache.wrong_answer_triples(payload.get('questions', [])):
+        if explanation_cache.contains(question, wrong, correct, for_bot):
+            continue
+        explanation = _explain_quiz_answer(question, wrong, correct, for_bot)
+        explanation_cache.put(question, wrong, correct, explanation, for_bot)
+        computed += 1
+    return {'computed': computed}
+
+
+@ai_jobs.job_handler('daily_quests')
+def _daily_quests_job(payload):
+    user = _job_user(payload)
+    _generate_daily_quests(user)
+    return {'success': True, 'daily_quests': user.get_daily_quests()}
+
+
+def _enqueue_response(kind, payload, user_id=None):
+    """Enqueue an AI job and answer 202 with the job id to poll."""
+    job = ai_jobs.enqueue(kind, payload, user_id=user_id)
+    return jsonify(ai_jobs.job_to_dict(job)), 202
+
+
+# ─── User Mutations (shared by the single routes and /user/batch) ──────────
+# Each takes the user and the request body and returns (response, status).
+# Requests are validated before anything is written, so a rejected mutation
+# leaves no changes behind. None of them commit.
+
+def _commit_mutation(mutation, user, data):
+    """Run one mutation as its own transaction."""
+    body, status = mutation(user, data)
+    if status < 400:
+        db.session.commit()
+    return jsonify(body), status
+
+
+def _commit_state_mutation(mutation, user, data):
+    """Like _commit_mutation, also answering with the new state_version."""
+    body, status = mutation(user, data)
+    if status >= 400:
+        return jsonify(body), status
+    db.session.flush()
+    body['state_version'] = user_state.current_version(user.id)
+    db.session.commit()
+    return jsonify(body), status
+
+
+def _start_user_day(user, today_date=None):
+    """Daily quest rollover and streak update, due on the first load of a day."""
+    today_date = today_date or datetime.date.today()
+    today_str = today_date.isoformat()
+
+    if user.last_daily_date != today_str:
+        _rollover_daily_quests(user, today_str)
+
+    # ── Streak logic ──────────────────────────────────────────────────────────
+    if user.last_active_date != today_str:
+        if user.last_active_date:
+            try:
+                last_active = datetime.date.fromisoformat(user.last_active_date)
+                delta = (today_date - last_active).days
+                if delta == 1:
+                    user.current_streak += 1
+                else:
+                    user.current_streak = 1
+            except ValueError:
+                user.current_streak = 1
+        else:
+            user.current_streak = 1
+
+        user.last_active_date = today_str
+        db.session.commit()
+
+
+def _chat_history_payload(user):
+    """The chat window's messages (tool-call-only assistant turns left out)."""
+    chat_context.ensure_backfilled(user)
+    clean_history = []
+    for msg in chat_context.recent_messages(user.id):
+        if msg.get("role") == "assistant" and not msg.get("content"):
+            continue
+        clean_history.append({
+            "role": msg.get("role"),
+            "content": msg.get("content")
+        })
+    return clean_history
+
+
+def bootstrap_payload(user):
+    """Everything the home page needs on load — state and chat history —
+    for views.home to embed, saving the client two round trips."""
+    _start_user_day(user)
+    return {'state': _user_state_payload(user), 'history': _chat_history_payload(user)}
+
+
+def _user_state_payload(user, include_quests=True):
+    """The state the web client loads; /user/batch returns it without the quest list."""
+    payload = {
+        'level': user.level,
+        'xp': user.xp,
+        'coins': user.coins,
+        'daily_quests': user.get_daily_quests(),
+        'owned_skins': user.get_owned_skins(),
+        'equipped_skin': user.equipped_skin,
+        'current_streak': user.current_streak,
+        'achievements': user.get_achievements(),
+        'claimed_rewards': user.get_claimed_rewards(),
+        'equipped_title': user.equipped_title or '',
+        'state_version': user.state_version or 0,
+    }
+    if include_quests:
+        payload['quests'] = quest_store.load_quests(user)
+    return payload
+
+
+def _award_xp(user, data):
+    try:
+        amount = int(data.get('amount', 0))
+    except (TypeError, ValueError):
+        return {'error': 'Invalid XP amount'}, 400
+
+    if amount <= 0 or amount > MAX_XP_PER_ACTION:
+        return {'error': f'XP amount must be between 1 and {MAX_XP_PER_ACTION}'}, 400
+
+    return awards.award(user, amount, source='action').as_dict(), 200
+
+
+def _complete_miniquest(user, data):
+    if not data or 'global_index' not in data or 'mini_index' not in data:
+        return {'error': 'Missing global_index or mini_index'}, 400
+
+    try:
+        g_idx = int(data['global_index'])
+        m_idx = int(data['mini_index'])
+        micro_idx = data.get('micro_index')
+        if micro_idx is not None:
+            micro_idx = int(micro_idx)
+    except (TypeError, ValueError):
+        return {'error': 'Invalid index format'}, 400
+
+    # Only the touched rows are read and written — not the whole quest list
+    quest = quest_store.quest_at(user, g_idx)
+    if quest is None:
+        return {'error': 'Invalid global quest index'}, 400
+
+    sub_task = quest_store.sub_task_at(quest, m_idx)
+    if sub_task is None:
+        return {'error': 'Invalid mini-quest index'}, 400
+
+    xp_gain = 0
+
+    if micro_idx is not None:
+        step = quest_store.micro_step_at(sub_task, micro_idx)
+        if step is None:
+            return {'error': 'Invalid micro-step index'}, 400
+
+        if quest_store.effective(step, 'completed') or not quest_store.claim_completed(step):
+            return {'error': 'Micro-step already completed'}, 400
+
+        xp_gain += 10  # 10 XP per micro-step
+        quest_store.bump_counters(sub_task, micro_done=1)
+        quest_store.bump_counters(quest, step_done=1)
+
+        if (sub_task.micro_done >= sub_task.micro_total
+                and not quest_store.effective(sub_task, 'completed')
+                and quest_store.claim_completed(sub_task)):
+            xp_gain += quest_store.effective(sub_task, 'xp_reward') or 0
+            quest_store.bump_counters(quest, sub_done=1)
+    else:
+        if quest_store.effective(sub_task, 'completed') or not quest_store.claim_completed(sub_task):
+            return {'error': 'Mini-quest already completed'}, 400
+        xp_gain += quest_store.effective(sub_task, 'xp_reward') or 0
+        # A sub-task with micro-steps counts through its steps, not itself
+        quest_store.bump_counters(quest, sub_done=1, **({} if sub_task.micro_total else {'step_done': 1}))
+
+    # Recalculate global progress
+    quest.progress = quest_store.quest_percent(quest)
+
+    # If all done, mark global quest as completed
+    if quest.progress >= 100 and quest_store.effective(quest, 'status') != 'completed' \
+            and quest_store.claim_quest_completed(quest):
+        master_reward = quest_store.effective(quest, 'xp_reward') or ((quest.sub_total or 0) * 50)
+        xp_gain += master_reward
+
+    return awards.award(user, xp_gain, source='miniquest').as_dict(), 200
+
+
+def _complete_daily(user, data):
+    if not data or 'quest_id' not in data:
+        return {'error': 'Missing quest_id'}, 400
+
+    q_id = str(data['quest_id'])
+    dailies = user.get_daily_quests()
+
+    found = False
+    xp_gain = 0
+    for dq in dailies:
+        if dq.get('id') == q_id:
+            if dq.get('completed'):
+                return {'error': 'Daily quest already completed'}, 400
+            dq['completed'] = True
+            xp_gain = dq.get('xp_reward', 15)
+            found = True
+            break
+
+    if not found:
+        return {'error': 'Daily quest not found'}, 404
+
+    user.set_daily_quests(dailies)
+    flag_modified(user, 'daily_quests')
+
+    return awards.award(user, xp_gain, source='daily').as_dict(), 200
+
+
+def _claim_level_reward(user, data):
+    try:
+        req_level = int((data or {}).get('level', 0))
+    except (TypeError, ValueError):
+        return {'error': 'Invalid level'}, 400
+
+    if req_level not in LEVEL_REWARDS:
+        return {'error': 'Unknown reward level'}, 400
+
+    if user.level < req_level:
+        return {'error': f'You need to be Level {req_level} to claim this reward'}, 403
+
+    # Mark as claimed first (a conditional UPDATE — only one request wins)
+    if not user_state.claim_reward(user, req_level):
+        return {'error': 'Reward already claimed'}, 409
+
+    reward = LEVEL_REWARDS[req_level]
+
+    # Grant coin reward
+    if reward['coins'] > 0:
+        awards.award(user, coins=reward['coins'], source='reward')
+
+    return {
+        'success': True,
+        'coins': user.coins,
+        'claimed_rewards': user.get_claimed_rewards(),
+        'unlocked_title': reward['title'],
+        'coins_granted': reward['coins'],
+    }, 200
+
+
+def _equip_skin(user, data):
+    if not data or 'skin_id' not in data:
+        return {'error': 'Invalid payload'}, 400
+
+    skin_id = data['skin_id']
+    owned_skins = user.get_owned_skins()
+
+    if skin_id not in owned_skins:
+        return {'error': 'Skin not owned'}, 400
+
+    user.equipped_skin = skin_id
+    return {'success': True, 'equipped_skin': skin_id}, 200
+
+
+def _replace_state(user, data):
+    if not data:
+        return {'error': 'Invalid payload'}, 400
+
+    # Accept quest structure and daily quest state (no raw xp/level/coins)
+    if isinstance(data.get('quests'), list):
+        quest_store.replace_quests(user, data['quests'])
+    if 'daily_quests' in data:
+        user.set_daily_quests(data['daily_quests'])
+
+    # Persist claimed rewards and equipped title
+    if 'claimed_rewards' in data:
+        if isinstance(data['claimed_rewards'], list):
+            rewards = data['claimed_rewards']
+            if 1 not in rewards:
+                rewards.insert(0, 1)
+            user.set_claimed_rewards(rewards)
+    if 'equipped_title' in data:
+        user.equipped_title = str(data['equipped_title'])[:64]
+
+    if 'achievements' in data:
+        user.set_achievements(data['achievements'])
+
+    # Achievement checks are still done against authoritative server-side values
+    return _achievements_response(user, data.get('quests') or []), 200
+
+
+def _patch_state(user, data):
+    """Raises user_state.PatchError after a partial write — the caller rolls back."""
+    if not data or 'patch' not in data or 'version' not in data:
+        return {'error': 'Missing version or patch'}, 400
+
+    if not user_state.claim_version(user, data['version']):
+        return {'error': 'State has changed', 'state_version': user_state.current_version(user.id)}, 409
+
+    changed_quests = user_state.apply_patch(user, data['patch'])
+    return _achievements_response(user, changed_quests), 200
+
+
+def _achievements_response(user, quests):
+    response_data = {'success': True}
+    newly_unlocked = _check_achievements(user, quests)
+    if newly_unlocked:
+        response_data['newly_unlocked'] = newly_unlocked
+    return response_data
+
+
 # ─── Routes ─────────────────────────────────────────────────────────────────
 
 @api_bp.route('/tg_webapp_login', methods=['POST'])
@@ -281,40 +1050,15 @@ def get_user_state():
     today_date = datetime.date.today()
     today_str = today_date.isoformat()
 
-    if user.last_daily_date != today_str:
-        _generate_daily_quests(user)
-
-    # ── Streak logic ──────────────────────────────────────────────────────────
-    if user.last_active_date != today_str:
-        if user.last_active_date:
-            try:
-                last_active = datetime.date.fromisoformat(user.last_active_date)
-                delta = (today_date - last_active).days
-                if delta == 1:
-                    user.current_streak += 1
-                else:
-                    user.current_streak = 1
-            except ValueError:
-                user.current_streak = 1
-        else:
-            user.current_streak = 1
+    # Unchanged since the client's copy (and no daily rollover / streak update due)
+    if user.last_daily_date == today_str and user.last_active_date == today_str:
+        not_modified = _not_modified(user_state.etag(user))
+        if not_modified:
+            return not_modified
 
-        user.last_active_date = today_str
-        db.session.commit()
+    _start_user_day(user, today_date)
 
-    return jsonify({
-        'level': user.level,
-        'xp': user.xp,
-        'coins': user.coins,
-        'quests': user.get_quests(),
-        'daily_quests': user.get_daily_quests(),
-        'owned_skins': user.get_owned_skins(),
-        'equipped_skin': user.equipped_skin,
-        'current_streak': user.current_streak,
-        'achievements': user.get_achievements(),
-        'claimed_rewards': user.get_claimed_rewards(),
-        'equipped_title': user.equipped_title or ''
-    })
+    return _with_etag(jsonify(_user_state_payload(user)), user_state.etag(user))
 
 
 @api_bp.route('/user/daily_refresh', methods=['POST'])
@@ -325,6 +1069,9 @@ def refresh_daily_quests():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
+    if (request.get_json(silent=True) or {}).get('async'):
+        return _enqueue_response('daily_quests', {'user_id': user.id}, user_id=user.id)
+
     _generate_daily_quests(user)
 
     return jsonify({
@@ -342,100 +1089,7 @@ def user_miniquest_complete():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    data = request.json
-    if not data or 'global_index' not in data or 'mini_index' not in data:
-        return jsonify({'error': 'Missing global_index or mini_index'}), 400
-
-    quests = user.get_quests()
-    try:
-        g_idx = int(data['global_index'])
-        m_idx = int(data['mini_index'])
-        micro_idx = data.get('micro_index')
-        if micro_idx is not None:
-            micro_idx = int(micro_idx)
-    except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid index format'}), 400
-
-    if g_idx < 0 or g_idx >= len(quests):
-        return jsonify({'error': 'Invalid global quest index'}), 400
-
-    quest = quests[g_idx]
-    sub_tasks = quest.get('sub_tasks', [])
-
-    if m_idx < 0 or m_idx >= len(sub_tasks):
-        return jsonify({'error': 'Invalid mini-quest index'}), 400
-
-    sub_task = sub_tasks[m_idx]
-    xp_gain = 0
-
-    if micro_idx is not None:
-        micro_steps = sub_task.get('micro_steps', [])
-        if micro_idx < 0 or micro_idx >= len(micro_steps):
-            return jsonify({'error': 'Invalid micro-step index'}), 400
-            
-        step = micro_steps[micro_idx]
-        if step.get('completed'):
-            return jsonify({'error': 'Micro-step already completed'}), 400
-            
-        step['completed'] = True
-        xp_gain += 10  # 10 XP per micro-step
-        
-        if all(s.get('completed') for s in micro_steps) and not sub_task.get('completed'):
-            sub_task['completed'] = True
-            xp_gain += sub_task.get('xp_reward', 0)
-    else:
-        if sub_task.get('completed'):
-            return jsonify({'error': 'Mini-quest already completed'}), 400
-        sub_task['completed'] = True
-        xp_gain += sub_task.get('xp_reward', 0)
-
-    # Recalculate global progress
-    def quest_progress(q):
-        comp = 0
-        tot = 0
-        for st in q.get('sub_tasks', []):
-            ms = st.get('micro_steps')
-            if ms and isinstance(ms, list) and len(ms) > 0:
-                tot += len(ms)
-                comp += sum(1 for s in ms if s.get('completed'))
-            else:
-                tot += 1
-                if st.get('completed'):
-                    comp += 1
-        return comp, tot
-
-    c, t = quest_progress(quest)
-    quest['progress'] = int((c / t) * 100) if t > 0 else 100
-
-    # If all done, mark global quest as completed
-    if quest['progress'] >= 100 and quest.get('status') != 'completed':
-        quest['status'] = 'completed'
-        master_reward = quest.get('xp_reward') or (len(sub_tasks) * 50)
-        xp_gain += master_reward
-
-    user.xp += xp_gain
-    user.coins += xp_gain // 2
-
-    # Inform SQLAlchemy that the JSON list has changed
-    user.set_quests(quests)
-    flag_modified(user, 'quests')
-
-    leveled_up = False
-    while user.xp >= 100:
-        user.level += 1
-        user.xp -= 100
-        leveled_up = True
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'xp': user.xp,
-        'coins': user.coins,
-        'level': user.level,
-        'leveled_up': leveled_up,
-        'new_level': user.level if leveled_up else None
-    })
+    return _commit_mutation(_complete_miniquest, user, request.json)
 
 @api_bp.route('/user/daily/complete', methods=['POST'])
 def user_daily_complete():
@@ -446,49 +1100,7 @@ def user_daily_complete():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    data = request.json
-    if not data or 'quest_id' not in data:
-        return jsonify({'error': 'Missing quest_id'}), 400
-
-    q_id = str(data['quest_id'])
-    dailies = user.get_daily_quests()
-    
-    found = False
-    xp_gain = 0
-    for dq in dailies:
-        if dq.get('id') == q_id:
-            if dq.get('completed'):
-                return jsonify({'error': 'Daily quest already completed'}), 400
-            dq['completed'] = True
-            xp_gain = dq.get('xp_reward', 15)
-            found = True
-            break
-            
-    if not found:
-        return jsonify({'error': 'Daily quest not found'}), 404
-
-    user.xp += xp_gain
-    user.coins += xp_gain // 2
-
-    user.set_daily_quests(dailies)
-    flag_modified(user, 'daily_quests')
-
-    leveled_up = False
-    while user.xp >= 100:
-        user.level += 1
-        user.xp -= 100
-        leveled_up = True
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'xp': user.xp,
-        'coins': user.coins,
-        'level': user.level,
-        'leveled_up': leveled_up,
-        'new_level': user.level if leveled_up else None
-    })
+    return _commit_mutation(_complete_daily, user, request.json)
 
 
 @api_bp.route('/user/update', methods=['POST'])
@@ -503,41 +1115,100 @@ def update_user_state():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
+    return _commit_state_mutation(_replace_state, user, request.json)
+
+
+@api_bp.route('/user/patch', methods=['POST', 'PATCH'])
+def patch_user_state():
+    """Apply a JSON Patch (RFC 6902) to the user's state document.
+    Body: {"version": <state_version the patch was computed against>,
+           "patch": [{"op": "replace", "path": "/quests/0/sub_tasks/1/quiz_score", "value": 80}, ...]}
+    Only the touched quests / fields are rewritten. 409 if the document has
+    changed since `version` — the client then re-sends its full state."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    user = db.session.get(User, session['user_id'])
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    try:
+        return _commit_state_mutation(_patch_state, user, request.json)
+    except user_state.PatchError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+# Mutations /user/batch accepts, by operation type
+BATCH_MUTATIONS = {
+    'award_xp': _award_xp,
+    'miniquest_complete': _complete_miniquest,
+    'daily_complete': _complete_daily,
+    'claim_reward': _claim_level_reward,
+    'equip_skin': _equip_skin,
+    'update_state': _replace_state,
+    'patch_state': _patch_state,
+}
+BATCH_MAX_OPERATIONS = 50
+
+
+@api_bp.route('/user/batch', methods=['POST'])
+def user_batch():
+    """Apply an ordered list of mutations in one transaction.
+    Body: {"operations": [{"type": "award_xp", "amount": 10},
+                          {"type": "patch_state", "version": 7, "patch": [...]}, ...]}
+    Every operation gets a result (its single-route response plus "status");
+    a rejected one changes nothing and the rest still apply. A patch that
+    fails half-way rolls the whole batch back (400 with its "index").
+    Returns the results, the final state minus the quest list, and the
+    state_version the batch started from (base_version)."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    user = db.session.get(User, session['user_id'])
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
     data = request.json
-    if not data:
-        return jsonify({'error': 'Invalid payload'}), 400
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'Missing operations'}), 400
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return jsonify({'error': f'At most {BATCH_MAX_OPERATIONS} operations per batch'}), 400
+
+    base_version = user.state_version or 0
+    results = []
+    for index, operation in enumerate(operations):
+        mutation = BATCH_MUTATIONS.get(operation.get('type')) if isinstance(operation, dict) else None
+        if mutation is None:
+            results.append({'error': 'Invalid operation type', 'status': 400})
+            continue
+        try:
+            body, status = mutation(user, operation)
+        except user_state.PatchError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e), 'index': index}), 400
+        body['status'] = status
+        results.append(body)
+
+    db.session.flush()
+    db.session.expire(user, ['state_version'])
+    state = _user_state_payload(user, include_quests=False)
+    db.session.commit()
 
-    # Accept quest structure and daily quest state (no raw xp/level/coins)
-    if 'quests' in data:
-        user.set_quests(data['quests'])
-    if 'daily_quests' in data:
-        user.set_daily_quests(data['daily_quests'])
+    return jsonify({'success': True, 'results': results, 'state': state, 'base_version': base_version})
 
-    # Persist claimed rewards and equipped title
-    if 'claimed_rewards' in data:
-        if isinstance(data['claimed_rewards'], list):
-            rewards = data['claimed_rewards']
-            if 1 not in rewards:
-                rewards.insert(0, 1)
-            user.set_claimed_rewards(rewards)
-    if 'equipped_title' in data:
-        user.equipped_title = str(data['equipped_title'])[:64]
 
-    # Achievement checks are still done against authoritative server-side values
+def _check_achievements(user, quests):
+    """Unlock achievements earned per the authoritative server-side values (and
+    the quests the client just saved). Returns the newly unlocked ids."""
     current_achievements = user.get_achievements()
-    if 'achievements' in data:
-        user.set_achievements(data['achievements'])
-        current_achievements = user.get_achievements()
-
     newly_unlocked = []
 
     if 'initiate' not in current_achievements:
         has_completed_task = False
-        if 'quests' in data:
-            for q in data['quests']:
-                if q.get('status') == 'completed' or any(st.get('completed') for st in q.get('sub_tasks', [])):
-                    has_completed_task = True
-                    break
+        for q in quests:
+            if q.get('status') == 'completed' or any(st.get('completed') for st in q.get('sub_tasks', [])):
+                has_completed_task = True
+                break
         if has_completed_task or user.xp > 0 or user.level > 1 or user.coins > 0:
             current_achievements.append('initiate')
             newly_unlocked.append('initiate')
@@ -545,18 +1216,11 @@ def update_user_state():
     if 'on_fire' not in current_achievements:
         if user.current_streak >= 3:
             current_achievements.append('on_fire')
-            newly_unlocked.append('on_fire')
-
-    if newly_unlocked:
-        user.set_achievements(current_achievements)
-
-    db.session.commit()
-
-    response_data = {'success': True}
-    if newly_unlocked:
-        response_data['newly_unlocked'] = newly_unlocked
+            newly_unlocked.append('on_fire')
 
-    return jsonify(response_data)
+    if newly_unlocked:
+        user.set_achievements(current_achievements)
+    return newly_unlocked
 
 
 # Reward definitions: level → { 'coins': N, 'title': str_or_None }
@@ -582,40 +1246,7 @@ def claim_reward():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    data = request.json
-    try:
-        req_level = int(data.get('level', 0))
-    except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid level'}), 400
-
-    if req_level not in LEVEL_REWARDS:
-        return jsonify({'error': 'Unknown reward level'}), 400
-
-    if user.level < req_level:
-        return jsonify({'error': f'You need to be Level {req_level} to claim this reward'}), 403
-
-    claimed = user.get_claimed_rewards()
-    if req_level in claimed:
-        return jsonify({'error': 'Reward already claimed'}), 409
-
-    reward = LEVEL_REWARDS[req_level]
-
-    # Grant coin reward
-    if reward['coins'] > 0:
-        user.coins += reward['coins']
-
-    # Mark as claimed
-    claimed.append(req_level)
-    user.set_claimed_rewards(claimed)
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'coins': user.coins,
-        'claimed_rewards': user.get_claimed_rewards(),
-        'unlocked_title': reward['title'],
-        'coins_granted': reward['coins'],
-    })
+    return _commit_mutation(_claim_level_reward, user, request.json)
 
 
 @api_bp.route('/user/action', methods=['POST'])
@@ -631,33 +1262,7 @@ def user_action():
     if not data or data.get('type') != 'award_xp':
         return jsonify({'error': 'Invalid action type'}), 400
 
-    try:
-        amount = int(data.get('amount', 0))
-    except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid XP amount'}), 400
-
-    if amount <= 0 or amount > MAX_XP_PER_ACTION:
-        return jsonify({'error': f'XP amount must be between 1 and {MAX_XP_PER_ACTION}'}), 400
-
-    user.xp += amount
-    user.coins += amount // 2
-
-    leveled_up = False
-    while user.xp >= 100:
-        user.level += 1
-        user.xp -= 100
-        leveled_up = True
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'xp': user.xp,
-        'coins': user.coins,
-        'level': user.level,
-        'leveled_up': leveled_up,
-        'new_level': user.level if leveled_up else None
-    })
+    return _commit_mutation(_award_xp, user, data)
 
 
 @api_bp.route('/chat', methods=['POST'])
@@ -675,141 +1280,44 @@ def api_chat():
     user_msg = data['message']
     is_quick_quest = data.get('quick_quest', False)
 
-    chat_history = user.get_chat_history()
-    onboarding_context = _build_onboarding_context(user)
-
-    system_prompt = {
-        "role": "system",
-        "content": (
-            "You are ORIA, a opossum and Productivity Assistant and girl. "
-            "You are an AI connected to the user's chat, helping them level up in real life. "
-            "You act slightly edgy but deeply supportive, breaking tasks into actionable step-by-step quests. "
-            "Your persona should shine through in every response. "
-            "IMPORTANT: If the user asks you to create a quest, or if you suggest a quest and the user agrees, "
-            "you MUST call the `create_rpg_quest` tool to save it to the system. Do not just output it as plain text. "
-            "When you generate a quest, you MUST use the new nested JSON structure. "
-            "You MUST categorize the quest EXACTLY into one of these 4 strings: 'Study & Exams', 'Project & Coding', 'Habits & Routine', 'General'. DO NOT create custom categories under any circumstances. "
-            "You MUST evaluate the complexity of the user's goal and assign the difficulty field to exactly one of these strings: 'Easy', 'Medium', 'Hard', or 'Epic'. Do not always default to Medium. "
-            "Break the main goal into 3-5 high-level 'Modules' (sub_tasks). "
-            "For EACH module, generate 4-8 concrete, actionable 'micro_steps'. "
-            "MUST USE THE EXACT JSON FORMAT DEFINED BY THE TOOL: "
-            "CRITICAL: You have full access to the user's past messages provided in this conversation context. "
-            "NEVER say that you do not have memory of past dialogues. Use the history to provide personalized answers. "
-            "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
-            + onboarding_context
-        )
-    }
+    if not _ai_configured():
+        return jsonify({'error': 'AI service configuration error'}), 500
 
-    if is_quick_quest:
-        quick_quest_prompt = {
-            "role": "user",
-            "content": (
-                f"Analyze the user's goal: '{user_msg}'. "
-                "You MUST categorize the quest EXACTLY into one of these 4 strings: 'Study & Exams', 'Project & Coding', 'Habits & Routine', 'General'. DO NOT create custom categories under any circumstances. "
-                "You MUST evaluate the complexity of the user's goal and assign the difficulty field to exactly one of these strings: 'Easy', 'Medium', 'Hard', or 'Epic'. Do not always default to Medium. "
-                "Adopt the relevant expert persona (e.g., strict academic tutor for Study). "
-                "Break the master goal into 3-5 high-level 'Modules' (sub_tasks). "
-                "For EACH module, immediately generate 5-8 concrete, actionable 10-minute 'micro_steps'. "
-                "You MUST bypass normal conversation and return the result STRICTLY as a valid JSON object. "
-                "The JSON must have the following structure: "
-                '{"category": "Study & Exams", "title": "Quest Title", "difficulty": "Hard/Medium/Easy/Epic", "progress": 0, "sub_tasks": [{"id": 1, "task": "Module 1: Name", "completed": false, "xp_reward": 50, "micro_steps": [{"id": 101, "task": "Actionable step", "task_description": "A detailed explanation.", "completed": false}, {"id": 102, "task": "Another step", "task_description": "Another explanation.", "completed": false}]}]} '
-                "ALL text values MUST be strictly in English."
-            )
-        }
-        messages = [system_prompt, quick_quest_prompt]
-    else:
-        messages = [system_prompt] + chat_history
-        messages.append({"role": "user", "content": user_msg})
+    if data.get('async'):
+        kind = 'quick_quest' if is_quick_quest else 'chat'
+        return _enqueue_response(kind, {'user_id': user.id, 'message': user_msg}, user_id=user.id)
 
     try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({'error': 'AI service configuration error'}), 500
-
-        client = OpenAI(api_key=api_key)
-
-        tools = [CREATE_QUEST_TOOL]
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            response_format={"type": "json_object"} if is_quick_quest else None,
-            tools=None if is_quick_quest else tools,
-            tool_choice="auto" if not is_quick_quest else None
-        )
-
-        response_message = response.choices[0].message
-
-        if not is_quick_quest:
-            if response_message.tool_calls:
-                tool_call = response_message.tool_calls[0]
-                if tool_call.function.name == "create_rpg_quest":
-                    quest_args = json.loads(tool_call.function.arguments)
-
-                    user_quests = user.get_quests()
-                    user_quests.append(quest_args)
-                    user.set_quests(user_quests)
-
-                    chat_history.append({"role": "user", "content": user_msg})
-                    chat_history.append({
-                        "role": "assistant",
-                        "content": "",
-                        "tool_calls": [{
-                            "id": tool_call.id,
-                            "type": "function",
-                            "function": {
-                                "name": "create_rpg_quest",
-                                "arguments": tool_call.function.arguments
-                            }
-                        }]
-                    })
-                    chat_history.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": "create_rpg_quest",
-                        "content": "Quest successfully saved to database."
-                    })
-
-                    second_response = client.chat.completions.create(
-                        model="gpt-4o-mini",
-                        messages=[system_prompt] + chat_history
-                    )
-                    final_reply = second_response.choices[0].message.content
-                    chat_history.append({"role": "assistant", "content": final_reply})
-
-                    if len(chat_history) > 20:
-                        chat_history = chat_history[-20:]
-
-                    user.set_chat_history(chat_history)
-                    db.session.commit()
-
-                    return jsonify({'reply': final_reply, 'quest_added': True, 'quest': quest_args})
-            else:
-                ai_msg = response_message.content
-                chat_history.append({"role": "user", "content": user_msg})
-                chat_history.append({"role": "assistant", "content": ai_msg})
-
-                if len(chat_history) > 20:
-                    chat_history = chat_history[-20:]
-
-                user.set_chat_history(chat_history)
-                db.session.commit()
-
-                return jsonify({'reply': ai_msg})
-        else:
-            raw = response_message.content
-            try:
-                quest_data = extract_json(raw)
-            except (ValueError, json.JSONDecodeError) as parse_err:
-                logger.warning("Quick quest JSON parse error: %s — raw: %s", parse_err, raw[:300])
+        if is_quick_quest:
+            quest_data = _quick_quest(user, user_msg)
+            if quest_data is None:
                 return jsonify({'error': 'AI returned an unparseable response. Please try again.'}), 500
             return jsonify({'quest': quest_data})
 
+        return jsonify(_chat_reply(user, user_msg, _web_chat_system_messages(user)))
+
     except Exception as e:
         logger.exception("Error in /api/chat")
         return jsonify({'error': 'An internal error occurred. Please try again.'}), 500
 
 
+@api_bp.route('/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """Streaming variant of /api/chat: replies arrive as Server-Sent Events
+    ('delta', 'quest', 'done' or 'error') instead of one JSON blob."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    user = db.session.get(User, session['user_id'])
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    data = request.json
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Invalid payload'}), 400
+
+    return _sse_response(_stream_chat_reply(user.id, data['message'], _web_chat_system_messages(user)))
+
+
 @api_bp.route('/chat/history', methods=['GET'])
 def api_chat_history():
     if 'user_id' not in session:
@@ -818,19 +1326,13 @@ def api_chat_history():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    raw_history = user.get_chat_history()
+    chat_context.ensure_backfilled(user)
+    etag = chat_context.history_etag(user.id)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
 
-    clean_history = []
-    for msg in raw_history:
-        if msg.get("role") in ["user", "assistant"]:
-            if msg.get("role") == "assistant" and not msg.get("content"):
-                continue
-            clean_history.append({
-                "role": msg.get("role"),
-                "content": msg.get("content")
-            })
-
-    return jsonify({'history': clean_history})
+    return _with_etag(jsonify({'history': _chat_history_payload(user)}), etag)
 
 
 @api_bp.route('/quiz/generate', methods=['POST'])
@@ -844,38 +1346,18 @@ def api_quiz_generate():
 
     topic = data['topic']
 
-    try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({'error': 'AI service configuration error'}), 500
-
-        client = OpenAI(api_key=api_key)
-
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are an educational AI assistant that creates engaging multiple-choice quizzes. "
-                "Generate a quiz strictly based on the provided topic. Return ONLY a valid JSON object. "
-                "The JSON MUST have the structure: "
-                '{"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "correct_option_index": 0}]} '
-                "Ensure there are exactly 4 options for each question, and the correct_option_index is between 0 and 3. "
-                "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
-            )
-        }
-
-        user_prompt = {
-            "role": "user",
-            "content": f"Create a 3-5 question multiple-choice quiz about this specific sub-quest topic: '{topic}'"
-        }
+    if not _ai_configured():
+        return jsonify({'error': 'AI service configuration error'}), 500
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[system_prompt, user_prompt],
-            response_format={"type": "json_object"}
-        )
+    try:
+        if data.get('async'):
+            # Cache hits are answered right away; only misses go through the queue
+            quiz = _cached_quiz(topic, generate=False)
+            if quiz is None:
+                return _enqueue_response('quiz_generate', {'topic': topic}, user_id=session['user_id'])
+            return jsonify({'quiz': quiz})
 
-        quiz_data = json.loads(response.choices[0].message.content)
-        return jsonify({'quiz': quiz_data.get('questions', [])})
+        return jsonify({'quiz': _cached_quiz(topic)})
 
     except Exception as e:
         logger.exception("Error in /api/quiz/generate")
@@ -895,39 +1377,36 @@ def api_quiz_explain():
     user_answer = data['user_answer']
     correct_answer = data['correct_answer']
 
+    if not _ai_configured():
+        return jsonify({'error': 'AI service configuration error'}), 500
+
     try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        if not api_key:
-            return jsonify({'error': 'AI service configuration error'}), 500
+        if data.get('async'):
+            # Cache hits are answered right away; only misses go through the queue
+            explanation = explanation_cache.get(question, user_answer, correct_answer)
+            if explanation is None:
+                payload = {'question': question, 'user_answer': user_answer, 'correct_answer': correct_answer}
+                return _enqueue_response('quiz_explain', payload, user_id=session['user_id'])
+            return jsonify({'explanation': explanation})
 
-        client = OpenAI(api_key=api_key)
+        return jsonify({'explanation': _cached_explanation(question, user_answer, correct_answer)})
 
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are ORIA, an opossum System Guide. Provide a short, punchy, 1-2 sentence explanation. "
-                "Explain why the user's answer was wrong (if it was) and why the correct answer is right. "
-                "Keep the tone encouraging but slightly edgy. "
-                "CRITICAL LANGUAGE RULE: You are strictly restricted to communicating, generating quests, and writing JSON ONLY in Ukrainian or English. If the user prompts you in Ukrainian, generate everything in Ukrainian. If the user prompts you in English, generate everything in English. If the user writes in ANY OTHER language, you must completely ignore that language and respond strictly in Ukrainian."
-            )
-        }
+    except Exception as e:
+        logger.exception("Error in /api/quiz/explain")
+        return jsonify({'error': 'An internal error occurred. Please try again.'}), 500
 
-        user_prompt = {
-            "role": "user",
-            "content": f"Question: {question}\nUser's Answer: {user_answer}\nCorrect Answer: {correct_answer}\nPlease explain."
-        }
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[system_prompt, user_prompt]
-        )
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """Poll an AI job enqueued with {"async": true}."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
 
-        explanation = response.choices[0].message.content
-        return jsonify({'explanation': explanation})
+    job = db.session.get(AIJob, job_id)
+    if not job or job.user_id != session['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
 
-    except Exception as e:
-        logger.exception("Error in /api/quiz/explain")
-        return jsonify({'error': 'An internal error occurred. Please try again.'}), 500
+    return jsonify(ai_jobs.job_to_dict(job))
 
 
 @api_bp.route('/store/roulette', methods=['POST'])
@@ -982,40 +1461,59 @@ def api_store_equip():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    data = request.json
-    if not data or 'skin_id' not in data:
-        return jsonify({'error': 'Invalid payload'}), 400
+    return _commit_mutation(_equip_skin, user, request.json)
 
-    skin_id = data['skin_id']
-    owned_skins = user.get_owned_skins()
 
-    if skin_id not in owned_skins:
-        return jsonify({'error': 'Skin not owned'}), 400
+@api_bp.route('/leaderboard', methods=['GET'])
+def api_leaderboard():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
 
-    user.equipped_skin = skin_id
-    db.session.commit()
-    return jsonify({'success': True, 'equipped_skin': skin_id})
+    user_id = session['user_id']
+    if request.args.get('period'):
+        return _windowed_leaderboard(request.args['period'], user_id)
 
+    # Top list from the in-memory snapshot; the caller's rank and neighbours
+    # from index range counts (no queries at all when they are on the board)
+    me, around = leaderboard.standing(user_id)
 
-@api_bp.route('/leaderboard', methods=['GET'])
-def api_leaderboard():
+    return jsonify({
+        'leaderboard': [leaderboard.public(e, user_id) for e in leaderboard.top()],
+        'me': leaderboard.public(me, user_id) if me else None,
+        'around': [leaderboard.public(e, user_id) for e in around],
+    })
+
+
+def _windowed_leaderboard(period, user_id=None):
+    """Most XP gained this day / week / month (?period=…), from the XP ledger rollups."""
+    if period not in xp_ledger.PERIODS:
+        return jsonify({'error': f"period must be one of: {', '.join(xp_ledger.PERIODS)}"}), 400
+
+    start, entries = xp_ledger.top(period, leaderboard.LEADERBOARD_SIZE)
+    response = {
+        'period': period,
+        'period_start': start.isoformat(),
+        'leaderboard': [leaderboard.public(e, user_id) for e in entries],
+    }
+    if user_id is not None:
+        response['xp_gained'] = xp_ledger.history(user_id, period, 1)[0]['xp']
+    return jsonify(response)
+
+
+@api_bp.route('/user/xp_history', methods=['GET'])
+def api_xp_history():
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
 
-    top_users = User.query.order_by(User.level.desc(), User.xp.desc()).limit(10).all()
-    leaderboard = []
-
-    for u in top_users:
-        leaderboard.append({
-            "username": u.username,
-            "level": u.level,
-            "xp": u.xp,
-            "current_streak": u.current_streak,
-            "equipped_title": u.equipped_title or '',
-            "is_current_user": u.id == session['user_id']
-        })
+    period = request.args.get('period', 'day')
+    if period not in xp_ledger.PERIODS:
+        return jsonify({'error': f"period must be one of: {', '.join(xp_ledger.PERIODS)}"}), 400
+    try:
+        count = min(max(int(request.args.get('count', 30)), 1), 366)
+    except ValueError:
+        return jsonify({'error': 'count must be an integer'}), 400
 
-    return jsonify({'leaderboard': leaderboard})
+    return jsonify({'period': period, 'history': xp_ledger.history(session['user_id'], period, count)})
 
 
 
@@ -1030,7 +1528,7 @@ def bot_check_user():
         return jsonify({'error': 'Missing telegram_id'}), 400
 
     tg_id = str(data['telegram_id'])
-    user = User.query.filter_by(telegram_id=tg_id).first()
+    user = user_queries.profile_by_telegram_id(tg_id)
 
     if user:
         return jsonify({
@@ -1062,7 +1560,7 @@ def bot_get_state():
         'level': user.level,
         'xp': user.xp,
         'coins': user.coins,
-        'quests': user.get_quests(),
+        'quests': quest_store.load_quests(user),
         'daily_quests': user.get_daily_quests(),
         'current_streak': user.current_streak,
         'achievements': user.get_achievements(),
@@ -1213,33 +1711,7 @@ def bot_user_action():
     if data.get('type') != 'award_xp':
         return jsonify({'error': 'Invalid action type'}), 400
 
-    try:
-        amount = int(data.get('amount', 0))
-    except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid XP amount'}), 400
-
-    if amount <= 0 or amount > MAX_XP_PER_ACTION:
-        return jsonify({'error': f'XP amount must be between 1 and {MAX_XP_PER_ACTION}'}), 400
-
-    user.xp += amount
-    user.coins += amount // 2
-
-    leveled_up = False
-    while user.xp >= 100:
-        user.level += 1
-        user.xp -= 100
-        leveled_up = True
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'xp': user.xp,
-        'coins': user.coins,
-        'level': user.level,
-        'leveled_up': leveled_up,
-        'new_level': user.level if leveled_up else None
-    })
+    return _commit_mutation(_award_xp, user, data)
 
 
 @api_bp.route('/bot/user/update', methods=['POST'])
@@ -1253,8 +1725,8 @@ def bot_user_update():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    if 'quests' in data:
-        user.set_quests(data['quests'])
+    if isinstance(data.get('quests'), list):
+        quest_store.replace_quests(user, data['quests'])
     if 'daily_quests' in data:
         user.set_daily_quests(data['daily_quests'])
     if 'claimed_rewards' in data:
@@ -1277,91 +1749,49 @@ def bot_chat():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    onboarding_context = _build_onboarding_context(user)
-
-    system_prompt = {
-        "role": "system",
-        "content": (
-            "You are ORIA, a Cyberpunk Productivity Assistant. "
-            "You are interacting with the user via Telegram. "
-            "Act slightly edgy but deeply supportive. "
-            "If the user asks to create a quest, use 'create_rpg_quest' tool. "
-            "Respond strictly in Ukrainian or English."
-            + onboarding_context
-        )
-    }
-
     user_msg = data['message']
-    chat_history = user.get_chat_history()
-    messages = [system_prompt] + chat_history + [{"role": "user", "content": user_msg}]
 
-    try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        client = OpenAI(api_key=api_key)
-        tools = [CREATE_QUEST_TOOL]
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            tools=tools,
-            tool_choice="auto"
-        )
+    if data.get('async'):
+        payload = {'user_id': user.id, 'message': user_msg, 'for_bot': True}
+        return _enqueue_response('chat', payload, user_id=user.id)
 
-        response_message = response.choices[0].message
-        if response_message.tool_calls:
-            tool_call = response_message.tool_calls[0]
-            if tool_call.function.name == "create_rpg_quest":
-                quest_args = json.loads(tool_call.function.arguments)
-                user_quests = user.get_quests()
-                user_quests.append(quest_args)
-                user.set_quests(user_quests)
-
-                chat_history.append({"role": "user", "content": user_msg})
-                chat_history.append({
-                    "role": "assistant",
-                    "content": "Quest creation module initialized.",
-                    "tool_calls": [tool_call.model_dump()]
-                })
-
-                second_response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[system_prompt] + chat_history + [{
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": "create_rpg_quest",
-                        "content": "Quest successfully saved."
-                    }]
-                )
-                final_reply = second_response.choices[0].message.content
-                chat_history.append({"role": "assistant", "content": final_reply})
-                user.set_chat_history(chat_history[-20:])
-                db.session.commit()
-                return jsonify({'reply': final_reply, 'quest_added': True})
-        else:
-            ai_msg = response_message.content
-            chat_history.append({"role": "user", "content": user_msg})
-            chat_history.append({"role": "assistant", "content": ai_msg})
-            user.set_chat_history(chat_history[-20:])
-            db.session.commit()
-            return jsonify({'reply': ai_msg})
+    try:
+        return jsonify(_chat_reply(user, user_msg, _bot_chat_system_messages(user)))
     except Exception as e:
         logger.exception("Error in /api/bot/chat")
         return jsonify({'error': 'An internal error occurred. Please try again.'}), 500
 
+@api_bp.route('/bot/chat/stream', methods=['POST'])
+@require_bot_api_key
+def bot_chat_stream():
+    """Streaming variant of /api/bot/chat (Server-Sent Events)."""
+    data = request.json
+    if not data or 'telegram_id' not in data or 'message' not in data:
+        return jsonify({'error': 'Missing telegram_id or message'}), 400
+
+    user = User.query.filter_by(telegram_id=str(data['telegram_id'])).first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    return _sse_response(_stream_chat_reply(user.id, data['message'], _bot_chat_system_messages(user)))
+
+
 @api_bp.route('/bot/leaderboard', methods=['GET'])
 @require_bot_api_key
 def bot_leaderboard():
-    top_users = User.query.order_by(User.level.desc(), User.xp.desc()).limit(10).all()
-    leaderboard = []
-    for u in top_users:
-        leaderboard.append({
-            'username': u.username,
-            'level': u.level,
-            'xp': u.xp,
-            'current_streak': u.current_streak,
-            'equipped_title': u.equipped_title or ''
-        })
-    return jsonify({'leaderboard': leaderboard})
+    telegram_id = request.args.get('telegram_id')
+    profile = user_queries.profile_by_telegram_id(telegram_id) if telegram_id else None
+    if request.args.get('period'):
+        return _windowed_leaderboard(request.args['period'], profile.id if profile else None)
+
+    response = {'leaderboard': [leaderboard.public(e) for e in leaderboard.top()]}
+
+    # Optional ?telegram_id=… adds that user's rank and neighbours
+    if profile:
+        me, around = leaderboard.standing(profile.id)
+        response['me'] = leaderboard.public(me, profile.id)
+        response['around'] = [leaderboard.public(e, profile.id) for e in around]
+    return jsonify(response)
 
 
 @api_bp.route('/bot/user/daily_refresh', methods=['POST'])
@@ -1375,6 +1805,9 @@ def bot_daily_refresh():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
+    if data.get('async'):
+        return _enqueue_response('daily_quests', {'user_id': user.id}, user_id=user.id)
+
     _generate_daily_quests(user)
 
     return jsonify({
@@ -1394,37 +1827,7 @@ def bot_claim_reward():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    try:
-        req_level = int(data.get('level', 0))
-    except (TypeError, ValueError):
-        return jsonify({'error': 'Invalid level'}), 400
-
-    if req_level not in LEVEL_REWARDS:
-        return jsonify({'error': 'Unknown reward level'}), 400
-
-    if user.level < req_level:
-        return jsonify({'error': f'You need to be Level {req_level} to claim this reward'}), 403
-
-    claimed = user.get_claimed_rewards()
-    if req_level in claimed:
-        return jsonify({'error': 'Reward already claimed'}), 409
-
-    reward = LEVEL_REWARDS[req_level]
-
-    if reward['coins'] > 0:
-        user.coins += reward['coins']
-
-    claimed.append(req_level)
-    user.set_claimed_rewards(claimed)
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'coins': user.coins,
-        'claimed_rewards': user.get_claimed_rewards(),
-        'unlocked_title': reward['title'],
-        'coins_granted': reward['coins'],
-    })
+    return _commit_mutation(_claim_level_reward, user, data)
 
 @api_bp.route('/bot/miniquest/complete', methods=['POST'])
 @require_bot_api_key
@@ -1438,64 +1841,50 @@ def bot_miniquest_complete():
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    quests = user.get_quests()
     try:
         g_idx = int(data['global_index'])
         m_idx = int(data['mini_index'])
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid index format'}), 400
 
-    if g_idx < 0 or g_idx >= len(quests):
+    quest = quest_store.quest_at(user, g_idx)
+    if quest is None:
         return jsonify({'error': 'Invalid global quest index'}), 400
 
-    quest = quests[g_idx]
-    sub_tasks = quest.get('sub_tasks', [])
-
-    if m_idx < 0 or m_idx >= len(sub_tasks):
+    sub_task = quest_store.sub_task_at(quest, m_idx)
+    if sub_task is None:
         return jsonify({'error': 'Invalid mini-quest index'}), 400
 
-    sub_task = sub_tasks[m_idx]
-    if sub_task.get('completed'):
+    # 1. Mark mini-quest as completed (a conditional UPDATE — only one request wins)
+    if quest_store.effective(sub_task, 'completed') or not quest_store.claim_completed(sub_task):
         return jsonify({'error': 'Mini-quest already completed'}), 400
+    quest_store.bump_counters(quest, sub_done=1, **({} if sub_task.micro_total else {'step_done': 1}))
 
-    # 1. Mark mini-quest as completed
-    sub_task['completed'] = True
-
-    # 2. Award XP for mini-quest
-    xp_gain = sub_task.get('xp_reward', 20)
-    user.xp += xp_gain
-    user.coins += xp_gain // 2
+    # 2. XP for the mini-quest
+    xp_gain = quest_store.effective(sub_task, 'xp_reward')
+    if xp_gain is None:
+        xp_gain = 20
 
     # 3. Recalculate global progress
-    total_subs = len(sub_tasks)
-    done_subs = sum(1 for s in sub_tasks if s.get('completed'))
-    quest['progress'] = int((done_subs / total_subs) * 100) if total_subs > 0 else 100
+    total_subs = quest.sub_total or 0
+    quest.progress = int((quest.sub_done / total_subs) * 100) if total_subs > 0 else 100
 
     # 4. If all done, mark global quest as completed
-    if quest['progress'] == 100:
-        quest['status'] = 'completed'
-
-    # 5. Critical Fix: Inform SQLAlchemy that the JSON list has changed
-    user.set_quests(quests)
-    flag_modified(user, 'quests')
-
-    # 6. Level up logic
-    leveled_up = False
-    while user.xp >= 100:
-        user.level += 1
-        user.xp -= 100
-        leveled_up = True
+    if quest.progress == 100:
+        quest_store.claim_quest_completed(quest)
 
+    # 5. Award XP, coins and levels in one atomic UPDATE
+    result = awards.award(user, xp_gain, source='miniquest')
     db.session.commit()
 
     return jsonify({
         'success': True,
         'xp_gained': xp_gain,
-        'new_xp': user.xp,
-        'new_level': user.level,
-        'leveled_up': leveled_up,
-        'quest_progress': quest['progress'],
-        'quest_status': quest.get('status', 'active')
+        'new_xp': result.xp,
+        'new_level': result.level,
+        'leveled_up': result.leveled_up,
+        'quest_progress': quest.progress,
+        'quest_status': quest_store.effective(quest, 'status') or 'active'
     })
 
 
@@ -1510,32 +1899,13 @@ def bot_quiz_generate():
     topic = data['topic']
 
     try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        client = OpenAI(api_key=api_key)
+        if data.get('async'):
+            quiz = _cached_quiz(topic, for_bot=True, generate=False)
+            if quiz is None:
+                return _enqueue_response('quiz_generate', {'topic': topic, 'for_bot': True})
+            return jsonify({'quiz': quiz})
 
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are an educational AI assistant. Generate a quiz strictly based on the provided topic. Return ONLY JSON. "
-                "Structure: "
-                '{"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "correct_option_index": 0}]} '
-                "Language: Ukrainian or English (match prompt)."
-            )
-        }
-
-        user_prompt = {
-            "role": "user",
-            "content": f"Create a 3 question multiple-choice quiz about: '{topic}'"
-        }
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[system_prompt, user_prompt],
-            response_format={"type": "json_object"}
-        )
-
-        quiz_data = json.loads(response.choices[0].message.content)
-        return jsonify({'quiz': quiz_data.get('questions', [])})
+        return jsonify({'quiz': _cached_quiz(topic, for_bot=True)})
 
     except Exception as e:
         logger.exception("Error in /api/bot/quiz/generate")
@@ -1554,27 +1924,26 @@ def bot_quiz_explain():
     correct_answer = data['correct_answer']
 
     try:
-        api_key = os.environ.get("OPENAI_API_KEY")
-        client = OpenAI(api_key=api_key)
-
-        system_prompt = {
-            "role": "system",
-            "content": "You are ORIA. Explain why the user's answer was wrong/correct in 1-2 punchy sentences. Language: Ukrainian or English."
-        }
-
-        user_prompt = {
-            "role": "user",
-            "content": f"Question: {question}\nUser's Answer: {user_answer}\nCorrect Answer: {correct_answer}"
-        }
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[system_prompt, user_prompt]
-        )
+        if data.get('async'):
+            explanation = explanation_cache.get(question, user_answer, correct_answer, for_bot=True)
+            if explanation is None:
+                payload = {'question': question, 'user_answer': user_answer,
+                           'correct_answer': correct_answer, 'for_bot': True}
+                return _enqueue_response('quiz_explain', payload)
+            return jsonify({'explanation': explanation})
 
-        explanation = response.choices[0].message.content
-        return jsonify({'explanation': explanation})
+        return jsonify({'explanation': _cached_explanation(question, user_answer, correct_answer, for_bot=True)})
 
     except Exception as e:
         logger.exception("Error in /api/bot/quiz/explain")
         return jsonify({'error': 'An internal error occurred. Please try again.'}), 500
+
+
+@api_bp.route('/bot/jobs/<job_id>', methods=['GET'])
+@require_bot_api_key
+def bot_job_status(job_id):
+    """Poll an AI job enqueued by the bot with {"async": true}."""
+    job = db.session.get(AIJob, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(ai_jobs.job_to_dict(job))
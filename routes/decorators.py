@@ -4,7 +4,7 @@ Uses session-based auth (session['user_id']).
 """
 from functools import wraps
 from flask import session, redirect, url_for, abort, g
-from models import db, User
+from services import user_queries
 
 
 def login_required(f):
@@ -15,7 +15,7 @@ def login_required(f):
         if not user_id:
             return redirect(url_for('auth.login'))
 
-        user = db.session.get(User, user_id)
+        user = user_queries.get_user(user_id)
         if not user:
             session.clear()
             return redirect(url_for('auth.login'))
@@ -33,7 +33,7 @@ def admin_required(f):
         if not user_id:
             return redirect(url_for('auth.login'))
 
-        user = db.session.get(User, user_id)
+        user = user_queries.get_user(user_id)
         if not user:
             session.clear()
             return redirect(url_for('auth.login'))
@@ -54,7 +54,7 @@ def superadmin_required(f):
         if not user_id:
             return redirect(url_for('auth.login'))
 
-        user = db.session.get(User, user_id)
+        user = user_queries.get_user(user_id)
         if not user:
             session.clear()
             return redirect(url_for('auth.login'))
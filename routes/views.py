@@ -42,7 +42,9 @@ def home():
         session.clear()
         return redirect(url_for('auth.register'))
 
-    return render_template('homes.html', user=user)
+    # State and chat history are embedded in the page — no API round trips on load
+    from routes.api import bootstrap_payload
+    return render_template('homes.html', user=user, bootstrap=bootstrap_payload(user))
 
 @views_bp.route('/link-telegram')
 def link_telegram():
@@ -0,0 +1 @@
+"""ORIA background services (AI job queue, caches, schedulers)."""
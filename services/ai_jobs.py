@@ -0,0 +1,188 @@
+"""
+AI Job Queue — ORIA.
+
+OpenAI round trips run here instead of inside gunicorn request handlers.
+Endpoints enqueue an AIJob row and hand the job id back to the client, which
+polls /api/jobs/<id> until the job is done. Jobs live in the main database, so
+there is no external broker and a restart loses nothing: jobs stuck in
+'running' are re-queued on startup.
+
+Workers are plain daemon threads. They start inside every app process
+(AI_JOB_WORKERS per process, 0 disables them) or in a dedicated process via
+`python ai_worker.py`. Claiming a job is a conditional UPDATE, so several
+processes can safely share one queue on both SQLite and Postgres.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import datetime
+import threading
+
+from models import db, AIJob
+
+logger = logging.getLogger(__name__)
+
+AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', '2'))
+AI_JOB_MAX_ATTEMPTS = int(os.environ.get('AI_JOB_MAX_ATTEMPTS', '2'))
+POLL_INTERVAL = 1.0          # seconds between queue polls when idle
+STALE_AFTER = 300            # 'running' jobs older than this are considered orphaned
+RETENTION_HOURS = 24         # finished jobs are purged after this long
+
+# kind → callable(payload) -> JSON-serialisable result
+_handlers = {}
+_wakeup = threading.Event()
+_workers_started = False
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def job_handler(kind):
+    """Register the function that executes jobs of the given kind."""
+    def decorator(f):
+        _handlers[kind] = f
+        return f
+    return decorator
+
+
+# ── Producer side ────────────────────────────────────────────────────────────
+
+def enqueue(kind, payload, user_id=None):
+    """Persist a new job and wake up a local worker. Returns the AIJob."""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown AI job kind: {kind}")
+
+    job = AIJob(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        user_id=user_id,
+        status='queued',
+        payload=json.dumps(payload),
+        attempts=0,
+    )
+    db.session.add(job)
+    db.session.commit()
+    _wakeup.set()
+    return job
+
+
+def job_to_dict(job):
+    """Public JSON representation of a job for the polling endpoints."""
+    data = {'job_id': job.id, 'kind': job.kind, 'status': job.status}
+    if job.status == 'done':
+        data['result'] = job.get_result()
+    elif job.status == 'failed':
+        data['error'] = job.error or 'An internal error occurred. Please try again.'
+    return data
+
+
+# ── Consumer side ────────────────────────────────────────────────────────────
+
+def _claim_next():
+    """Atomically move the oldest queued job to 'running'. Returns it or None."""
+    candidates = db.session.execute(
+        db.select(AIJob.id)
+        .where(AIJob.status == 'queued')
+        .order_by(AIJob.created_at.asc())
+        .limit(5)
+    ).scalars().all()
+
+    for job_id in candidates:
+        claimed = db.session.execute(
+            db.update(AIJob)
+            .where(AIJob.id == job_id, AIJob.status == 'queued')
+            .values(status='running', started_at=_utcnow(), attempts=AIJob.attempts + 1)
+        )
+        db.session.commit()
+        if claimed.rowcount == 1:
+            return db.session.get(AIJob, job_id)
+    return None
+
+
+def _run(job):
+    """Execute a claimed job and record its outcome."""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        result = handler(job.get_payload())
+    except Exception:
+        db.session.rollback()
+        logger.exception("AI job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        job = db.session.get(AIJob, job.id)
+        if job.attempts < AI_JOB_MAX_ATTEMPTS:
+            job.status = 'queued'
+        else:
+            job.status = 'failed'
+            job.error = 'An internal error occurred. Please try again.'
+            job.finished_at = _utcnow()
+        db.session.commit()
+        return
+
+    job = db.session.get(AIJob, job.id)
+    job.status = 'done'
+    job.result = json.dumps(result)
+    job.finished_at = _utcnow()
+    db.session.commit()
+
+
+def recover_stale_jobs():
+    """Re-queue jobs left 'running' by a crashed or restarted worker."""
+    cutoff = _utcnow() - datetime.timedelta(seconds=STALE_AFTER)
+    res = db.session.execute(
+        db.update(AIJob)
+        .where(AIJob.status == 'running', AIJob.started_at < cutoff)
+        .values(status='queued')
+    )
+    db.session.commit()
+    if res.rowcount:
+        logger.warning("Re-queued %s stale AI job(s)", res.rowcount)
+
+
+def purge_finished_jobs():
+    """Delete finished jobs older than RETENTION_HOURS."""
+    cutoff = _utcnow() - datetime.timedelta(hours=RETENTION_HOURS)
+    db.session.execute(
+        db.delete(AIJob)
+        .where(AIJob.status.in_(('done', 'failed')), AIJob.finished_at < cutoff)
+    )
+    db.session.commit()
+
+
+def _worker_loop(app):
+    last_maintenance = 0.0
+    while True:
+        try:
+            with app.app_context():
+                if time.monotonic() - last_maintenance > STALE_AFTER:
+                    recover_stale_jobs()
+                    purge_finished_jobs()
+                    last_maintenance = time.monotonic()
+
+                job = _claim_next()
+                if job is not None:
+                    _run(job)
+                    continue
+        except Exception:
+            logger.exception("AI worker loop error")
+
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(app, count=None):
+    """Start `count` worker threads (default AI_JOB_WORKERS) in this process.
+    Safe to call multiple times — only the first call starts workers."""
+    global _workers_started
+    count = AI_JOB_WORKERS if count is None else count
+    if _workers_started or count <= 0:
+        return
+    _workers_started = True
+
+    for i in range(count):
+        t = threading.Thread(target=_worker_loop, args=(app,), name=f"oria-ai-worker-{i}", daemon=True)
+        t.start()
+    logger.info("🧠 Started %s AI job worker thread(s)", count)
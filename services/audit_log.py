@@ -0,0 +1,106 @@
+"""
+Audit Log — ORIA.
+
+The admin panel's audit trail: multi-row writes for bulk operations
+(add_many) and the reads behind the log tab. Entries are paged newest
+first by keyset on (created_at, id) — no COUNT and no OFFSET — and each
+filter (action, admin, target, date range) has an index that serves it in
+that order.
+
+The filter lists and totals come from AdminLogFacet: a running count per
+action and per admin, bumped in the same transaction as every AdminLog
+insert. The log tab never runs DISTINCT or COUNT over the log itself.
+"""
+import datetime
+
+from sqlalchemy import event
+
+from models import db, AdminLog, AdminLogFacet
+from services import keyset
+
+PAGE_SIZE = 50
+INSERT_CHUNK = 1000
+
+
+def _count(connection, admin_id, admin_name, action, entries=1):
+    facets = AdminLogFacet.__table__
+    for kind, value, label in (('action', action, action), ('admin', str(admin_id), admin_name)):
+        result = connection.execute(
+            facets.update()
+            .where(facets.c.kind == kind, facets.c.value == value)
+            .values(count=facets.c.count + entries, label=label)
+        )
+        if result.rowcount == 0:
+            connection.execute(facets.insert().values(kind=kind, value=value, label=label, count=entries))
+
+
+@event.listens_for(AdminLog, 'after_insert')
+def _count_entry(mapper, connection, target):
+    _count(connection, target.admin_id, target.admin_name, target.action)
+
+
+def add_many(admin, action, targets, details=None):
+    """Log one action applied to many users: multi-row INSERTs (one per
+    INSERT_CHUNK entries) plus one facet update. `targets` is
+    [(user_id, username, new_value)]."""
+    if not targets:
+        return
+    rows = [
+        {
+            'admin_id': admin.id, 'admin_name': admin.username, 'action': action,
+            'target_id': user_id, 'target_name': username,
+            'new_value': str(new_value) if new_value is not None else None,
+            'details': details,
+        }
+        for user_id, username, new_value in targets
+    ]
+    # INSERT … VALUES (…), (…), … in chunks that stay under SQLite's bound-parameter limit
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(db.insert(AdminLog).values(rows[start:start + INSERT_CHUNK]))
+    _count(db.session.connection(), admin.id, admin.username, action, len(targets))
+
+
+def facets(kind):
+    """[(value, label, count)] for one facet kind, in label order."""
+    return db.session.execute(
+        db.select(AdminLogFacet.value, AdminLogFacet.label, AdminLogFacet.count)
+        .where(AdminLogFacet.kind == kind).order_by(AdminLogFacet.label)
+    ).all()
+
+
+def total(action=None, admin_id=None):
+    """Entries matching an action and/or admin filter, from the facet counts.
+    (With only one facet given; None for other combinations.)"""
+    if action and admin_id is None:
+        key = ('action', action)
+    elif admin_id is not None and not action:
+        key = ('admin', str(admin_id))
+    elif not action and admin_id is None:
+        return db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(AdminLogFacet.count), 0)).where(AdminLogFacet.kind == 'action')
+        ).scalar()
+    else:
+        return None
+    return db.session.execute(
+        db.select(AdminLogFacet.count).where(AdminLogFacet.kind == key[0], AdminLogFacet.value == key[1])
+    ).scalar() or 0
+
+
+def entries(action=None, admin_id=None, target_id=None, since=None, until=None,
+            after=None, before=None, limit=PAGE_SIZE):
+    """A keyset Page of log entries, newest first. `since` / `until` are
+    dates (inclusive)."""
+    query = AdminLog.query
+    if action:
+        query = query.filter(AdminLog.action == action)
+    if admin_id is not None:
+        query = query.filter(AdminLog.admin_id == admin_id)
+    if target_id is not None:
+        query = query.filter(AdminLog.target_id == target_id)
+    if since:
+        query = query.filter(AdminLog.created_at >= datetime.datetime.combine(since, datetime.time.min))
+    if until:
+        query = query.filter(AdminLog.created_at < datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+
+    return keyset.paginate(query, [AdminLog.created_at, AdminLog.id], descending=True,
+                           after=after, before=before, limit=limit)
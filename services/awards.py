@@ -0,0 +1,117 @@
+"""
+Award Engine — ORIA.
+
+Every XP / coin award goes through award(): one UPDATE that adds the XP,
+folds it into levels with closed-form math and adds the coins, returning the
+new values from the same statement (RETURNING — SQLite ≥ 3.35 and Postgres).
+There is no read-modify-write in Python, so concurrent awards from the web
+app and the bot for the same user never lose updates, and the row lock is
+only held from the UPDATE to the caller's commit.
+
+    total = xp + gained
+    level = level + total / XP_PER_LEVEL     (integer division)
+    xp    = total % XP_PER_LEVEL
+
+Every path keeps 0 ≤ xp < XP_PER_LEVEL, which is what lets the number of
+levels gained be derived from the returned values alone.
+
+Each award is also appended to the XP ledger (services/xp_ledger.py), in the
+same transaction, tagged with its `source`.
+"""
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, User
+from services import leaderboard, xp_ledger
+
+XP_PER_LEVEL = 100
+
+
+class Award:
+    """Result of an award: the user's new totals and what was gained."""
+
+    def __init__(self, xp, coins, level, xp_gained, coins_gained, levels_gained):
+        self.xp = xp
+        self.coins = coins
+        self.level = level
+        self.xp_gained = xp_gained
+        self.coins_gained = coins_gained
+        self.levels_gained = levels_gained
+
+    @property
+    def leveled_up(self):
+        return self.levels_gained > 0
+
+    def as_dict(self):
+        """The response shape shared by the award endpoints."""
+        return {
+            'success': True,
+            'xp': self.xp,
+            'coins': self.coins,
+            'level': self.level,
+            'leveled_up': self.leveled_up,
+            'new_level': self.level if self.leveled_up else None,
+        }
+
+    def __repr__(self):
+        return f'<Award +{self.xp_gained}xp +{self.coins_gained}c → L{self.level} {self.xp}xp>'
+
+
+def award(user, xp=0, coins=None, source='action'):
+    """Atomically add `xp` (levelling up as needed) and `coins` (default xp // 2)
+    to a user, recording it in the XP ledger under `source`. Returns an Award,
+    or None if the user no longer exists.
+
+    Does not commit — the caller commits together with its own changes. The
+    in-session User (if any) is refreshed with the returned values."""
+    if coins is None:
+        coins = xp // 2
+    user_id = user.id if isinstance(user, User) else user
+
+    total = db.func.coalesce(User.xp, 0) + xp
+    row = db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(
+            level=db.func.coalesce(User.level, 1) + total // XP_PER_LEVEL,
+            xp=total % XP_PER_LEVEL,
+            coins=db.func.coalesce(User.coins, 0) + coins,
+        )
+        .returning(User.xp, User.coins, User.level)
+        .execution_options(synchronize_session=False)
+    ).one_or_none()
+    if row is None:
+        return None
+
+    new_xp, new_coins, new_level = row
+    leaderboard.score_changed(user_id, new_level, new_xp)
+    xp_ledger.record(user_id, xp, coins, source)
+    if isinstance(user, User):
+        for name, value in (('xp', new_xp), ('coins', new_coins), ('level', new_level)):
+            set_committed_value(user, name, value)
+
+    # old xp + gained = levels · XP_PER_LEVEL + new xp, with 0 ≤ old xp < XP_PER_LEVEL
+    levels_gained = max(0, -(-(xp - new_xp) // XP_PER_LEVEL))
+    return Award(new_xp, new_coins, new_level, xp, coins, levels_gained)
+
+
+def award_many(condition, xp=0, coins=0, source='admin'):
+    """award() for every user matching `condition` (a WHERE clause), in one
+    UPDATE. Returns rows (id, username, level, xp, coins) of the users updated.
+
+    Does not commit. In-session User objects are not refreshed."""
+    total = db.func.coalesce(User.xp, 0) + xp
+    rows = db.session.execute(
+        db.update(User)
+        .where(condition)
+        .values(
+            level=db.func.coalesce(User.level, 1) + total // XP_PER_LEVEL,
+            xp=total % XP_PER_LEVEL,
+            coins=db.func.coalesce(User.coins, 0) + coins,
+        )
+        .returning(User.id, User.username, User.level, User.xp, User.coins)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if rows:
+        leaderboard.mark_stale()
+        xp_ledger.record_many([row.id for row in rows], xp, coins, source)
+    return rows
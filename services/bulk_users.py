@@ -0,0 +1,59 @@
+"""
+Bulk User Operations — ORIA.
+
+Admin changes applied to every user matching a dashboard filter (search,
+role, level range) as one set-based UPDATE … RETURNING, instead of one POST
+and one ORM round trip per user. The returned rows give the affected count
+and feed the audit log (audit_log.add_many — multi-row INSERTs).
+
+Bulk UPDATEs bypass the per-row ORM hooks, so what those would do is done
+here: the leaderboard snapshot is marked stale when a shown column changes,
+and title changes bump the users' state_version.
+"""
+from models import db, User
+from services import awards, leaderboard
+
+# ±delta operations: field → (User column, minimum value)
+DELTA_FIELDS = {
+    'level': (User.level, 1),
+    'xp': (User.xp, 0),
+    'coins': (User.coins, 0),
+    'streak': (User.current_streak, 0),
+}
+
+# Changes to these can alter what the leaderboard shows
+_BOARD_COLUMNS = {'level', 'xp', 'current_streak', 'equipped_title'}
+
+
+def _update(condition, values, returning):
+    rows = db.session.execute(
+        db.update(User).where(condition).values(**values)
+        .returning(User.id, User.username, returning)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if rows and returning.key in _BOARD_COLUMNS:
+        leaderboard.mark_stale()
+    return [tuple(row) for row in rows]
+
+
+def apply_delta(condition, field, delta):
+    """Add `delta` to `field` for every user matching `condition`, clamped at
+    the field's minimum; positive XP goes through the award engine and levels
+    up. Returns [(user_id, username, new value)]. Does not commit."""
+    if field == 'xp' and delta > 0:
+        rows = awards.award_many(condition, xp=delta, source='admin')
+        return [(row.id, row.username, f"{row.xp} (level {row.level})") for row in rows]
+
+    column, minimum = DELTA_FIELDS[field]
+    changed = db.func.coalesce(column, minimum) + delta
+    return _update(condition, {column.key: db.case((changed < minimum, minimum), else_=changed)}, column)
+
+
+def set_title(condition, title):
+    """Equip `title` ('' removes it) on every user matching `condition` who
+    doesn't have it yet. Returns [(user_id, username, title)]. Does not commit."""
+    return _update(
+        db.and_(condition, db.func.coalesce(User.equipped_title, '') != title),
+        {'equipped_title': title, 'state_version': db.func.coalesce(User.state_version, 0) + 1},
+        User.equipped_title,
+    )
@@ -0,0 +1,63 @@
+"""
+Cache Hit Counters — ORIA.
+
+The quiz and explanation caches count hits and keep a last-used time per
+entry for their LRU trimming. Writing those on every cache hit would put a
+write transaction on a read path, so hits are counted in memory instead and
+written out in one short transaction by a per-process scheduled task every
+CACHE_HIT_FLUSH_SECONDS (and before each LRU trim). Hits a process has not
+written out yet are lost if it exits — they only steer eviction.
+"""
+import os
+import datetime
+import threading
+
+from models import db
+
+CACHE_HIT_FLUSH_SECONDS = int(os.environ.get('CACHE_HIT_FLUSH_SECONDS', '60'))
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class HitCounter:
+    """Buffered hits / last_used_at updates for one cache table, keyed by
+    `key_column` (the table's primary key)."""
+
+    def __init__(self, key_column):
+        self.key_column = key_column
+        self.model = key_column.class_
+        self._lock = threading.Lock()
+        self._pending = {}    # key → [hits, last used]
+
+    def hit(self, key):
+        with self._lock:
+            pending = self._pending.setdefault(key, [0, None])
+            pending[0] += 1
+            pending[1] = _utcnow()
+
+    def flush(self):
+        """Write out the buffered hits and commit. Returns the number of entries updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        model = self.model
+        try:
+            for key, (hits, last_used) in pending.items():
+                db.session.execute(
+                    db.update(model)
+                    .where(self.key_column == key)
+                    .values(hits=model.hits + hits, last_used_at=last_used)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Keep them for the next flush rather than losing them
+            with self._lock:
+                for key, (hits, last_used) in pending.items():
+                    current = self._pending.setdefault(key, [0, last_used])
+                    current[0] += hits
+            raise
+        return len(pending)
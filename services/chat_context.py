@@ -0,0 +1,336 @@
+"""
+Chat Context Builder — ORIA.
+
+Builds the message list sent to the LLM for a chat turn within a fixed token
+budget, so prompt size per request is predictable:
+
+    [system messages] + [running summary] + [recent turns, verbatim] + [new message]
+
+Messages are stored append-only in the ChatMessage table: a finished turn is
+a couple of INSERTs and the recent context is an index range scan on
+(user_id, id). Recent turns are kept whole (a user message together with the
+assistant / tool messages that answer it) from newest to oldest until
+CHAT_CONTEXT_TOKENS is spent. Bulky create_rpg_quest arguments are replaced by
+a short stub in replays and in stored history — the quest itself lives in the
+quest log.
+
+Once the unsummarised messages grow past CHAT_SUMMARIZE_AT_TOKENS, a
+'chat_summary' AI job folds the oldest turns into user.chat_summary, a running
+summary of at most ~CHAT_SUMMARY_TOKENS tokens, and moves the
+user.chat_summary_upto watermark past them. Trimming is left to the scheduled
+retention task, which keeps the newest CHAT_RETENTION_MESSAGES per user and,
+if CHAT_RETENTION_DAYS is set, drops anything older.
+
+Tokens are counted with tiktoken when it is installed, otherwise estimated
+from the UTF-8 length (≈4 bytes per token).
+"""
+import os
+import json
+import logging
+import datetime
+
+from models import db, User, ChatMessage
+from services import llm
+from services.scheduler import periodic, renew_lease
+
+logger = logging.getLogger(__name__)
+
+CHAT_CONTEXT_TOKENS = int(os.environ.get('CHAT_CONTEXT_TOKENS', '2000'))
+CHAT_SUMMARY_TOKENS = int(os.environ.get('CHAT_SUMMARY_TOKENS', '300'))
+CHAT_SUMMARIZE_AT_TOKENS = int(os.environ.get('CHAT_SUMMARIZE_AT_TOKENS', '3000'))
+CHAT_HISTORY_MAX_MESSAGES = int(os.environ.get('CHAT_HISTORY_MAX_MESSAGES', '60'))
+CHAT_RETENTION_MESSAGES = int(os.environ.get('CHAT_RETENTION_MESSAGES', '200'))
+CHAT_RETENTION_DAYS = int(os.environ.get('CHAT_RETENTION_DAYS', '0'))
+RETENTION_BATCH_SIZE = 100
+MESSAGE_OVERHEAD_TOKENS = 4  # role / separators per message
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('o200k_base')
+except Exception:  # optional dependency
+    _encoding = None
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return max(1, len(text.encode('utf-8')) // 4)
+
+
+def message_tokens(message):
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get('content') or '')
+    for tc in message.get('tool_calls') or []:
+        tokens += count_tokens(tc.get('function', {}).get('arguments') or '')
+    return tokens
+
+
+# ── History shaping ──────────────────────────────────────────────────────────
+
+def compact_tool_arguments(arguments):
+    """Replace full quest JSON with a stub that still tells the model what was created."""
+    try:
+        quest = json.loads(arguments)
+    except (TypeError, ValueError):
+        return arguments
+    if not isinstance(quest, dict) or 'sub_tasks' not in quest:
+        return arguments
+    stub = {k: quest.get(k) for k in ('title', 'category', 'difficulty') if quest.get(k)}
+    stub['note'] = 'full quest saved to the quest log'
+    return json.dumps(stub, ensure_ascii=False)
+
+
+def compact_message(message):
+    if not message.get('tool_calls'):
+        return message
+    compacted = dict(message)
+    compacted['tool_calls'] = [
+        {**tc, 'function': {**tc.get('function', {}),
+                            'arguments': compact_tool_arguments(tc.get('function', {}).get('arguments'))}}
+        for tc in message['tool_calls']
+    ]
+    return compacted
+
+
+def split_turns(history):
+    """Group history into turns, each starting at a user message, so that an
+    assistant tool call is never separated from its tool result."""
+    turns = []
+    for message in history:
+        if message.get('role') == 'user' or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def _turn_tokens(turn):
+    return sum(message_tokens(m) for m in turn)
+
+
+def history_tokens(history):
+    return sum(message_tokens(m) for m in history)
+
+
+# ── Prompt assembly ──────────────────────────────────────────────────────────
+
+def summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation with this user:\n{summary}"}
+
+
+def build_messages(system_messages, history, summary=None, user_msg=None):
+    """Messages for one LLM call: the system messages, the running summary and as
+    many recent turns as fit in CHAT_CONTEXT_TOKENS. The newest turn is always
+    included (it may be the one holding the tool call being answered)."""
+    budget = CHAT_CONTEXT_TOKENS
+    head = list(system_messages)
+    if summary:
+        head.append(summary_message(summary))
+        budget -= message_tokens(head[-1])
+
+    turns = split_turns([compact_message(m) for m in history])
+    # A tool result whose call was trimmed away would be rejected by the API
+    turns = [t for t in turns if t[0].get('role') != 'tool']
+    kept = []
+    for i, turn in enumerate(reversed(turns)):
+        cost = _turn_tokens(turn)
+        if i > 0 and cost > budget:
+            break
+        kept.insert(0, turn)
+        budget -= cost
+
+    messages = head + [m for turn in kept for m in turn]
+    if user_msg is not None:
+        messages.append({"role": "user", "content": user_msg})
+    return messages
+
+
+# ── Storage ──────────────────────────────────────────────────────────────────
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _row(user_id, message):
+    tool_calls = message.get('tool_calls')
+    return ChatMessage(
+        user_id=user_id,
+        role=message.get('role') or 'user',
+        content=message.get('content'),
+        tool_calls=json.dumps(tool_calls) if tool_calls else None,
+        tool_call_id=message.get('tool_call_id'),
+        name=message.get('name'),
+    )
+
+
+def ensure_backfilled(user):
+    """Move a user's legacy User.chat_history blob into ChatMessage rows (once)."""
+    if not user.chat_history or user.chat_history == '[]':
+        return False
+    db.session.add_all([_row(user.id, compact_message(m)) for m in user.get_chat_history() if isinstance(m, dict)])
+    user.chat_history = '[]'
+    db.session.commit()
+    return True
+
+
+def _unfolded(user, limit=CHAT_HISTORY_MAX_MESSAGES):
+    """The newest `limit` messages not yet folded into the summary, oldest first."""
+    query = db.select(ChatMessage).where(ChatMessage.user_id == user.id)
+    if user.chat_summary_upto:
+        query = query.where(ChatMessage.id > user.chat_summary_upto)
+    rows = db.session.execute(query.order_by(ChatMessage.id.desc()).limit(limit)).scalars().all()
+    return rows[::-1]
+
+
+def load_history(user):
+    """Recent unsummarised messages of a user, as chat API message dicts."""
+    ensure_backfilled(user)
+    return [row.to_message() for row in _unfolded(user)]
+
+
+def recent_messages(user_id, limit=CHAT_HISTORY_MAX_MESSAGES, roles=('user', 'assistant')):
+    """The newest messages for display, oldest first (summarised ones included)."""
+    rows = db.session.execute(
+        db.select(ChatMessage)
+        .where(ChatMessage.user_id == user_id, ChatMessage.role.in_(roles))
+        .order_by(ChatMessage.id.desc()).limit(limit)
+    ).scalars().all()
+    return [row.to_message() for row in reversed(rows)]
+
+
+def store_turn(user, history, new_messages):
+    """Append a finished turn (compacted) — INSERTs only, nothing is rewritten.
+    `history` is what load_history() returned. Returns True when the
+    unsummarised messages have grown enough to need a 'chat_summary' job."""
+    new_messages = [compact_message(m) for m in new_messages]
+    db.session.add_all([_row(user.id, m) for m in new_messages])
+    return history_tokens(history) + history_tokens(new_messages) > CHAT_SUMMARIZE_AT_TOKENS
+
+
+def count_messages(user_id):
+    return db.session.execute(
+        db.select(db.func.count(ChatMessage.id)).where(ChatMessage.user_id == user_id)
+    ).scalar()
+
+
+def history_etag(user_id):
+    """Validator for the chat window: changes whenever a message is added or deleted."""
+    newest, total = db.session.execute(
+        db.select(db.func.max(ChatMessage.id), db.func.count(ChatMessage.id)).where(ChatMessage.user_id == user_id)
+    ).one()
+    return f'c{newest or 0}-{total}'
+
+
+def delete_history(user):
+    """Drop a user's whole conversation and summary. Does not commit."""
+    db.session.execute(db.delete(ChatMessage).where(ChatMessage.user_id == user.id))
+    user.chat_history = '[]'
+    user.chat_summary = None
+    user.chat_summary_upto = None
+
+
+# ── Rolling summary ──────────────────────────────────────────────────────────
+
+def _fold_count(history):
+    """Number of leading messages to fold into the summary so that the rest
+    fits the verbatim budget (always leaving the newest turn)."""
+    keep_budget = CHAT_CONTEXT_TOKENS - CHAT_SUMMARY_TOKENS
+    turns = split_turns(history)
+    remaining = history_tokens(history)
+    folded = 0
+    for turn in turns[:-1]:
+        if remaining <= keep_budget:
+            break
+        remaining -= _turn_tokens(turn)
+        folded += len(turn)
+    return folded
+
+
+def _transcript(messages):
+    lines = []
+    for m in messages:
+        if m.get('role') == 'tool':
+            continue
+        content = (m.get('content') or '').strip()
+        for tc in m.get('tool_calls') or []:
+            content += f" [created quest: {tc.get('function', {}).get('arguments')}]"
+        if content:
+            lines.append(f"{m.get('role')}: {content.strip()}")
+    return "\n".join(lines)
+
+
+def summarize(user):
+    """Fold the oldest unsummarised turns of a user into chat_summary.
+    Returns the number of messages folded (0 if nothing had to be done or the
+    conversation was reset / summarised elsewhere meanwhile)."""
+    ensure_backfilled(user)
+    rows = _unfolded(user, limit=None)
+    history = [row.to_message() for row in rows]
+    count = _fold_count(history)
+    if not count:
+        return 0
+    folded = history[:count]
+    upto = rows[count - 1].id
+    previous_upto = user.chat_summary_upto
+
+    previous = user.chat_summary or ''
+    summary = llm.complete([
+        {"role": "system", "content": (
+            "You maintain a running summary of a conversation between a user and ORIA, their productivity "
+            "assistant. Merge the new messages into the existing summary. Keep facts about the user, their "
+            "goals, preferences, created quests, promises and open questions; drop small talk. "
+            f"Write at most {CHAT_SUMMARY_TOKENS * 3 // 4} words, in the language of the conversation. "
+            "Reply with the updated summary text only."
+        )},
+        {"role": "user", "content": f"EXISTING SUMMARY:\n{previous or '(none)'}\n\nNEW MESSAGES:\n{_transcript(folded)}"},
+    ]).content or previous
+
+    # The LLM call took a while — only apply it if the watermark did not move
+    # and the folded messages still exist (no reset in between)
+    watermark = User.chat_summary_upto.is_(None) if previous_upto is None else User.chat_summary_upto == previous_upto
+    still_there = db.select(ChatMessage.id).where(ChatMessage.id == upto, ChatMessage.user_id == user.id).exists()
+    result = db.session.execute(
+        db.update(User)
+        .where(User.id == user.id, watermark, still_there)
+        # Hard cap, whatever the model returned (≈ CHAT_SUMMARY_TOKENS even for Cyrillic)
+        .values(chat_summary=summary.strip()[:CHAT_SUMMARY_TOKENS * 6], chat_summary_upto=upto)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        logger.info("Chat of user %s changed during summarisation — skipped", user.id)
+        return 0
+    return count
+
+
+# ── Retention ────────────────────────────────────────────────────────────────
+
+@periodic('chat_retention', 3600)
+def enforce_retention():
+    """Keep the newest CHAT_RETENTION_MESSAGES per user and drop messages older
+    than CHAT_RETENTION_DAYS (when set). Runs off the request path."""
+    trimmed = 0
+    if CHAT_RETENTION_DAYS > 0:
+        cutoff = _utcnow() - datetime.timedelta(days=CHAT_RETENTION_DAYS)
+        trimmed += db.session.execute(db.delete(ChatMessage).where(ChatMessage.created_at < cutoff)).rowcount
+        db.session.commit()
+
+    over = db.session.execute(
+        db.select(ChatMessage.user_id)
+        .group_by(ChatMessage.user_id)
+        .having(db.func.count(ChatMessage.id) > CHAT_RETENTION_MESSAGES)
+    ).scalars().all()
+    for start in range(0, len(over), RETENTION_BATCH_SIZE):
+        for user_id in over[start:start + RETENTION_BATCH_SIZE]:
+            oldest_kept = db.session.execute(
+                db.select(ChatMessage.id).where(ChatMessage.user_id == user_id)
+                .order_by(ChatMessage.id.desc()).offset(max(CHAT_RETENTION_MESSAGES, 1) - 1).limit(1)
+            ).scalar()
+            trimmed += db.session.execute(
+                db.delete(ChatMessage).where(ChatMessage.user_id == user_id, ChatMessage.id < oldest_kept)
+            ).rowcount
+        db.session.commit()
+        renew_lease('chat_retention')
+    if trimmed:
+        logger.info("Chat retention: removed %s message(s)", trimmed)
@@ -0,0 +1,130 @@
+"""
+Daily Quest Pre-generation — ORIA.
+
+The first /api/user/state call of a new day used to block on an OpenAI call
+to build the user's dailies. Instead, every evening this scheduled task
+builds tomorrow's set for recently active users in small batches, and the
+rollover in routes/api.py just swaps the prepared row in (or falls back to a
+local, non-AI set for users that were not covered).
+
+    DAILY_PREGEN_HOUR         local hour from which tomorrow is prepared (default 21)
+    DAILY_PREGEN_ACTIVE_DAYS  only users active within this many days (default 7)
+    DAILY_PREGEN_BATCH_SIZE   users per batch (default 20)
+    DAILY_PREGEN_BATCH_PAUSE  seconds to sleep between batches (default 2)
+"""
+import os
+import json
+import time
+import logging
+import datetime
+
+from models import db, User, PreparedDailyQuests, DailyQuestRun
+from services.scheduler import periodic, renew_lease
+
+logger = logging.getLogger(__name__)
+
+DAILY_PREGEN_HOUR = int(os.environ.get('DAILY_PREGEN_HOUR', '21'))
+DAILY_PREGEN_ACTIVE_DAYS = int(os.environ.get('DAILY_PREGEN_ACTIVE_DAYS', '7'))
+DAILY_PREGEN_BATCH_SIZE = int(os.environ.get('DAILY_PREGEN_BATCH_SIZE', '20'))
+DAILY_PREGEN_BATCH_PAUSE = float(os.environ.get('DAILY_PREGEN_BATCH_PAUSE', '2'))
+RUN_RETENTION_DAYS = 30
+
+TASK_NAME = 'daily_quest_pregen'
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def purge_old_rows(today):
+    """Drop prepared sets nobody picked up and old run records."""
+    db.session.execute(
+        db.delete(PreparedDailyQuests).where(PreparedDailyQuests.for_date < today.isoformat())
+    )
+    run_cutoff = (today - datetime.timedelta(days=RUN_RETENTION_DAYS)).isoformat()
+    db.session.execute(db.delete(DailyQuestRun).where(DailyQuestRun.for_date < run_cutoff))
+    db.session.commit()
+
+
+def pregenerate(target_date):
+    """Prepare the daily quests of `target_date` for every recently active user
+    that does not have a prepared set yet. Returns the DailyQuestRun."""
+    # Lazy import: routes.api imports the services package
+    from routes.api import build_daily_quests
+
+    target = target_date.isoformat()
+    run = db.session.get(DailyQuestRun, target)
+    if run is None:
+        run = DailyQuestRun(for_date=target, status='running', total=0, generated=0, failed=0)
+        db.session.add(run)
+    elif run.status == 'done':
+        return run
+
+    active_since = (datetime.date.today() - datetime.timedelta(days=DAILY_PREGEN_ACTIVE_DAYS)).isoformat()
+    prepared_ids = db.select(PreparedDailyQuests.user_id).where(PreparedDailyQuests.for_date == target)
+    pending_ids = db.session.execute(
+        db.select(User.id)
+        .where(User.last_active_date >= active_since, User.id.not_in(prepared_ids))
+        .order_by(User.id)
+    ).scalars().all()
+
+    # A resumed run keeps its counters; failures are not retried (those users
+    # get the local fallback at rollover)
+    run.total = run.generated + run.failed + len(pending_ids)
+    db.session.commit()
+    logger.info("Daily quest pre-generation for %s: %s user(s) pending", target, len(pending_ids))
+
+    for start in range(0, len(pending_ids), DAILY_PREGEN_BATCH_SIZE):
+        batch = pending_ids[start:start + DAILY_PREGEN_BATCH_SIZE]
+        for user in User.query.filter(User.id.in_(batch)).all():
+            try:
+                quests = build_daily_quests(user, raise_on_ai_error=True, for_date=target)
+            except Exception as e:
+                logger.warning("Daily quest pre-generation failed for user %s: %s", user.id, e)
+                run.failed += 1
+                continue
+            db.session.add(PreparedDailyQuests(user_id=user.id, for_date=target, quests=json.dumps(quests)))
+            run.generated += 1
+        db.session.commit()
+        renew_lease(TASK_NAME)
+
+        if start + DAILY_PREGEN_BATCH_SIZE < len(pending_ids):
+            time.sleep(DAILY_PREGEN_BATCH_PAUSE)
+
+    run.status = 'done'
+    run.finished_at = _utcnow()
+    db.session.commit()
+    logger.info("Daily quest pre-generation for %s done: %s generated, %s failed",
+                target, run.generated, run.failed)
+    return run
+
+
+@periodic(TASK_NAME, 600)
+def pregenerate_tomorrow():
+    """Scheduler entry point: prepare tomorrow once the evening window opens."""
+    today = datetime.date.today()
+    purge_old_rows(today)
+    if datetime.datetime.now().hour >= DAILY_PREGEN_HOUR:
+        pregenerate(today + datetime.timedelta(days=1))
+
+
+def status(limit=7):
+    """Recent runs plus the number of prepared sets waiting to be picked up."""
+    runs = db.session.execute(
+        db.select(DailyQuestRun).order_by(DailyQuestRun.for_date.desc()).limit(limit)
+    ).scalars().all()
+    waiting = db.session.execute(
+        db.select(db.func.count()).select_from(PreparedDailyQuests)
+    ).scalar()
+    return {
+        'runs': [{
+            'for_date': r.for_date,
+            'status': r.status,
+            'total': r.total,
+            'generated': r.generated,
+            'failed': r.failed,
+            'started_at': r.started_at.isoformat() if r.started_at else None,
+            'finished_at': r.finished_at.isoformat() if r.finished_at else None,
+        } for r in runs],
+        'prepared_waiting': waiting,
+    }
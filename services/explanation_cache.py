@@ -0,0 +1,123 @@
+"""
+Quiz Explanation Cache — ORIA.
+
+Explanations of a wrong quiz answer depend only on the question, the chosen
+answer and the correct answer. With quizzes cached and shared, the same
+triples recur constantly, so explanations are memoised in the database and
+served without an OpenAI round trip. When a new quiz variant is generated,
+explanations for every wrong option can be pre-computed by an AI job so the
+explain step is instant (QUIZ_PRECOMPUTE_EXPLANATIONS).
+
+Entries expire after EXPLAIN_CACHE_TTL_HOURS; the scheduled maintenance task
+trims the table to EXPLAIN_CACHE_MAX_ENTRIES least-recently-used rows. A hit
+does not write: hits are buffered (services/cache_hits.py).
+"""
+import os
+import hashlib
+import logging
+import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ExplanationCacheEntry
+from services.cache_hits import HitCounter, CACHE_HIT_FLUSH_SECONDS
+from services.scheduler import periodic
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_CACHE_TTL_HOURS = int(os.environ.get('EXPLAIN_CACHE_TTL_HOURS', '720'))
+EXPLAIN_CACHE_MAX_ENTRIES = int(os.environ.get('EXPLAIN_CACHE_MAX_ENTRIES', '20000'))
+QUIZ_PRECOMPUTE_EXPLANATIONS = os.environ.get('QUIZ_PRECOMPUTE_EXPLANATIONS', '1') == '1'
+
+_hits = HitCounter(ExplanationCacheEntry.key)
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _expiry_cutoff():
+    return _utcnow() - datetime.timedelta(hours=EXPLAIN_CACHE_TTL_HOURS)
+
+
+def _fresh(entry):
+    """True if a cache row exists and is younger than EXPLAIN_CACHE_TTL_HOURS."""
+    if entry is None:
+        return False
+    return not entry.created_at or entry.created_at >= _expiry_cutoff()
+
+
+def cache_key(question, user_answer, correct_answer, for_bot=False):
+    """Stable hash of an explanation request (web and bot prompts differ)."""
+    parts = ['bot' if for_bot else 'web'] + [str(p).strip() for p in (question, user_answer, correct_answer)]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get(question, user_answer, correct_answer, for_bot=False):
+    """Return the cached explanation or None."""
+    key = cache_key(question, user_answer, correct_answer, for_bot)
+    entry = db.session.get(ExplanationCacheEntry, key)
+    if not _fresh(entry):
+        return None
+    _hits.hit(key)
+    return entry.explanation
+
+
+def contains(question, user_answer, correct_answer, for_bot=False):
+    """True if an unexpired explanation is cached (does not count as a use)."""
+    key = cache_key(question, user_answer, correct_answer, for_bot)
+    return _fresh(db.session.get(ExplanationCacheEntry, key))
+
+
+def put(question, user_answer, correct_answer, explanation, for_bot=False):
+    """Store an explanation (replacing an expired one under the same key)."""
+    if not explanation:
+        return
+    key = cache_key(question, user_answer, correct_answer, for_bot)
+    entry = db.session.get(ExplanationCacheEntry, key)
+    if entry is None:
+        db.session.add(ExplanationCacheEntry(key=key, explanation=explanation))
+    else:
+        entry.explanation = explanation
+        entry.created_at = entry.last_used_at = _utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same explanation first
+        db.session.rollback()
+
+
+def wrong_answer_triples(questions):
+    """Yield (question, wrong_option, correct_option) for every wrong option of a quiz."""
+    for q in questions:
+        options = q.get('options') or []
+        idx = q.get('correct_option_index')
+        if not isinstance(idx, int) or not 0 <= idx < len(options):
+            continue
+        for i, option in enumerate(options):
+            if i != idx:
+                yield q.get('question', ''), option, options[idx]
+
+
+@periodic('explanation_cache_hits', CACHE_HIT_FLUSH_SECONDS, per_process=True)
+def flush_hits():
+    return _hits.flush()
+
+
+@periodic('explanation_cache_maintenance', 3600)
+def evict():
+    """Drop expired entries, then the least recently used beyond the size bound."""
+    flush_hits()
+    expired = db.session.execute(
+        db.delete(ExplanationCacheEntry).where(ExplanationCacheEntry.created_at < _expiry_cutoff())
+    )
+
+    size = db.session.execute(db.select(db.func.count(ExplanationCacheEntry.key))).scalar()
+    overflow = max(0, size - EXPLAIN_CACHE_MAX_ENTRIES)
+    if overflow:
+        lru = db.select(ExplanationCacheEntry.key) \
+            .order_by(ExplanationCacheEntry.last_used_at.asc()).limit(overflow)
+        db.session.execute(db.delete(ExplanationCacheEntry).where(ExplanationCacheEntry.key.in_(lru)))
+    db.session.commit()
+    if expired.rowcount or overflow:
+        logger.info("Explanation cache: evicted %s expired and %s LRU entr(ies)", expired.rowcount, overflow)
@@ -0,0 +1,150 @@
+"""
+Data Export — ORIA.
+
+Streaming CSV / NDJSON exports of users and the admin audit log. Rows are
+read in id order with yield_per (a server-side cursor on Postgres; SQLite
+steps its cursor), formatted a batch at a time and handed to a generator
+response, so memory stays flat however large the table is. gzip is applied
+on the fly when the client accepts it.
+
+Exports are resumable by id: each covers (after_id, until_id], and until_id
+is pinned to the table's current max id when an export starts (the route
+returns it in a header). A client that lost the connection asks again with
+the same until_id and after_id = the last id it received.
+"""
+import os
+import io
+import csv
+import json
+import zlib
+import datetime
+
+from models import db, User, AdminLog
+from services import quest_store
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+USER_FIELDS = (
+    'id', 'username', 'email', 'role', 'level', 'xp', 'coins', 'current_streak',
+    'equipped_title', 'equipped_skin', 'telegram_id', 'last_active_date', 'created_at',
+)
+USER_EXTRAS = ('achievements', 'quests')
+LOG_FIELDS = (
+    'id', 'created_at', 'admin_id', 'admin_name', 'action',
+    'target_id', 'target_name', 'old_value', 'new_value', 'details',
+)
+
+
+def max_id(model):
+    return db.session.execute(db.select(db.func.max(model.id))).scalar() or 0
+
+
+def _batches(stmt):
+    """Row batches of `stmt`, EXPORT_BATCH_SIZE at a time, without buffering the result."""
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    yield from result.partitions()
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def _json_list(text):
+    try:
+        value = json.loads(text or '[]')
+    except ValueError:
+        return []
+    return value if isinstance(value, list) else []
+
+
+def _id_range(column, after_id, until_id):
+    return db.and_(column > after_id, column <= until_id)
+
+
+# ── Records ──────────────────────────────────────────────────────────────────
+
+def user_records(after_id, until_id, include=()):
+    """Batches of user dicts: the scalar columns, plus 'achievements' and / or
+    'quests' if asked for (quests are loaded for a whole batch at once)."""
+    columns = [getattr(User, name) for name in USER_FIELDS]
+    if 'achievements' in include:
+        columns.append(User.achievements)
+    if 'quests' in include:
+        columns.append(User.quests)   # legacy blob of users not moved to the Quest table yet
+    stmt = db.select(*columns).where(_id_range(User.id, after_id, until_id)).order_by(User.id)
+
+    for batch in _batches(stmt):
+        quests = quest_store.load_many([row.id for row in batch]) if 'quests' in include else {}
+        records = []
+        for row in batch:
+            record = {name: _plain(getattr(row, name)) for name in USER_FIELDS}
+            if 'achievements' in include:
+                record['achievements'] = _json_list(row.achievements)
+            if 'quests' in include:
+                record['quests'] = quests.get(row.id) or _json_list(row.quests)
+            records.append(record)
+        yield records
+
+
+def log_records(after_id, until_id):
+    """Batches of audit log entry dicts, oldest first."""
+    stmt = db.select(*[getattr(AdminLog, name) for name in LOG_FIELDS]) \
+        .where(_id_range(AdminLog.id, after_id, until_id)).order_by(AdminLog.id)
+    for batch in _batches(stmt):
+        yield [{name: _plain(getattr(row, name)) for name in LOG_FIELDS} for row in batch]
+
+
+# ── Formats ──────────────────────────────────────────────────────────────────
+
+def ndjson(batches):
+    for records in batches:
+        yield ''.join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in records)
+
+
+def _cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        # Don't let a username become a spreadsheet formula
+        return "'" + value
+    return value
+
+
+def csv_rows(batches, fields, header=True):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    for records in batches:
+        for record in records:
+            writer.writerow([_cell(record.get(name)) for name in fields])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def gzipped(chunks):
+    """gzip a stream of byte chunks as it goes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(dataset, fmt, after_id, until_id, include=()):
+    """Encoded chunks of an export. CSV only has a header row when it starts
+    from the beginning, so resumed parts can be appended as they are."""
+    if dataset == 'users':
+        batches = user_records(after_id, until_id, include)
+        fields = USER_FIELDS + tuple(name for name in USER_EXTRAS if name in include)
+    else:
+        batches = log_records(after_id, until_id)
+        fields = LOG_FIELDS
+    chunks = ndjson(batches) if fmt == 'ndjson' else csv_rows(batches, fields, header=not after_id)
+    return (chunk.encode() for chunk in chunks)
@@ -0,0 +1,122 @@
+"""
+JSON Patch — ORIA.
+
+A small RFC 6902 implementation (add, remove, replace, move, copy, test) on
+plain Python lists / dicts, with RFC 6901 JSON Pointers. Patches are applied
+in place; any invalid operation raises PatchError and the caller discards
+the document.
+"""
+import copy
+
+OPS = ('add', 'remove', 'replace', 'move', 'copy', 'test')
+
+
+class PatchError(ValueError):
+    """An operation could not be applied (bad path, failed test, ...)."""
+
+
+def parse_pointer(pointer):
+    """'/quests/0/title' → ['quests', '0', 'title']."""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith('/')):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    if pointer == '':
+        return []
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def to_pointer(tokens):
+    """['quests', '0', 'title'] → '/quests/0/title'."""
+    return ''.join('/' + str(t).replace('~', '~0').replace('/', '~1') for t in tokens)
+
+
+def _index(container, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == '0'):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _parent(doc, tokens):
+    """The container holding the last token of a path."""
+    if not tokens:
+        raise PatchError("The document root cannot be modified")
+    node = doc
+    for token in tokens[:-1]:
+        if isinstance(node, list):
+            node = node[_index(node, token)]
+        elif isinstance(node, dict) and token in node:
+            node = node[token]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return node, tokens[-1]
+
+
+def get(doc, tokens):
+    node = doc
+    for token in tokens:
+        if isinstance(node, list):
+            node = node[_index(node, token)]
+        elif isinstance(node, dict) and token in node:
+            node = node[token]
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+    return node
+
+
+def _add(doc, tokens, value):
+    parent, token = _parent(doc, tokens)
+    if isinstance(parent, list):
+        parent.insert(_index(parent, token, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[token] = value
+    else:
+        raise PatchError(f"Cannot add to a scalar at /{'/'.join(tokens)}")
+
+
+def _remove(doc, tokens):
+    parent, token = _parent(doc, tokens)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, token))
+    if isinstance(parent, dict) and token in parent:
+        return parent.pop(token)
+    raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def apply_operation(doc, operation):
+    """Apply one operation to `doc` in place."""
+    if not isinstance(operation, dict) or operation.get('op') not in OPS:
+        raise PatchError(f"Invalid operation: {operation!r}")
+    op = operation['op']
+    tokens = parse_pointer(operation.get('path'))
+    if op in ('add', 'replace', 'test') and 'value' not in operation:
+        raise PatchError(f"'{op}' needs a value")
+
+    if op == 'add':
+        _add(doc, tokens, copy.deepcopy(operation['value']))
+    elif op == 'remove':
+        _remove(doc, tokens)
+    elif op == 'replace':
+        _remove(doc, tokens)
+        _add(doc, tokens, copy.deepcopy(operation['value']))
+    elif op == 'test':
+        if get(doc, tokens) != operation['value']:
+            raise PatchError(f"Test failed at {operation['path']}")
+    else:
+        source = parse_pointer(operation.get('from'))
+        if op == 'move':
+            if tokens[:len(source)] == source and len(tokens) > len(source):
+                raise PatchError("Cannot move a value into one of its children")
+            _add(doc, tokens, _remove(doc, source))
+        else:
+            _add(doc, tokens, copy.deepcopy(get(doc, source)))
+
+
+def apply_patch(doc, operations):
+    """Apply a list of operations to `doc` in place."""
+    for operation in operations:
+        apply_operation(doc, operation)
+    return doc
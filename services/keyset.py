@@ -0,0 +1,122 @@
+"""
+Keyset Pagination — ORIA.
+
+Admin lists page by position instead of OFFSET: a page is "the next N rows
+after the (sort value, id) of the last row shown" — a range read on the
+sort index, so the last page costs the same as the first and rows added
+meanwhile never shift a page. Cursors are opaque URL tokens (base64 of the
+JSON-encoded key), handed back by paginate() as Page.prev / Page.next.
+"""
+import json
+import base64
+import binascii
+import datetime
+
+from models import db
+
+
+class Page:
+    """One page of rows, with the cursors of the pages either side (None at an end)."""
+
+    def __init__(self, items, prev_cursor, next_cursor):
+        self.items = items
+        self.prev = prev_cursor
+        self.next = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode(values):
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode(token, size):
+    """The key in a cursor token, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != size \
+            or not all(isinstance(v, (int, str)) and not isinstance(v, bool) for v in values):
+        return None
+    return values
+
+
+def _bind(keys, values):
+    """Cursor values as the key columns' Python types (datetimes travel as
+    ISO strings). None if one doesn't parse."""
+    bound = []
+    for column, value in zip(keys, values):
+        if isinstance(column.type, db.DateTime):
+            try:
+                value = datetime.datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return None
+        bound.append(value)
+    return bound
+
+
+def _forms(column, value):
+    """(lowest, highest, all) forms of a key value as the database compares it."""
+    if isinstance(column.type, db.DateTime) and db.engine.dialect.name == 'sqlite':
+        # SQLite compares the stored text, written with (SQLAlchemy) or
+        # without (CURRENT_TIMESTAMP) a fractional part
+        forms = [db.literal(text, db.String) for text in
+                 sorted({str(value), value.isoformat(sep=' ', timespec='microseconds')})]
+        return forms[0], forms[-1], forms
+    return value, value, [value]
+
+
+def _past(keys, bound, ascending):
+    """Rows after `bound` in scan order. The first key is also range-bounded
+    on its own, so the index scan starts at the cursor."""
+    column = keys[0]
+    low, high, forms = _forms(column, bound[0])
+    beyond = column > high if ascending else column < low
+    if len(keys) == 1:
+        return beyond
+    tied = column.in_(forms) if len(forms) > 1 else column == low
+    within = column >= low if ascending else column <= high
+    return db.and_(within, db.or_(beyond, db.and_(tied, _past(keys[1:], bound[1:], ascending))))
+
+
+def _key(item, keys):
+    return [getattr(item, column.key) for column in keys]
+
+
+def paginate(query, keys, descending=False, after=None, before=None, limit=50):
+    """A Page of `query` ordered by `keys` (columns that together are unique —
+    end with the primary key), starting after the `after` cursor or ending
+    before the `before` cursor."""
+    backwards = before is not None
+    bound = decode(before if backwards else after, len(keys))
+    if bound is not None:
+        bound = _bind(keys, bound)
+    # Scan direction: reversed when walking back from `before`
+    ascending = descending == backwards
+
+    if bound is not None:
+        query = query.filter(_past(keys, bound, ascending))
+    query = query.order_by(*[column.asc() if ascending else column.desc() for column in keys])
+
+    items = query.limit(limit + 1).all()
+    more = len(items) > limit
+    items = items[:limit]
+    if backwards:
+        items.reverse()
+        has_prev, has_next = more, bound is not None
+    else:
+        has_prev, has_next = bound is not None, more
+
+    return Page(
+        items,
+        encode(_key(items[0], keys)) if items and has_prev else None,
+        encode(_key(items[-1], keys)) if items and has_next else None,
+    )
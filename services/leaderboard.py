@@ -0,0 +1,199 @@
+"""
+Leaderboard — ORIA.
+
+The top LEADERBOARD_SIZE users (by level, then XP) are kept as an
+in-process snapshot, so leaderboard requests from the web app and the bot
+are answered from memory. The snapshot is only dropped when a committed
+change can alter it: an award or edit that reaches the cut-off (the last
+entry's score), or any change to a user who is on it. Other processes
+(web workers, the bot's backend) pick such changes up within
+LEADERBOARD_SNAPSHOT_SECONDS.
+
+A user's own rank is 1 + the number of users with a strictly higher
+(level, xp) — a row-value range count on idx_user_level_xp — and the
+"around me" window is two short keyset reads on the same index. Ranks are
+competition ranks: users with the same level and XP share one.
+"""
+import os
+import time
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User
+from services import user_queries
+
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '10'))
+LEADERBOARD_AROUND = int(os.environ.get('LEADERBOARD_AROUND', '2'))
+LEADERBOARD_SNAPSHOT_SECONDS = float(os.environ.get('LEADERBOARD_SNAPSHOT_SECONDS', '30'))
+
+# Columns shown on the board besides the score
+_DISPLAY_ATTRS = ('username', 'equipped_title', 'current_streak')
+
+_lock = threading.Lock()
+_snapshot = None    # (built_at, entries)
+_generation = 0     # bumped on every invalidation
+
+
+def _score():
+    return db.tuple_(User.level, User.xp)
+
+
+def _entry(row, rank):
+    return {
+        'id': row.id,
+        'rank': rank,
+        'username': row.username,
+        'level': row.level,
+        'xp': row.xp,
+        'current_streak': row.current_streak,
+        'equipped_title': row.equipped_title or '',
+    }
+
+
+def _ranked(rows, first_position, first_rank):
+    """Entries for rows that are consecutive in board order, starting at
+    `first_position` (whose competition rank is `first_rank`)."""
+    entries = []
+    for offset, row in enumerate(rows):
+        if not entries:
+            rank = first_rank
+        elif (row.level, row.xp) == (entries[-1]['level'], entries[-1]['xp']):
+            rank = entries[-1]['rank']
+        else:
+            rank = first_position + offset
+        entries.append(_entry(row, rank))
+    return entries
+
+
+def _count_above(level, xp):
+    return db.session.execute(
+        db.select(db.func.count(User.id)).where(_score() > db.tuple_(level, xp))
+    ).scalar()
+
+
+# ── Reads ────────────────────────────────────────────────────────────────────
+
+def top():
+    """The top LEADERBOARD_SIZE entries, from the snapshot when it is fresh."""
+    global _snapshot
+    with _lock:
+        snapshot, generation = _snapshot, _generation
+    if snapshot and time.monotonic() - snapshot[0] < LEADERBOARD_SNAPSHOT_SECONDS:
+        return snapshot[1]
+
+    entries = _ranked(user_queries.leaderboard(LEADERBOARD_SIZE), 1, 1)
+    with _lock:
+        # Don't store a board read before a concurrent invalidation
+        if generation == _generation:
+            _snapshot = (time.monotonic(), entries)
+    return entries
+
+
+def standing(user_id, around=LEADERBOARD_AROUND):
+    """(entry, window) for a user: their own entry with its rank, and the
+    `around` users either side of them. (None, []) if the user doesn't exist."""
+    board = top()
+    for position, entry in enumerate(board):
+        if entry['id'] == user_id:
+            return entry, board[max(0, position - around):position + around + 1]
+
+    me = db.session.execute(
+        db.select(*user_queries.LEADERBOARD_COLUMNS).where(User.id == user_id)
+    ).first()
+    if me is None:
+        return None, []
+
+    rank = 1 + _count_above(me.level, me.xp)
+    mine = db.tuple_(me.level, me.xp)
+    # Board order is (level, xp) descending, then id; a user is placed first among equals
+    above = db.session.execute(
+        db.select(*user_queries.LEADERBOARD_COLUMNS).where(_score() > mine)
+        .order_by(User.level.asc(), User.xp.asc(), User.id.desc()).limit(around)
+    ).all()[::-1]
+    below = db.session.execute(
+        db.select(*user_queries.LEADERBOARD_COLUMNS).where(_score() <= mine, User.id != user_id)
+        .order_by(User.level.desc(), User.xp.desc(), User.id.asc()).limit(around)
+    ).all()
+
+    first_position = rank - len(above)
+    first_rank = 1 + _count_above(above[0].level, above[0].xp) if above else rank
+    window = _ranked(above + [me] + below, first_position, first_rank)
+    return window[len(above)], window
+
+
+def public(entry, user_id=None):
+    """An entry as sent to clients (no internal id)."""
+    data = {k: v for k, v in entry.items() if k != 'id'}
+    if user_id is not None:
+        data['is_current_user'] = entry['id'] == user_id
+    return data
+
+
+# ── Invalidation ─────────────────────────────────────────────────────────────
+
+def invalidate():
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
+
+
+def _affects(user_id, level, xp):
+    """Could a user now at (level, xp) change the current snapshot?"""
+    with _lock:
+        snapshot = _snapshot
+    if snapshot is None:
+        return False
+    entries = snapshot[1]
+    if len(entries) < LEADERBOARD_SIZE or any(e['id'] == user_id for e in entries):
+        return True
+    if not isinstance(level, int) or not isinstance(xp, int):
+        return True
+    cutoff = entries[-1]
+    return (level, xp) >= (cutoff['level'], cutoff['xp'])
+
+
+def score_changed(user_id, level, xp):
+    """Note a score change made in the current transaction (awards.award
+    updates with plain SQL); the snapshot is dropped when it commits."""
+    if _affects(user_id, level, xp):
+        db.session.info['leaderboard_stale'] = True
+
+
+def mark_stale():
+    """Drop the snapshot when the current transaction commits — for bulk
+    UPDATEs of many users, which bypass the per-row hooks below."""
+    db.session.info['leaderboard_stale'] = True
+
+
+@event.listens_for(User, 'before_update')
+def _user_updated(mapper, connection, target):
+    state = db.inspect(target)
+    changed = [name for name in ('level', 'xp') + _DISPLAY_ATTRS if state.attrs[name].history.has_changes()]
+    if not changed:
+        return
+    with _lock:
+        on_board = _snapshot is not None and any(e['id'] == target.id for e in _snapshot[1])
+    if on_board or (set(changed) & {'level', 'xp'} and _affects(target.id, target.level, target.xp)):
+        state.session.info['leaderboard_stale'] = True
+
+
+@event.listens_for(User, 'after_insert')
+@event.listens_for(User, 'after_delete')
+def _user_added_or_removed(mapper, connection, target):
+    session = db.inspect(target).session
+    if session is not None and _affects(target.id, target.level, target.xp):
+        session.info['leaderboard_stale'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('leaderboard_stale', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('leaderboard_stale', None)
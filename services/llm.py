@@ -0,0 +1,284 @@
+"""
+LLM Providers — ORIA.
+
+Every AI call goes through the provider selected by LLM_PROVIDER, so the
+chat, quiz and daily-quest paths can be load-tested without the real API:
+
+    openai  (default) the shared pooled client from services/openai_client.py
+    fake    a deterministic local backend — no network, no key. The same
+            prompt always produces the same reply, quiz or quest; latency,
+            streaming speed and create_rpg_quest tool calls are configurable:
+
+    LLM_FAKE_LATENCY_MS      delay before the response / first token (default 300)
+    LLM_FAKE_TOKEN_DELAY_MS  delay between streamed tokens (default 15)
+    LLM_FAKE_REPLY_WORDS     length of plain-text replies in words (default 40)
+    LLM_FAKE_TOOL_CALLS      auto (when the user mentions a quest) | always | never
+
+Providers expose complete() for a whole response and stream() for
+incremental output. Tool calls are returned as plain
+{'id', 'name', 'arguments'} dicts (arguments is the raw JSON string).
+"""
+import os
+import re
+import abc
+import json
+import time
+import random
+import hashlib
+import functools
+import threading
+
+from services.openai_client import get_client, OPENAI_MODEL
+
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'openai').lower()
+
+
+class Completion:
+    """Result of a non-streaming call: text content and any tool calls."""
+
+    def __init__(self, content=None, tool_calls=None):
+        self.content = content
+        self.tool_calls = tool_calls or []
+
+    def __repr__(self):
+        return f'<Completion {len(self.content or "")} chars, {len(self.tool_calls)} tool call(s)>'
+
+
+class LLMProvider(abc.ABC):
+    """Interface every backend implements."""
+    name = 'base'
+
+    def configured(self):
+        """True if the provider can serve requests (e.g. has an API key)."""
+        return True
+
+    @abc.abstractmethod
+    def complete(self, messages, tools=None, json_mode=False, temperature=None):
+        """Return a Completion for a chat request."""
+
+    @abc.abstractmethod
+    def stream(self, messages, tools=None):
+        """Yield ('content', text) for every text delta, then
+        ('tool_call', {'id', 'name', 'arguments'}) for each tool call."""
+
+
+# ── OpenAI ───────────────────────────────────────────────────────────────────
+
+@functools.lru_cache(maxsize=256)
+def _prefix_cache_key(content):
+    return 'oria-' + hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+def prompt_cache_key(messages):
+    """Routing hint for provider-side prompt caching: requests that start with
+    the same static system message share a key and land on the same cache."""
+    if messages and messages[0].get('role') == 'system':
+        return _prefix_cache_key(messages[0].get('content') or '')
+    return None
+
+
+class OpenAIProvider(LLMProvider):
+    name = 'openai'
+
+    def configured(self):
+        return bool(os.environ.get("OPENAI_API_KEY"))
+
+    @staticmethod
+    def _base_kwargs(messages, tools):
+        kwargs = {}
+        if tools:
+            kwargs['tools'] = tools
+            kwargs['tool_choice'] = "auto"
+        cache_key = prompt_cache_key(messages)
+        if cache_key:
+            # Sent as a raw body field: older SDKs (requirements allow 1.50) reject it as a keyword
+            kwargs['extra_body'] = {'prompt_cache_key': cache_key}
+        return kwargs
+
+    def complete(self, messages, tools=None, json_mode=False, temperature=None):
+        kwargs = self._base_kwargs(messages, tools)
+        if json_mode:
+            kwargs['response_format'] = {"type": "json_object"}
+        if temperature is not None:
+            kwargs['temperature'] = temperature
+
+        response = get_client().chat.completions.create(model=OPENAI_MODEL, messages=messages, **kwargs)
+        message = response.choices[0].message
+        tool_calls = [
+            {'id': tc.id, 'name': tc.function.name, 'arguments': tc.function.arguments}
+            for tc in message.tool_calls or []
+        ]
+        return Completion(message.content, tool_calls)
+
+    def stream(self, messages, tools=None):
+        kwargs = self._base_kwargs(messages, tools)
+        stream = get_client().chat.completions.create(
+            model=OPENAI_MODEL, messages=messages, stream=True, **kwargs
+        )
+
+        # Tool-call names/arguments arrive as fragments keyed by their index
+        tool_calls = {}
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                yield 'content', delta.content
+            for tc in delta.tool_calls or []:
+                slot = tool_calls.setdefault(tc.index, {"id": None, "name": "", "arguments": ""})
+                if tc.id:
+                    slot["id"] = tc.id
+                if tc.function:
+                    if tc.function.name:
+                        slot["name"] += tc.function.name
+                    if tc.function.arguments:
+                        slot["arguments"] += tc.function.arguments
+
+        for idx in sorted(tool_calls):
+            yield 'tool_call', tool_calls[idx]
+
+
+# ── Fake (local, deterministic) ──────────────────────────────────────────────
+
+_FAKE_WORDS = (
+    "focus", "quest", "level", "signal", "neural", "grid", "momentum", "habit", "step",
+    "streak", "sync", "upgrade", "progress", "system", "energy", "module", "target",
+)
+_QUEST_REQUEST = re.compile(r'quest|квест|goal|ціль|plan|план', re.IGNORECASE)
+
+
+class FakeProvider(LLMProvider):
+    name = 'fake'
+
+    def __init__(self):
+        self.latency = int(os.environ.get('LLM_FAKE_LATENCY_MS', '300')) / 1000
+        self.token_delay = int(os.environ.get('LLM_FAKE_TOKEN_DELAY_MS', '15')) / 1000
+        self.reply_words = int(os.environ.get('LLM_FAKE_REPLY_WORDS', '40'))
+        self.tool_calls = os.environ.get('LLM_FAKE_TOOL_CALLS', 'auto').lower()
+
+    # Deterministic content ----------------------------------------------------
+
+    @staticmethod
+    def _seed(messages):
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return int(digest.hexdigest()[:16], 16)
+
+    def _text(self, rnd):
+        words = [rnd.choice(_FAKE_WORDS) for _ in range(self.reply_words)]
+        return "ORIA (fake): " + " ".join(words).capitalize() + "."
+
+    @staticmethod
+    def _quest(rnd, goal):
+        return {
+            "category": rnd.choice(["Study & Exams", "Project & Coding", "Habits & Routine", "General"]),
+            "title": f"Quest: {goal[:60]}",
+            "difficulty": rnd.choice(["Easy", "Medium", "Hard", "Epic"]),
+            "progress": 0,
+            "sub_tasks": [{
+                "id": m,
+                "task": f"Module {m}: {rnd.choice(_FAKE_WORDS).capitalize()}",
+                "completed": False,
+                "xp_reward": 50,
+                "micro_steps": [{
+                    "id": m * 100 + s,
+                    "task": f"Step {s}: {rnd.choice(_FAKE_WORDS)}",
+                    "task_description": f"Spend 10 minutes on {rnd.choice(_FAKE_WORDS)}.",
+                    "completed": False,
+                } for s in range(1, 6)],
+            } for m in range(1, 4)],
+        }
+
+    def _json(self, rnd, prompt):
+        """Answer a JSON-format prompt with data of the shape it asks for."""
+        if '"questions"' in prompt:
+            return {"questions": [{
+                "question": f"Fake question {n} #{rnd.randrange(10 ** 4)}?",
+                "options": [f"Option {c}" for c in "ABCD"],
+                "correct_option_index": rnd.randrange(4),
+            } for n in range(1, 4)]}
+        if '"tasks"' in prompt:
+            count = re.search(r'Generate (\d+)', prompt)
+            count = int(count.group(1)) if count else 10
+            return {"tasks": [f"Fake wellbeing task {rnd.randrange(10 ** 6)}" for _ in range(count)]}
+        if '"sub_tasks"' in prompt:
+            return self._quest(rnd, "fake goal")
+        if '"task"' in prompt:
+            return {"task": f"Fake wellbeing task {rnd.randrange(10 ** 6)}", "completed": False, "xp_reward": 20}
+        return {}
+
+    def _respond(self, messages, tools, json_mode):
+        rnd = random.Random(self._seed(messages))
+        prompt = "\n".join(str(m.get('content') or '') for m in messages)
+        last = messages[-1] if messages else {}
+
+        wants_tool = (
+            any(t.get('function', {}).get('name') == 'create_rpg_quest' for t in tools or [])
+            and last.get('role') == 'user'
+            and (self.tool_calls == 'always'
+                 or (self.tool_calls == 'auto' and _QUEST_REQUEST.search(last.get('content') or '')))
+        )
+        if wants_tool:
+            arguments = json.dumps(self._quest(rnd, last.get('content') or ''), ensure_ascii=False)
+            return Completion(None, [{'id': f"call_fake_{rnd.randrange(16 ** 8):08x}",
+                                      'name': 'create_rpg_quest', 'arguments': arguments}])
+
+        if json_mode or 'Return ONLY a valid JSON' in prompt:
+            return Completion(json.dumps(self._json(rnd, prompt), ensure_ascii=False))
+        return Completion(self._text(rnd))
+
+    # Provider interface -------------------------------------------------------
+
+    def complete(self, messages, tools=None, json_mode=False, temperature=None):
+        result = self._respond(messages, tools, json_mode)
+        tokens = len((result.content or '').split())
+        time.sleep(self.latency + tokens * self.token_delay)
+        return result
+
+    def stream(self, messages, tools=None):
+        result = self._respond(messages, tools, json_mode=False)
+        time.sleep(self.latency)
+        for word in (result.content or '').split(' '):
+            if not word:
+                continue
+            yield 'content', word + ' '
+            time.sleep(self.token_delay)
+        for tool_call in result.tool_calls:
+            yield 'tool_call', tool_call
+
+
+# ── Selection ────────────────────────────────────────────────────────────────
+
+PROVIDERS = {'openai': OpenAIProvider, 'fake': FakeProvider}
+
+_provider = None
+_lock = threading.Lock()
+
+
+def get_provider():
+    """Return this process's provider (LLM_PROVIDER), creating it on first use."""
+    global _provider
+    if _provider is None:
+        with _lock:
+            if _provider is None:
+                if LLM_PROVIDER not in PROVIDERS:
+                    raise ValueError(f"Unknown LLM_PROVIDER '{LLM_PROVIDER}' (expected one of {', '.join(PROVIDERS)})")
+                _provider = PROVIDERS[LLM_PROVIDER]()
+    return _provider
+
+
+def set_provider(provider):
+    """Replace the process-wide provider (benchmarks, scripts)."""
+    global _provider
+    _provider = provider
+
+
+def configured():
+    return get_provider().configured()
+
+
+def complete(messages, tools=None, json_mode=False, temperature=None):
+    return get_provider().complete(messages, tools=tools, json_mode=json_mode, temperature=temperature)
+
+
+def stream(messages, tools=None):
+    return get_provider().stream(messages, tools=tools)
@@ -0,0 +1,64 @@
+"""
+Shared OpenAI client — ORIA.
+
+One pooled client per process instead of a fresh `OpenAI(...)` (and a fresh
+TLS handshake) per request. The client is re-created after a fork, so it is
+safe with gunicorn --preload, and it is the single place to configure the
+model, timeouts and retries:
+
+    OPENAI_MODEL            model used by every AI call (default gpt-4o-mini)
+    OPENAI_CONNECT_TIMEOUT  seconds to establish a connection (default 5)
+    OPENAI_READ_TIMEOUT     seconds to wait for a response / stream chunk (default 60)
+    OPENAI_MAX_RETRIES      retries with exponential backoff on 408/429/5xx
+                            and connection errors (default 2)
+    OPENAI_MAX_CONNECTIONS  pooled keep-alive connections per process (default 20)
+"""
+import os
+import threading
+
+import httpx
+from openai import OpenAI, DefaultHttpxClient
+
+OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4o-mini')
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', '5'))
+OPENAI_READ_TIMEOUT = float(os.environ.get('OPENAI_READ_TIMEOUT', '60'))
+OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', '2'))
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', '20'))
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def _build_client():
+    timeout = httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+    http_client = DefaultHttpxClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=60,
+        ),
+    )
+    return OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        timeout=timeout,
+        max_retries=OPENAI_MAX_RETRIES,
+        http_client=http_client,
+    )
+
+
+def get_client():
+    """Return this process's shared OpenAI client, creating it on first use.
+
+    Sockets must never be shared between a parent and its forked children,
+    so a client inherited through fork() is discarded and rebuilt.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _lock:
+            if _client is None or _client_pid != pid:
+                _client = _build_client()
+                _client_pid = pid
+    return _client
@@ -0,0 +1,452 @@
+"""
+Quest Store — ORIA.
+
+Quests live in the Quest / SubTask / MicroStep tables instead of the
+User.quests JSON blob, so completing a micro-step updates a few rows rather
+than re-serialising every quest of the user.
+
+The API still speaks the original JSON shape: load_quests() rebuilds the
+exact list of dicts the blob used to hold. Well-known fields are stored in
+columns; every other key a client or the AI put on a quest, sub-task or
+micro-step is kept in the row's `extra` JSON, so nothing is lost. Progress
+counters on Quest / SubTask are maintained on every write.
+
+Users are moved off the blob lazily on first access (ensure_backfilled,
+saved when that request commits) or in bulk with `python update_db_quests.py`.
+"""
+import json
+from collections import defaultdict
+
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, User, Quest, SubTask, MicroStep
+
+# field → (type, max length) of the values stored in columns
+QUEST_FIELDS = {
+    'title': (str, 300), 'category': (str, 50), 'difficulty': (str, 20),
+    'status': (str, 20), 'progress': (int, None), 'xp_reward': (int, None),
+}
+SUB_TASK_FIELDS = {'task': (str, None), 'completed': (bool, None), 'xp_reward': (int, None)}
+MICRO_STEP_FIELDS = {'task': (str, None), 'task_description': (str, None), 'completed': (bool, None)}
+
+
+# ── Row ⇄ dict ───────────────────────────────────────────────────────────────
+
+def _split(data, fields):
+    """Split a dict into column values and the leftover `extra` keys."""
+    columns, extra = {}, {}
+    for key, value in data.items():
+        spec = fields.get(key)
+        if spec and type(value) is spec[0] and (spec[1] is None or len(value) <= spec[1]):
+            columns[key] = value
+        else:
+            extra[key] = value
+    return columns, extra
+
+
+def _merge(row, fields):
+    data = json.loads(row.extra or '{}')
+    for key in fields:
+        value = getattr(row, key)
+        if value is not None:
+            data[key] = value
+    return data
+
+
+def effective(row, field):
+    """A field's value whether it sits in its column or in `extra`."""
+    value = getattr(row, field)
+    if value is None:
+        value = json.loads(row.extra or '{}').get(field)
+    return value
+
+
+def _dict_list(value):
+    return isinstance(value, list) and all(isinstance(v, dict) for v in value)
+
+
+def _pop_list(data, key):
+    """Take a list of dicts out of `data` (else leave it there for `extra`)."""
+    return data.pop(key) if _dict_list(data.get(key)) else None
+
+
+def _counters(sub_tasks):
+    """(sub_done, step_total, step_done) for a quest's sub-task dicts — the same
+    rules as the original quest_progress(): micro-steps count individually, a
+    sub-task without any counts as one unit."""
+    sub_done = step_total = step_done = 0
+    for sub_task in sub_tasks:
+        steps = sub_task.get('micro_steps') if _dict_list(sub_task.get('micro_steps')) else None
+        if sub_task.get('completed'):
+            sub_done += 1
+        if steps:
+            step_total += len(steps)
+            step_done += sum(1 for s in steps if s.get('completed'))
+        else:
+            step_total += 1
+            step_done += 1 if sub_task.get('completed') else 0
+    return sub_done, step_total, step_done
+
+
+def _quest_values(quest):
+    """Column values of a Quest row for a quest dict, and its sub-task dicts."""
+    data = dict(quest)
+    sub_tasks = _pop_list(data, 'sub_tasks')
+    columns, extra = _split(data, QUEST_FIELDS)
+    sub_done, step_total, step_done = _counters(sub_tasks or [])
+    values = {field: columns.get(field) for field in QUEST_FIELDS}
+    values.update(extra=json.dumps(extra), sub_total=None if sub_tasks is None else len(sub_tasks),
+                  sub_done=sub_done, step_total=step_total, step_done=step_done)
+    return values, sub_tasks or []
+
+
+def _insert_sub_tasks(user_id, parents):
+    """Insert sub-tasks and their micro-steps: parents is
+    [(quest_row, [(position, sub_task_dict), ...]), ...]."""
+    sub_rows, micro_rows = [], []
+    for quest_row, positioned in parents:
+        for position, sub_task in positioned:
+            data = dict(sub_task)
+            steps = _pop_list(data, 'micro_steps')
+            columns, extra = _split(data, SUB_TASK_FIELDS)
+            row = SubTask(quest_id=quest_row.id, user_id=user_id, position=position,
+                          extra=json.dumps(extra), micro_total=None if steps is None else len(steps),
+                          micro_done=sum(1 for s in steps or [] if s.get('completed')), **columns)
+            sub_rows.append((row, steps or []))
+    db.session.add_all([row for row, _ in sub_rows])
+    db.session.flush()
+
+    for sub_row, steps in sub_rows:
+        for position, step in enumerate(steps):
+            columns, extra = _split(step, MICRO_STEP_FIELDS)
+            micro_rows.append(MicroStep(sub_task_id=sub_row.id, user_id=user_id, position=position,
+                                        extra=json.dumps(extra), **columns))
+    db.session.add_all(micro_rows)
+    db.session.flush()
+
+
+def _insert_quests(user_id, positioned):
+    """Insert [(position, quest_dict), ...] with a few batched flushes."""
+    quest_rows = []
+    for position, quest in positioned:
+        values, sub_tasks = _quest_values(quest)
+        quest_rows.append((Quest(user_id=user_id, position=position, **values), sub_tasks))
+    db.session.add_all([row for row, _ in quest_rows])
+    db.session.flush()
+
+    _insert_sub_tasks(user_id, [(row, list(enumerate(sub_tasks))) for row, sub_tasks in quest_rows])
+    return [row for row, _ in quest_rows]
+
+
+def _touch(user_id):
+    """Bump the user's state_version: the quest document changed."""
+    db.session.execute(
+        db.update(User).where(User.id == user_id)
+        .values(state_version=db.func.coalesce(User.state_version, 0) + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _delete_quests(quest_ids):
+    if not quest_ids:
+        return
+    sub_ids = db.select(SubTask.id).where(SubTask.quest_id.in_(quest_ids))
+    for stmt in (
+        db.delete(MicroStep).where(MicroStep.sub_task_id.in_(sub_ids)),
+        db.delete(SubTask).where(SubTask.quest_id.in_(quest_ids)),
+        db.delete(Quest).where(Quest.id.in_(quest_ids)),
+    ):
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def _assemble(user_ids):
+    """[(Quest row, quest dict)] of the given users, each user's in list order
+    — three queries in total, however many users."""
+    quests = db.session.execute(
+        db.select(Quest).where(Quest.user_id.in_(user_ids)).order_by(Quest.user_id, Quest.position, Quest.id)
+    ).scalars().all()
+    if not quests:
+        return []
+
+    steps_by_sub = defaultdict(list)
+    for step in db.session.execute(
+        db.select(MicroStep).where(MicroStep.user_id.in_(user_ids)).order_by(MicroStep.position)
+    ).scalars():
+        steps_by_sub[step.sub_task_id].append(_merge(step, MICRO_STEP_FIELDS))
+
+    subs_by_quest = defaultdict(list)
+    for sub in db.session.execute(
+        db.select(SubTask).where(SubTask.user_id.in_(user_ids)).order_by(SubTask.position)
+    ).scalars():
+        data = _merge(sub, SUB_TASK_FIELDS)
+        if sub.micro_total is not None:
+            data['micro_steps'] = steps_by_sub.get(sub.id, [])
+        subs_by_quest[sub.quest_id].append(data)
+
+    loaded = []
+    for quest in quests:
+        data = _merge(quest, QUEST_FIELDS)
+        if quest.sub_total is not None:
+            data['sub_tasks'] = subs_by_quest.get(quest.id, [])
+        loaded.append((quest, data))
+    return loaded
+
+
+def _load(user_id):
+    """[(Quest row, quest dict)] of one user in list order."""
+    return _assemble([user_id])
+
+
+def load_many(user_ids):
+    """{user_id: quest list} for many users in three queries (exports).
+    Users still on the legacy blob are not moved here and come back empty."""
+    by_user = defaultdict(list)
+    if user_ids:
+        for quest, data in _assemble(user_ids):
+            by_user[quest.user_id].append(data)
+    return by_user
+
+
+def _load_sub_tasks(quest):
+    """[(SubTask row, sub-task dict)] of one quest — two queries."""
+    subs = db.session.execute(
+        db.select(SubTask).where(SubTask.quest_id == quest.id).order_by(SubTask.position, SubTask.id)
+    ).scalars().all()
+    steps_by_sub = defaultdict(list)
+    if subs:
+        for step in db.session.execute(
+            db.select(MicroStep).where(MicroStep.sub_task_id.in_([sub.id for sub in subs]))
+            .order_by(MicroStep.position)
+        ).scalars():
+            steps_by_sub[step.sub_task_id].append(_merge(step, MICRO_STEP_FIELDS))
+
+    loaded = []
+    for sub in subs:
+        data = _merge(sub, SUB_TASK_FIELDS)
+        if sub.micro_total is not None:
+            data['micro_steps'] = steps_by_sub.get(sub.id, [])
+        loaded.append((sub, data))
+    return loaded
+
+
+def _quest_dict(quest, sub_tasks):
+    data = _merge(quest, QUEST_FIELDS)
+    if quest.sub_total is not None:
+        data['sub_tasks'] = [sub for _, sub in sub_tasks]
+    return data
+
+
+def _canonical(quest):
+    return json.dumps(quest, sort_keys=True)
+
+
+# ── Backfill ─────────────────────────────────────────────────────────────────
+
+def ensure_backfilled(user):
+    """Move a user's legacy User.quests blob into the tables (once). Flushed,
+    not committed: it is saved with — and rolled back with — the caller's
+    transaction, so a failed batch or patch leaves the blob as it was."""
+    if not user.quests or user.quests == '[]':
+        return False
+    legacy = [q for q in user.get_quests() if isinstance(q, dict)]
+    already = db.session.execute(
+        db.select(db.func.count(Quest.id)).where(Quest.user_id == user.id)
+    ).scalar()
+    if not already:
+        _insert_quests(user.id, list(enumerate(legacy)))
+    user.quests = '[]'
+    db.session.flush()
+    return True
+
+
+# ── Public API ───────────────────────────────────────────────────────────────
+
+def load_quests(user):
+    """The user's quests as the JSON list the API has always returned."""
+    ensure_backfilled(user)
+    return [data for _, data in _load(user.id)]
+
+
+def replace_quests(user, quests):
+    """Store a full quest list sent by a client. Unchanged quests (compared by
+    content) keep their rows and only have their position fixed up; changed
+    or new ones are rewritten, missing ones deleted. Does not commit."""
+    ensure_backfilled(user)
+    existing = defaultdict(list)
+    for row, data in _load(user.id):
+        existing[_canonical(data)].append(row)
+
+    kept, new = set(), []
+    for position, quest in enumerate(q for q in quests if isinstance(q, dict)):
+        matches = existing.get(_canonical(quest))
+        if matches:
+            row = matches.pop(0)
+            kept.add(row.id)
+            if row.position != position:
+                row.position = position
+        else:
+            new.append((position, quest))
+
+    stale = [row.id for rows in existing.values() for row in rows if row.id not in kept]
+    _delete_quests(stale)
+    _insert_quests(user.id, new)
+    _touch(user.id)
+
+
+def append_quest(user, quest):
+    """Add a quest at the end of the user's list. Does not commit."""
+    ensure_backfilled(user)
+    last = db.session.execute(
+        db.select(db.func.max(Quest.position)).where(Quest.user_id == user.id)
+    ).scalar()
+    _insert_quests(user.id, [(0 if last is None else last + 1, quest)])
+    _touch(user.id)
+
+
+def quest_dict_at(user, position):
+    """One quest as a dict (None if there is no quest at `position`)."""
+    quest = quest_at(user, position)
+    return None if quest is None else _quest_dict(quest, _load_sub_tasks(quest))
+
+
+def rewrite_quest(user, position, quest):
+    """Store a new version of one quest in place. Sub-tasks whose content is
+    unchanged keep their rows; only changed ones are rewritten. Does not commit."""
+    row = quest_at(user, position)
+    if row is None:
+        raise IndexError(position)
+    values, sub_tasks = _quest_values(quest)
+    for name, value in values.items():
+        setattr(row, name, value)
+
+    existing = defaultdict(list)
+    for sub_row, data in _load_sub_tasks(row):
+        existing[_canonical(data)].append(sub_row)
+    kept, new = set(), []
+    for sub_position, sub_task in enumerate(sub_tasks):
+        matches = existing.get(_canonical(sub_task))
+        if matches:
+            sub_row = matches.pop(0)
+            kept.add(sub_row.id)
+            if sub_row.position != sub_position:
+                sub_row.position = sub_position
+        else:
+            new.append((sub_position, sub_task))
+
+    stale = [sub_row.id for rows in existing.values() for sub_row in rows if sub_row.id not in kept]
+    if stale:
+        db.session.execute(db.delete(MicroStep).where(MicroStep.sub_task_id.in_(stale))
+                           .execution_options(synchronize_session=False))
+        db.session.execute(db.delete(SubTask).where(SubTask.id.in_(stale))
+                           .execution_options(synchronize_session=False))
+    _insert_sub_tasks(user.id, [(row, new)])
+    _touch(user.id)
+
+
+def remove_quest(user, position):
+    """Delete the quest at `position`, shifting the following ones up. Does not commit."""
+    row = quest_at(user, position)
+    if row is None:
+        raise IndexError(position)
+    _delete_quests([row.id])
+    db.session.execute(
+        db.update(Quest).where(Quest.user_id == user.id, Quest.position > position)
+        .values(position=Quest.position - 1)
+        .execution_options(synchronize_session=False)
+    )
+    _touch(user.id)
+
+
+def delete_all(user_id):
+    """Remove every quest of a user. Does not commit."""
+    ids = db.session.execute(db.select(Quest.id).where(Quest.user_id == user_id)).scalars().all()
+    _delete_quests(ids)
+    _touch(user_id)
+
+
+def count(user):
+    ensure_backfilled(user)
+    return db.session.execute(
+        db.select(db.func.count(Quest.id)).where(Quest.user_id == user.id)
+    ).scalar()
+
+
+def incomplete_sub_task_names(user):
+    """Names of open sub-tasks of the user's active quests (daily quest picks)."""
+    ensure_backfilled(user)
+    rows = db.session.execute(
+        db.select(SubTask)
+        .join(Quest, Quest.id == SubTask.quest_id)
+        .where(Quest.user_id == user.id, db.or_(Quest.status.is_(None), Quest.status != 'completed'))
+        .order_by(Quest.position, SubTask.position)
+    ).scalars()
+    return [effective(sub, 'task') or 'Unknown Task' for sub in rows if not effective(sub, 'completed')]
+
+
+# ── Completion ───────────────────────────────────────────────────────────────
+
+def quest_at(user, position):
+    ensure_backfilled(user)
+    return db.session.execute(
+        db.select(Quest).where(Quest.user_id == user.id, Quest.position == position)
+    ).scalar()
+
+
+def sub_task_at(quest, position):
+    return db.session.execute(
+        db.select(SubTask).where(SubTask.quest_id == quest.id, SubTask.position == position)
+    ).scalar()
+
+
+def micro_step_at(sub_task, position):
+    return db.session.execute(
+        db.select(MicroStep).where(MicroStep.sub_task_id == sub_task.id, MicroStep.position == position)
+    ).scalar()
+
+
+def claim_completed(row):
+    """Flip completed → True only if it is still open. Returns False if another
+    request got there first (so the reward is never granted twice)."""
+    model = type(row)
+    result = db.session.execute(
+        db.update(model)
+        .where(model.id == row.id, db.or_(model.completed.is_(None), model.completed.is_(False)))
+        .values(completed=True)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    set_committed_value(row, 'completed', True)
+    _touch(row.user_id)
+    return True
+
+
+def bump_counters(row, **deltas):
+    """Increment counters in SQL (safe under concurrent requests) and reload them."""
+    model = type(row)
+    db.session.execute(
+        db.update(model)
+        .where(model.id == row.id)
+        .values({name: getattr(model, name) + delta for name, delta in deltas.items()})
+        .execution_options(synchronize_session=False)
+    )
+    db.session.refresh(row, attribute_names=list(deltas))
+
+
+def claim_quest_completed(quest):
+    """Set status → 'completed' once; False if the quest already was."""
+    result = db.session.execute(
+        db.update(Quest)
+        .where(Quest.id == quest.id, db.or_(Quest.status.is_(None), Quest.status != 'completed'))
+        .values(status='completed')
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    set_committed_value(quest, 'status', 'completed')
+    return True
+
+
+def quest_percent(quest):
+    """Progress of a quest in %, from its step counters."""
+    return int((quest.step_done / quest.step_total) * 100) if quest.step_total > 0 else 100
@@ -0,0 +1,123 @@
+"""
+Quiz Cache — ORIA.
+
+Quiz topics are mostly sub-task names that many users share, so generated
+quizzes are cached in the database under a normalised topic key (case,
+whitespace, punctuation and Unicode form folded; language detected from the
+script). Every web worker and the bot share the cache; the bot and the web
+app ask for differently shaped quizzes, so their variants are kept apart
+(style 'bot' / 'web', as in the explanation cache).
+
+Each key holds up to QUIZ_CACHE_VARIANTS quizzes. A lookup serves a random
+fresh variant and reports whether more variants are wanted, so callers can
+fill the key in the background while repeat takers still see some variety.
+Entries expire after QUIZ_CACHE_TTL_HOURS, and the scheduled maintenance
+task trims the table to QUIZ_CACHE_MAX_ENTRIES least-recently-used rows.
+A lookup does not write: hits are buffered (services/cache_hits.py).
+"""
+import os
+import re
+import json
+import random
+import logging
+import datetime
+import unicodedata
+
+from models import db, QuizCacheEntry
+from services.cache_hits import HitCounter, CACHE_HIT_FLUSH_SECONDS
+from services.scheduler import periodic
+
+logger = logging.getLogger(__name__)
+
+QUIZ_CACHE_TTL_HOURS = int(os.environ.get('QUIZ_CACHE_TTL_HOURS', '168'))
+QUIZ_CACHE_MAX_ENTRIES = int(os.environ.get('QUIZ_CACHE_MAX_ENTRIES', '5000'))
+QUIZ_CACHE_VARIANTS = int(os.environ.get('QUIZ_CACHE_VARIANTS', '3'))
+
+_CYRILLIC = re.compile(r'[Ѐ-ӿ]')
+_hits = HitCounter(QuizCacheEntry.id)
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def normalize_topic(topic):
+    """Return (topic_key, language) for a free-text quiz topic."""
+    text = unicodedata.normalize('NFKC', topic or '').lower()
+    key = re.sub(r'[\W_]+', ' ', text).strip()[:300]
+    language = 'uk' if _CYRILLIC.search(text) else 'en'
+    return key, language
+
+
+def _style(for_bot):
+    return 'bot' if for_bot else 'web'
+
+
+def _fresh(key, language, for_bot):
+    cutoff = _utcnow() - datetime.timedelta(hours=QUIZ_CACHE_TTL_HOURS)
+    return db.select(QuizCacheEntry).where(
+        QuizCacheEntry.topic_key == key,
+        QuizCacheEntry.language == language,
+        QuizCacheEntry.style == _style(for_bot),
+        QuizCacheEntry.created_at >= cutoff,
+    )
+
+
+def lookup(topic, for_bot=False):
+    """Return (questions, wants_more_variants). questions is None on a miss."""
+    key, language = normalize_topic(topic)
+    if not key:
+        return None, False
+
+    entries = db.session.execute(_fresh(key, language, for_bot)).scalars().all()
+    if not entries:
+        return None, True
+
+    entry = random.choice(entries)
+    _hits.hit(entry.id)
+    return entry.get_questions(), len(entries) < QUIZ_CACHE_VARIANTS
+
+
+def wants_variant(topic, for_bot=False):
+    """True while a topic still has room for another cached variant."""
+    key, language = normalize_topic(topic)
+    if not key:
+        return False
+    count = db.session.execute(
+        db.select(db.func.count()).select_from(_fresh(key, language, for_bot).subquery())
+    ).scalar()
+    return count < QUIZ_CACHE_VARIANTS
+
+
+def store(topic, questions, for_bot=False):
+    """Cache a freshly generated quiz as a new variant of its topic."""
+    key, language = normalize_topic(topic)
+    if not key or not questions:
+        return None
+    entry = QuizCacheEntry(topic_key=key, language=language, style=_style(for_bot),
+                           questions=json.dumps(questions))
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+@periodic('quiz_cache_hits', CACHE_HIT_FLUSH_SECONDS, per_process=True)
+def flush_hits():
+    return _hits.flush()
+
+
+@periodic('quiz_cache_maintenance', 3600)
+def evict():
+    """Drop expired entries, then the least recently used beyond the size bound."""
+    flush_hits()
+    cutoff = _utcnow() - datetime.timedelta(hours=QUIZ_CACHE_TTL_HOURS)
+    expired = db.session.execute(db.delete(QuizCacheEntry).where(QuizCacheEntry.created_at < cutoff))
+
+    size = db.session.execute(db.select(db.func.count(QuizCacheEntry.id))).scalar()
+    overflow = max(0, size - QUIZ_CACHE_MAX_ENTRIES)
+    if overflow:
+        lru = db.select(QuizCacheEntry.id).order_by(QuizCacheEntry.last_used_at.asc()).limit(overflow)
+        db.session.execute(db.delete(QuizCacheEntry).where(QuizCacheEntry.id.in_(lru)))
+    db.session.commit()
+    if expired.rowcount or overflow:
+        logger.info("Quiz cache: evicted %s expired and %s LRU entr(ies)", expired.rowcount, overflow)
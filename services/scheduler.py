@@ -0,0 +1,151 @@
+"""
+Periodic Task Scheduler — ORIA.
+
+A tiny in-process scheduler for background maintenance (daily quest
+pre-generation, cache refreshes, retention...). Every app process runs the
+scheduler thread, but each task is guarded by a TaskLease row: a process runs
+a task only after winning its lease, and the lease is then held until the
+next due time. So across all gunicorn workers and the ai_worker.py pool, a
+task runs once per interval.
+
+Register tasks with @periodic('name', interval_seconds). Long-running tasks
+should call renew_lease(name) between batches. Tasks registered with
+per_process=True skip the lease and run in every process — for flushing
+state a process keeps in memory.
+"""
+import os
+import time
+import socket
+import logging
+import datetime
+import threading
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, TaskLease
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+TICK = 30                    # seconds between due-checks
+LEASE_TTL = 600              # a crashed runner's lease expires after this long
+
+# name → {'interval': seconds, 'fn': callable}
+_tasks = {}
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+_started = False
+_local_due = {}      # per-process task name → monotonic time of its next run
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def periodic(name, interval, per_process=False):
+    """Register `fn` to run every `interval` seconds somewhere in the cluster
+    (in every process with per_process=True)."""
+    def decorator(fn):
+        _tasks[name] = {'interval': interval, 'fn': fn, 'per_process': per_process}
+        return fn
+    return decorator
+
+
+# ── Leases ───────────────────────────────────────────────────────────────────
+
+def acquire_lease(name, ttl=LEASE_TTL):
+    """Try to take the lease for `name`. Returns True if this process holds it."""
+    now = _utcnow()
+    expires = now + datetime.timedelta(seconds=ttl)
+    taken = db.session.execute(
+        db.update(TaskLease)
+        .where(TaskLease.name == name, TaskLease.expires_at < now)
+        .values(owner=_owner, expires_at=expires)
+    )
+    db.session.commit()
+    if taken.rowcount == 1:
+        return True
+
+    if db.session.get(TaskLease, name) is not None:
+        return False
+    try:
+        db.session.add(TaskLease(name=name, owner=_owner, expires_at=expires))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def renew_lease(name, ttl=LEASE_TTL):
+    """Extend a lease this process already holds (call between batches)."""
+    db.session.execute(
+        db.update(TaskLease)
+        .where(TaskLease.name == name, TaskLease.owner == _owner)
+        .values(expires_at=_utcnow() + datetime.timedelta(seconds=ttl))
+    )
+    db.session.commit()
+
+
+def _hold_until(name, when):
+    db.session.execute(
+        db.update(TaskLease)
+        .where(TaskLease.name == name, TaskLease.owner == _owner)
+        .values(expires_at=when)
+    )
+    db.session.commit()
+
+
+# ── Runner ───────────────────────────────────────────────────────────────────
+
+def _call(name, fn):
+    try:
+        fn()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Scheduled task '%s' failed", name)
+
+
+def _run_local(name, task):
+    now = time.monotonic()
+    if now < _local_due.get(name, 0):
+        return False
+    _local_due[name] = now + task['interval']
+    _call(name, task['fn'])
+    return True
+
+
+def run_task(name):
+    """Run one registered task now if it is due here (per-process tasks) or
+    its lease can be taken."""
+    task = _tasks[name]
+    if task['per_process']:
+        return _run_local(name, task)
+    if not acquire_lease(name):
+        return False
+
+    started = _utcnow()
+    _call(name, task['fn'])
+    # Keep the lease until the next due time so no other process repeats the run
+    _hold_until(name, started + datetime.timedelta(seconds=task['interval']))
+    return True
+
+
+def _loop(app):
+    while True:
+        for name in list(_tasks):
+            try:
+                with app.app_context():
+                    run_task(name)
+            except Exception:
+                logger.exception("Scheduler error in task '%s'", name)
+        time.sleep(TICK)
+
+
+def start(app):
+    """Start the scheduler thread in this process (once; SCHEDULER_ENABLED=0 disables)."""
+    global _started
+    if _started or not SCHEDULER_ENABLED:
+        return
+    _started = True
+    threading.Thread(target=_loop, args=(app,), name="oria-scheduler", daemon=True).start()
+    logger.info("⏰ Scheduler started with tasks: %s", ", ".join(sorted(_tasks)) or "none")
@@ -0,0 +1,101 @@
+"""
+User Projections — ORIA.
+
+Hot read paths (leaderboards, bot lookups, auth decorators, the admin
+dashboard) need a handful of scalar fields, not whole User rows. The large
+text columns are deferred on the model; the helpers here go further and
+select only the columns a path uses, so per-request memory and DB transfer
+no longer grow with how much a user has chatted or planned.
+
+Row helpers return SQLAlchemy Row objects (attribute access: row.username).
+Entity helpers return User objects with only the listed columns loaded —
+anything else is fetched lazily if touched.
+
+The dashboard totals are one aggregate query, cached in-process for
+ADMIN_STATS_TTL seconds (admin actions drop the cache right away).
+"""
+import os
+import time
+
+from models import db, User
+
+ADMIN_STATS_TTL = float(os.environ.get('ADMIN_STATS_TTL', '30'))
+
+LEADERBOARD_COLUMNS = (User.id, User.username, User.level, User.xp, User.current_streak, User.equipped_title)
+PROFILE_COLUMNS = (User.id, User.username, User.level, User.xp, User.coins)
+AUTH_COLUMNS = (User.id, User.username, User.email, User.role)
+DASHBOARD_COLUMNS = (
+    User.id, User.username, User.email, User.role, User.level, User.xp, User.coins,
+    User.current_streak, User.equipped_title, User.telegram_id, User.created_at,
+)
+DASHBOARD_SORTS = {
+    'id': User.id, 'username': User.username,
+    'level': User.level, 'coins': User.coins,
+    'xp': User.xp, 'role': User.role,
+}
+
+_stats_cache = None   # (computed_at, stats)
+
+
+# ── Rows ─────────────────────────────────────────────────────────────────────
+
+def leaderboard(limit=10):
+    """Top users by level, then XP (served by idx_user_level_xp); ties in sign-up order."""
+    return db.session.execute(
+        db.select(*LEADERBOARD_COLUMNS).order_by(User.level.desc(), User.xp.desc(), User.id.asc()).limit(limit)
+    ).all()
+
+
+def profile_by_telegram_id(telegram_id):
+    """id / username / level / xp / coins of the user linked to a Telegram ID, or None."""
+    return db.session.execute(
+        db.select(*PROFILE_COLUMNS).where(User.telegram_id == str(telegram_id))
+    ).first()
+
+
+def user_stats(max_age=ADMIN_STATS_TTL):
+    """Dashboard totals, aggregated in the database — or from the cache if
+    they were computed less than `max_age` seconds ago."""
+    global _stats_cache
+    cached = _stats_cache
+    if cached and time.monotonic() - cached[0] < max_age:
+        return cached[1]
+
+    row = db.session.execute(db.select(
+        db.func.count(User.id),
+        db.func.count(User.id).filter(User.role.in_(('admin', 'superadmin'))),
+        db.func.count(User.id).filter(db.and_(User.equipped_title.is_not(None), User.equipped_title != '')),
+        db.func.count(User.telegram_id).filter(User.telegram_id != ''),
+        db.func.avg(User.level),
+        db.func.sum(User.coins),
+    )).one()
+    total, admins, titled, tg_linked, avg_level, coins = row
+    stats = {
+        'total_users': total,
+        'total_admins': admins,
+        'total_titled': titled,
+        'total_tg_linked': tg_linked,
+        'avg_level': round(float(avg_level or 0), 1),
+        'total_coins': coins or 0,
+    }
+    _stats_cache = (time.monotonic(), stats)
+    return stats
+
+
+def invalidate_user_stats():
+    global _stats_cache
+    _stats_cache = None
+
+
+# ── Entities ─────────────────────────────────────────────────────────────────
+
+def get_user(user_id, columns=AUTH_COLUMNS):
+    """A User with only `columns` loaded (plus the primary key)."""
+    return db.session.execute(
+        db.select(User).options(db.load_only(*columns)).where(User.id == user_id)
+    ).scalar()
+
+
+def with_columns(query, columns=DASHBOARD_COLUMNS):
+    """Restrict a User query to `columns`."""
+    return query.options(db.load_only(*columns))
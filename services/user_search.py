@@ -0,0 +1,151 @@
+"""
+User Search — ORIA.
+
+Admin search matches a substring of the username or email. As a plain
+`ILIKE '%q%'` that is a full scan of the user table, so it is backed by a
+trigram index instead:
+
+  - SQLite: an FTS5 table (trigram tokenizer) over user.username / email,
+    external-content, kept in sync by triggers on the user table — every
+    register, rename or delete updates it in the same transaction.
+  - Postgres: pg_trgm GIN indexes on username and email, which ILIKE uses
+    directly.
+
+Trigrams need at least 3 characters; shorter queries (and databases without
+the index) fall back to ILIKE. ensure_index() runs at startup and is
+idempotent.
+"""
+import logging
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+MIN_INDEXED_LENGTH = 3
+
+_FTS = db.table('user_search', db.column('rowid', db.Integer), db.column('rank'))
+
+_SQLITE_SETUP = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5(
+           username, email, content='user', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON "user" BEGIN
+           INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON "user" BEGIN
+           INSERT INTO user_search(user_search, rowid, username, email)
+           VALUES ('delete', old.id, old.username, old.email);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username, email ON "user" BEGIN
+           INSERT INTO user_search(user_search, rowid, username, email)
+           VALUES ('delete', old.id, old.username, old.email);
+           INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email);
+       END""",
+)
+_POSTGRES_SETUP = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    'CREATE INDEX IF NOT EXISTS idx_user_username_trgm ON "user" USING gin (username gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_user_email_trgm ON "user" USING gin (email gin_trgm_ops)',
+)
+
+_indexed = None   # whether this database has the index (checked once per process)
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _has_index():
+    global _indexed
+    if _indexed is None:
+        if _dialect() == 'sqlite':
+            _indexed = db.session.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+            )).first() is not None
+        else:
+            _indexed = _dialect() == 'postgresql'
+    return _indexed
+
+
+def ensure_index():
+    """Create the search index (and fill it) if this database doesn't have it."""
+    global _indexed
+    dialect = _dialect()
+    try:
+        if dialect == 'sqlite':
+            existed = db.session.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'"
+            )).first() is not None
+            for statement in _SQLITE_SETUP:
+                db.session.execute(db.text(statement))
+            if not existed:
+                rebuild()
+        elif dialect == 'postgresql':
+            for statement in _POSTGRES_SETUP:
+                db.session.execute(db.text(statement))
+        else:
+            return False
+        db.session.commit()
+        _indexed = True
+    except Exception as e:
+        db.session.rollback()
+        _indexed = False
+        logger.warning("User search index unavailable, admin search falls back to ILIKE: %s", e)
+    return _indexed
+
+
+def rebuild():
+    """Re-read every user into the SQLite index (after bulk edits that bypassed the triggers)."""
+    if _dialect() == 'sqlite':
+        db.session.execute(db.text("INSERT INTO user_search(user_search) VALUES ('rebuild')"))
+
+
+# ── Queries ──────────────────────────────────────────────────────────────────
+
+def _like_pattern(q):
+    return '%' + q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _uses_fts(q):
+    return len(q) >= MIN_INDEXED_LENGTH and _dialect() == 'sqlite' and _has_index()
+
+
+def _fts_match(q):
+    # One quoted FTS5 phrase: with the trigram tokenizer, a substring match
+    return db.literal_column('user_search').op('MATCH')('"' + q.replace('"', '""') + '"')
+
+
+def condition(q):
+    """WHERE clause for users whose username or email contains `q` (case-insensitive)."""
+    if _uses_fts(q):
+        return User.id.in_(db.select(_FTS.c.rowid).where(_fts_match(q)))
+    pattern = _like_pattern(q)
+    return db.or_(User.username.ilike(pattern, escape='\\'), User.email.ilike(pattern, escape='\\'))
+
+
+def search(q, limit=10, columns=(User.id, User.username, User.email, User.role, User.level)):
+    """Rows of the best `limit` matches for `q`: exact username first, then
+    username prefixes, then email prefixes, then the rest by relevance."""
+    q = q.strip()
+    if not q:
+        return []
+    prefix = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    closeness = db.case(
+        (db.func.lower(User.username) == q.lower(), 0),
+        (User.username.ilike(prefix, escape='\\'), 1),
+        (User.email.ilike(prefix, escape='\\'), 2),
+        else_=3,
+    )
+
+    if _uses_fts(q):
+        query = (
+            db.select(*columns).join(_FTS, _FTS.c.rowid == User.id)
+            .where(_fts_match(q)).order_by(closeness, _FTS.c.rank, User.id)
+        )
+    else:
+        query = db.select(*columns).where(condition(q))
+        if _dialect() == 'postgresql' and _has_index():
+            similarity = db.func.greatest(db.func.similarity(User.username, q), db.func.similarity(User.email, q))
+            query = query.order_by(closeness, similarity.desc(), User.id)
+        else:
+            query = query.order_by(closeness, db.func.length(User.username), User.id)
+    return db.session.execute(query.limit(limit)).all()
@@ -0,0 +1,205 @@
+"""
+User State Document — ORIA.
+
+The state the web client edits — quests, daily quests, achievements, claimed
+rewards and the equipped title — is treated as one document with a version
+(User.state_version). Every change to it bumps the version: quest_store
+does it for quest rows, the before_update hook below for the User columns.
+
+apply_patch() takes RFC 6902 operations against that document, so the
+client only uploads what changed. Operations inside one quest
+(/quests/3/sub_tasks/1/quiz_score ...) load and rewrite just that quest;
+appending or removing a quest touches one quest; only anything else
+(reordering, replacing the whole list) falls back to a full quest sync.
+
+etag() turns the version into the validator for conditional GETs.
+"""
+import json
+import hashlib
+
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, User
+from services import quest_store, json_patch
+from services.json_patch import PatchError
+
+DOCUMENT_MEMBERS = ('quests', 'daily_quests', 'achievements', 'claimed_rewards', 'equipped_title')
+_COLUMN_MEMBERS = ('daily_quests', 'achievements', 'claimed_rewards', 'equipped_title')
+
+
+@event.listens_for(User, 'before_update')
+def _bump_state_version(mapper, connection, target):
+    state = db.inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in _COLUMN_MEMBERS):
+        # A SQL increment, so concurrent writers never hand out the same version
+        target.state_version = db.func.coalesce(User.state_version, 0) + 1
+
+
+def claim_version(user, base_version):
+    """Move the document off `base_version` (conditional UPDATE). False if it
+    has changed since — the client's patch was computed against stale state."""
+    result = db.session.execute(
+        db.update(User)
+        .where(User.id == user.id, User.state_version == base_version)
+        .values(state_version=User.state_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def claim_reward(user, level):
+    """Add `level` to the user's claimed rewards — a compare-and-swap on the
+    stored list (conditional UPDATE), so of two concurrent claims (web and
+    bot) only one succeeds. False if it is already claimed. Does not commit."""
+    db.session.flush()
+    while True:
+        stored = user.claimed_rewards
+        claimed = user.get_claimed_rewards()
+        if level in claimed:
+            return False
+        claimed.append(level)
+        value = json.dumps(claimed)
+        result = db.session.execute(
+            db.update(User)
+            .where(User.id == user.id,
+                   User.claimed_rewards.is_(None) if stored is None else User.claimed_rewards == stored)
+            .values(claimed_rewards=value, state_version=db.func.coalesce(User.state_version, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            set_committed_value(user, 'claimed_rewards', value)
+            db.session.expire(user, ['state_version'])
+            return True
+        # Changed since it was loaded: re-read it and try again
+        db.session.refresh(user, attribute_names=['claimed_rewards'])
+
+
+def current_version(user_id):
+    return db.session.execute(db.select(User.state_version).where(User.id == user_id)).scalar()
+
+
+def etag(user):
+    """Validator for GET /user/state: the document version plus the other
+    columns that response carries (XP, coins, skins, streak, dates), hashed
+    from their raw values — no JSON column is parsed."""
+    scalars = (user.level, user.xp, user.coins, user.current_streak, user.equipped_skin,
+               user.owned_skins, user.last_daily_date, user.last_active_date)
+    digest = hashlib.sha1(repr(scalars).encode()).hexdigest()[:16]
+    return f's{user.state_version or 0}-{digest}'
+
+
+# ── Patching ─────────────────────────────────────────────────────────────────
+
+def _quest_position(tokens):
+    """Index of the single quest a pointer reaches into, else None."""
+    if len(tokens) >= 3 and tokens[0] == 'quests' and tokens[1].isdigit():
+        return int(tokens[1])
+    return None
+
+
+def _load_member(user, member):
+    if member == 'daily_quests':
+        return user.get_daily_quests()
+    if member == 'achievements':
+        return user.get_achievements()
+    if member == 'claimed_rewards':
+        return user.get_claimed_rewards()
+    return user.equipped_title or ''
+
+
+def _store_member(user, member, value):
+    if member == 'equipped_title':
+        if not isinstance(value, str):
+            raise PatchError("equipped_title must be a string")
+        user.equipped_title = value[:64]
+        return
+    if not isinstance(value, list):
+        raise PatchError(f"{member} must be a list")
+    if member == 'daily_quests':
+        user.set_daily_quests(value)
+    elif member == 'achievements':
+        user.set_achievements(value)
+    else:
+        if 1 not in value:
+            value.insert(0, 1)
+        user.set_claimed_rewards(value)
+
+
+def apply_patch(user, operations):
+    """Apply RFC 6902 operations to a user's state document. Does not commit.
+    Returns the quests that were added or changed (for achievement checks).
+    Raises PatchError if any operation is invalid."""
+    if not isinstance(operations, list):
+        raise PatchError("The patch must be a list of operations")
+
+    quests = {}      # position → patched quest, written back at the end
+    members = {}     # column members, loaded on first use
+    changed = []
+
+    def write_quests():
+        for position, quest in quests.items():
+            quest_store.rewrite_quest(user, position, quest)
+            changed.append(quest)
+        quests.clear()
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise PatchError(f"Invalid operation: {operation!r}")
+        pointers = [json_patch.parse_pointer(operation.get('path'))]
+        if operation.get('op') in ('move', 'copy'):
+            pointers.append(json_patch.parse_pointer(operation.get('from')))
+        roots = {tokens[0] if tokens else '' for tokens in pointers}
+        if len(roots) != 1 or not roots <= set(DOCUMENT_MEMBERS):
+            raise PatchError(f"Unsupported path: {operation.get('path')!r}")
+        member = roots.pop()
+        tokens = pointers[0]
+
+        if member != 'quests':
+            if member not in members:
+                members[member] = _load_member(user, member)
+            doc = {member: members[member]}
+            json_patch.apply_operation(doc, operation)
+            members[member] = doc[member]
+            continue
+
+        positions = {_quest_position(t) for t in pointers}
+        position = positions.pop() if len(positions) == 1 else None
+        if position is not None:
+            # Inside one quest: patch that quest only
+            if position not in quests:
+                quest = quest_store.quest_dict_at(user, position)
+                if quest is None:
+                    raise PatchError(f"No quest at index {position}")
+                quests[position] = quest
+            relative = dict(operation, path=json_patch.to_pointer(tokens[2:]))
+            if 'from' in operation:
+                relative['from'] = json_patch.to_pointer(pointers[1][2:])
+            json_patch.apply_operation(quests[position], relative)
+            continue
+
+        write_quests()
+        op = operation.get('op')
+        if op == 'add' and len(tokens) == 2 and (tokens[1] == '-' or tokens[1] == str(quest_store.count(user))):
+            if not isinstance(operation.get('value'), dict):
+                raise PatchError("A quest must be an object")
+            quest_store.append_quest(user, operation['value'])
+            changed.append(operation['value'])
+        elif op == 'remove' and len(tokens) == 2 and tokens[1].isdigit():
+            try:
+                quest_store.remove_quest(user, int(tokens[1]))
+            except IndexError:
+                raise PatchError(f"No quest at index {tokens[1]}")
+        else:
+            # Reorder / replace a whole quest / replace the list: full sync
+            doc = {'quests': quest_store.load_quests(user)}
+            json_patch.apply_operation(doc, operation)
+            if not isinstance(doc['quests'], list):
+                raise PatchError("quests must be a list")
+            quest_store.replace_quests(user, doc['quests'])
+            changed.extend(q for q in doc['quests'] if isinstance(q, dict))
+
+    write_quests()
+    for member, value in members.items():
+        _store_member(user, member, value)
+    return changed
@@ -0,0 +1,185 @@
+"""
+Wellbeing Task Pool — ORIA.
+
+The 3rd daily quest (daily_3) is a generic wellbeing task that does not
+depend on the user, so instead of one OpenAI call per user per day it is
+sampled from a shared pool. The pool is generated in bulk (one call yields a
+whole batch), deduplicated on normalised text, kept per language and
+refreshed by a scheduled task. Every pick is recorded so a user does not get
+the same task again within WELLBEING_NO_REPEAT_DAYS.
+
+    WELLBEING_POOL_LANGUAGES   comma-separated pool languages (default uk)
+    DAILY_QUEST_LANGUAGE       language used for daily quests (default uk)
+    WELLBEING_POOL_TARGET      minimum pool size per language (default 60)
+    WELLBEING_POOL_MAX         oldest tasks beyond this are retired (default 150)
+    WELLBEING_BATCH_SIZE       tasks requested per AI call (default 20)
+    WELLBEING_REFRESH_DAYS     add a fresh batch when the newest is older (default 7)
+    WELLBEING_NO_REPEAT_DAYS   sliding no-repeat window per user (default 14)
+"""
+import os
+import re
+import json
+import logging
+import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, WellbeingTask, WellbeingTaskHistory
+from services import llm
+from services.scheduler import periodic
+
+logger = logging.getLogger(__name__)
+
+WELLBEING_POOL_LANGUAGES = [
+    lang.strip() for lang in os.environ.get('WELLBEING_POOL_LANGUAGES', 'uk').split(',') if lang.strip()
+]
+DAILY_QUEST_LANGUAGE = os.environ.get('DAILY_QUEST_LANGUAGE', 'uk')
+WELLBEING_POOL_TARGET = int(os.environ.get('WELLBEING_POOL_TARGET', '60'))
+WELLBEING_POOL_MAX = int(os.environ.get('WELLBEING_POOL_MAX', '150'))
+WELLBEING_BATCH_SIZE = int(os.environ.get('WELLBEING_BATCH_SIZE', '20'))
+WELLBEING_REFRESH_DAYS = int(os.environ.get('WELLBEING_REFRESH_DAYS', '7'))
+WELLBEING_NO_REPEAT_DAYS = int(os.environ.get('WELLBEING_NO_REPEAT_DAYS', '14'))
+MAX_BATCHES_PER_RUN = 5      # cap on AI calls per language per refresh
+
+LANGUAGE_NAMES = {'uk': 'Ukrainian', 'en': 'English'}
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def normalize_task(text):
+    """Dedupe key: lower-case words only, single-spaced."""
+    return re.sub(r'[\W_]+', ' ', text.lower()).strip()
+
+
+def user_language(user):
+    """Pool language for a user's daily quests."""
+    lang = user.get_onboarding_data().get('language')
+    return lang if lang in WELLBEING_POOL_LANGUAGES else DAILY_QUEST_LANGUAGE
+
+
+# ── Picking ──────────────────────────────────────────────────────────────────
+
+def pick_task(user_id, language, for_date, exclude=()):
+    """Sample a daily_3 quest for a user from the pool, avoiding the user's
+    recent picks and the texts in `exclude`. Records the pick in the session
+    (the caller commits). Returns None when the pool is empty."""
+    window_start = (datetime.date.fromisoformat(for_date)
+                    - datetime.timedelta(days=WELLBEING_NO_REPEAT_DAYS)).isoformat()
+    recent_ids = db.select(WellbeingTaskHistory.task_id).where(
+        WellbeingTaskHistory.user_id == user_id,
+        WellbeingTaskHistory.for_date >= window_start,
+    )
+
+    query = db.select(WellbeingTask).where(WellbeingTask.language == language)
+    if exclude:
+        query = query.where(WellbeingTask.task.not_in(list(exclude)))
+
+    task = db.session.execute(
+        query.where(WellbeingTask.id.not_in(recent_ids)).order_by(db.func.random()).limit(1)
+    ).scalar()
+    if task is None:
+        # The user has seen the whole pool inside the window — allow repeats
+        task = db.session.execute(query.order_by(db.func.random()).limit(1)).scalar()
+    if task is None:
+        return None
+
+    db.session.add(WellbeingTaskHistory(user_id=user_id, task_id=task.id, for_date=for_date))
+    return {"id": "daily_3", "task": task.task, "completed": False, "xp_reward": 20}
+
+
+# ── Pool maintenance ─────────────────────────────────────────────────────────
+
+def generate_batch(language, count=WELLBEING_BATCH_SIZE, avoid=()):
+    """Ask the AI for `count` new wellbeing tasks. Returns a list of strings."""
+    language_name = LANGUAGE_NAMES.get(language, language)
+    avoid_hint = ''
+    if avoid:
+        avoid_hint = ' Do NOT repeat any of these existing tasks: ' + '; '.join(avoid) + '.'
+
+    response = llm.complete(
+        [
+            {"role": "system", "content": (
+                f'You are ORIA, a Cyberpunk System Guide. Generate {count} distinct, very simple daily '
+                'physical/mental wellbeing tasks, each doable in under 15 minutes.' + avoid_hint +
+                ' Return ONLY a valid JSON object: {"tasks": ["Task one", "Task two"]} '
+                f'CRITICAL LANGUAGE RULE: You MUST write every task entirely in {language_name}.'
+            )}
+        ],
+        json_mode=True,
+        temperature=0.9
+    )
+    data = json.loads(response.content)
+    return [t.strip() for t in data.get('tasks', []) if isinstance(t, str) and t.strip()]
+
+
+def add_tasks(language, tasks):
+    """Insert new tasks into a language pool, skipping duplicates. Returns the count added."""
+    existing = set(db.session.execute(
+        db.select(WellbeingTask.task_key).where(WellbeingTask.language == language)
+    ).scalars())
+
+    added = 0
+    for text in tasks:
+        key = normalize_task(text)[:300]
+        if not key or key in existing:
+            continue
+        existing.add(key)
+        db.session.add(WellbeingTask(language=language, task=text[:300], task_key=key))
+        added += 1
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process refreshed the same pool concurrently
+        db.session.rollback()
+        return 0
+    return added
+
+
+def refresh_pool(language):
+    """Top the pool up to WELLBEING_POOL_TARGET, add a fresh batch when it has
+    gone stale, and retire the oldest tasks beyond WELLBEING_POOL_MAX."""
+    size, newest = db.session.execute(
+        db.select(db.func.count(WellbeingTask.id), db.func.max(WellbeingTask.created_at))
+        .where(WellbeingTask.language == language)
+    ).one()
+    stale = newest is None or newest < _utcnow() - datetime.timedelta(days=WELLBEING_REFRESH_DAYS)
+
+    batches = 0
+    while (size < WELLBEING_POOL_TARGET or stale) and batches < MAX_BATCHES_PER_RUN:
+        batches += 1
+        avoid = db.session.execute(
+            db.select(WellbeingTask.task).where(WellbeingTask.language == language)
+            .order_by(WellbeingTask.id.desc()).limit(30)
+        ).scalars().all()
+        added = add_tasks(language, generate_batch(language, avoid=avoid))
+        size += added
+        stale = False
+        logger.info("Wellbeing pool '%s': +%s task(s), %s total", language, added, size)
+
+    if size > WELLBEING_POOL_MAX:
+        oldest = db.select(WellbeingTask.id).where(WellbeingTask.language == language) \
+            .order_by(WellbeingTask.id.asc()).limit(size - WELLBEING_POOL_MAX)
+        db.session.execute(db.delete(WellbeingTask).where(WellbeingTask.id.in_(oldest)))
+        db.session.commit()
+
+
+def purge_history(today=None):
+    """Drop pick history that has left the no-repeat window."""
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=WELLBEING_NO_REPEAT_DAYS)).isoformat()
+    db.session.execute(db.delete(WellbeingTaskHistory).where(WellbeingTaskHistory.for_date < cutoff))
+    db.session.commit()
+
+
+@periodic('wellbeing_pool_refresh', 6 * 3600)
+def refresh_all_pools():
+    """Scheduler entry point."""
+    for language in WELLBEING_POOL_LANGUAGES:
+        try:
+            refresh_pool(language)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Wellbeing pool refresh failed for '%s'", language)
+    purge_history()
@@ -0,0 +1,230 @@
+"""
+XP Ledger — ORIA.
+
+User only keeps cumulative level / XP, so every award is also appended to
+the XPEvent ledger: record() is called by awards.award and the INSERT goes
+out with the caller's commit, batched with its other writes — the award
+path gains no round trip.
+
+A periodic task folds new events into XPRollup rows (XP / coins per user
+per UTC day, week and month), moving a cursor over the event ids. Windowed
+leaderboards ("top this week") and per-user XP history read the rollups
+plus the few events the task has not folded in yet, so they are exact
+without ever scanning the ledger.
+"""
+import os
+import logging
+import datetime
+
+from models import db, User, XPEvent, XPRollup, XPRollupCursor
+from services import user_queries
+from services.scheduler import periodic, renew_lease
+
+logger = logging.getLogger(__name__)
+
+XP_ROLLUP_INTERVAL = int(os.environ.get('XP_ROLLUP_INTERVAL', '300'))
+XP_ROLLUP_BATCH_SIZE = int(os.environ.get('XP_ROLLUP_BATCH_SIZE', '5000'))
+# Events younger than this are left for the next run, so a transaction that
+# took a lower id but commits a moment later is never skipped by the cursor
+ROLLUP_LAG_SECONDS = 60
+
+PERIODS = ('day', 'week', 'month')
+_CURSOR = 'xp_rollups'
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def period_start(period, day):
+    """First day of the day / week (Monday) / month containing `day`."""
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period: {period!r}")
+
+
+def _previous_start(period, start):
+    if period == 'day':
+        return start - datetime.timedelta(days=1)
+    if period == 'week':
+        return start - datetime.timedelta(days=7)
+    return (start - datetime.timedelta(days=1)).replace(day=1)
+
+
+def record(user_id, xp, coins, source):
+    """Append an award to the ledger. Not flushed here — it is inserted
+    together with the caller's other changes when they commit."""
+    if xp or coins:
+        db.session.add(XPEvent(user_id=user_id, xp=xp, coins=coins, source=source))
+
+
+def record_many(user_ids, xp, coins, source):
+    """The same award for many users, as one multi-row INSERT (sent now)."""
+    if (xp or coins) and user_ids:
+        db.session.execute(db.insert(XPEvent), [
+            {'user_id': user_id, 'xp': xp, 'coins': coins, 'source': source} for user_id in user_ids
+        ])
+
+
+# ── Rollups ──────────────────────────────────────────────────────────────────
+
+def _cursor_position():
+    cursor = db.session.get(XPRollupCursor, _CURSOR)
+    return cursor.last_event_id if cursor else 0
+
+
+def _add_to_rollups(totals):
+    """totals: {(period, period_start, user_id): [xp, coins, events]}"""
+    buckets = {}
+    for (period, start, user_id), total in totals.items():
+        buckets.setdefault((period, start), {})[user_id] = total
+
+    for (period, start), users in buckets.items():
+        existing = {row.user_id: row for row in db.session.execute(
+            db.select(XPRollup).where(
+                XPRollup.period == period, XPRollup.period_start == start, XPRollup.user_id.in_(list(users)))
+        ).scalars()}
+        for user_id, (xp, coins, events) in users.items():
+            row = existing.get(user_id)
+            if row is None:
+                db.session.add(XPRollup(period=period, period_start=start, user_id=user_id,
+                                        xp=xp, coins=coins, events=events))
+            else:
+                row.xp += xp
+                row.coins += coins
+                row.events += events
+
+
+@periodic('xp_rollups', XP_ROLLUP_INTERVAL)
+def roll_up():
+    """Fold new ledger events into XPRollup, XP_ROLLUP_BATCH_SIZE at a time.
+    Returns the number of events folded in."""
+    folded = 0
+    while True:
+        cursor = db.session.get(XPRollupCursor, _CURSOR)
+        if cursor is None:
+            cursor = XPRollupCursor(name=_CURSOR, last_event_id=0)
+            db.session.add(cursor)
+
+        cutoff = _utcnow() - datetime.timedelta(seconds=ROLLUP_LAG_SECONDS)
+        events = db.session.execute(
+            db.select(XPEvent.id, XPEvent.user_id, XPEvent.xp, XPEvent.coins, XPEvent.created_at)
+            .where(XPEvent.id > cursor.last_event_id)
+            .order_by(XPEvent.id).limit(XP_ROLLUP_BATCH_SIZE)
+        ).all()
+        # Stop at the first event that is too young (ids are handed out in time order)
+        ready = []
+        for event in events:
+            if event.created_at > cutoff:
+                break
+            ready.append(event)
+        if not ready:
+            db.session.commit()
+            break
+
+        totals = {}
+        for event in ready:
+            day = event.created_at.date()
+            for period in PERIODS:
+                total = totals.setdefault((period, period_start(period, day), event.user_id), [0, 0, 0])
+                total[0] += event.xp
+                total[1] += event.coins
+                total[2] += 1
+        _add_to_rollups(totals)
+        cursor.last_event_id = ready[-1].id
+        db.session.commit()
+        folded += len(ready)
+
+        if len(ready) < len(events) or len(events) < XP_ROLLUP_BATCH_SIZE:
+            break
+        renew_lease('xp_rollups')
+
+    if folded:
+        logger.info("Rolled up %d XP events", folded)
+    return folded
+
+
+# ── Reads ────────────────────────────────────────────────────────────────────
+
+def _pending_events(since_day, user_id=None):
+    """(user_id, xp, coins, created_at) of events not rolled up yet, from `since_day` on."""
+    query = db.select(XPEvent.user_id, XPEvent.xp, XPEvent.coins, XPEvent.created_at).where(
+        XPEvent.id > _cursor_position(),
+        XPEvent.created_at >= datetime.datetime.combine(since_day, datetime.time.min),
+    )
+    if user_id is not None:
+        query = query.where(XPEvent.user_id == user_id)
+    return db.session.execute(query).all()
+
+
+def top(period, limit=10, today=None):
+    """(period_start, entries): the users who gained the most XP in the
+    current day / week / month, with competition ranks."""
+    start = period_start(period, today or _utcnow().date())
+
+    gained = dict(db.session.execute(
+        db.select(XPRollup.user_id, XPRollup.xp)
+        .where(XPRollup.period == period, XPRollup.period_start == start)
+        .order_by(XPRollup.xp.desc()).limit(limit)
+    ).all())
+    pending = {}
+    for event in _pending_events(start):
+        pending[event.user_id] = pending.get(event.user_id, 0) + event.xp
+    # Users with new events need their rolled-up XP too, even if it was off the top
+    missing = [user_id for user_id in pending if user_id not in gained]
+    if missing:
+        gained.update(db.session.execute(
+            db.select(XPRollup.user_id, XPRollup.xp).where(
+                XPRollup.period == period, XPRollup.period_start == start, XPRollup.user_id.in_(missing))
+        ).all())
+    for user_id, xp in pending.items():
+        gained[user_id] = gained.get(user_id, 0) + xp
+
+    ranked = sorted(((xp, user_id) for user_id, xp in gained.items() if xp > 0), key=lambda t: (-t[0], t[1]))[:limit]
+    users = {row.id: row for row in db.session.execute(
+        db.select(*user_queries.LEADERBOARD_COLUMNS).where(User.id.in_([user_id for _, user_id in ranked]))
+    ).all()}
+
+    entries = []
+    for position, (xp, user_id) in enumerate(ranked, start=1):
+        user = users.get(user_id)
+        if user is None:
+            continue
+        rank = entries[-1]['rank'] if entries and entries[-1]['xp_gained'] == xp else position
+        entries.append({
+            'id': user_id,
+            'rank': rank,
+            'username': user.username,
+            'level': user.level,
+            'xp_gained': xp,
+            'current_streak': user.current_streak,
+            'equipped_title': user.equipped_title or '',
+        })
+    return start, entries
+
+
+def history(user_id, period='day', count=30, today=None):
+    """XP / coins a user gained in each of the last `count` periods, oldest
+    first, empty periods included."""
+    starts = [period_start(period, today or _utcnow().date())]
+    while len(starts) < count:
+        starts.append(_previous_start(period, starts[-1]))
+    starts.reverse()
+
+    totals = {start: [0, 0] for start in starts}
+    for row in db.session.execute(
+        db.select(XPRollup.period_start, XPRollup.xp, XPRollup.coins).where(
+            XPRollup.period == period, XPRollup.user_id == user_id, XPRollup.period_start >= starts[0])
+    ).all():
+        totals[row.period_start] = [row.xp, row.coins]
+    for event in _pending_events(starts[0], user_id=user_id):
+        total = totals.setdefault(period_start(period, event.created_at.date()), [0, 0])
+        total[0] += event.xp
+        total[1] += event.coins
+
+    return [{'period_start': start.isoformat(), 'xp': totals[start][0], 'coins': totals[start][1]}
+            for start in starts]
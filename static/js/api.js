@@ -16,53 +16,286 @@ async function apiFetch(url, options = {}) {
     return res.json();
 }
 
-// ─── Exported API functions ──────────────────────────────────────────────────
+/**
+ * Enqueue an AI job ({ async: true }) and poll /api/jobs/<id> until it finishes.
+ * Resolves with the job result, which has the same shape as the synchronous response.
+ * Cached answers come back immediately (no job_id) and are returned as-is.
+ */
+async function runAIJob(url, body = {}) {
+    const job = await apiFetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...body, async: true })
+    });
+    if (!job.job_id) return job;
+
+    let delay = 500;
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        const status = await apiFetch(`/api/jobs/${job.job_id}`);
+        if (status.status === 'done') return status.result;
+        if (status.status === 'failed') throw new Error(status.error);
+        delay = Math.min(delay * 1.5, 3000);
+    }
+}
+
+// ─── State sync (JSON Patch deltas) ──────────────────────────────────────────
+
+const STATE_MEMBERS = ['quests', 'daily_quests', 'achievements', 'claimed_rewards', 'equipped_title'];
+
+// The state document as the server last confirmed it, and its version
+let syncedDoc = null;
+let stateVersion = null;
+
+function snapshotState() {
+    const doc = {};
+    STATE_MEMBERS.forEach(key => { doc[key] = OriaState[key]; });
+    return JSON.parse(JSON.stringify(doc));
+}
+
+function escapePointer(token) {
+    return String(token).replace(/~/g, '~0').replace(/\//g, '~1');
+}
+
+/**
+ * RFC 6902 operations turning `before` into `after`. Objects are diffed per
+ * key, arrays per index when only their tail grew or shrank; anything else
+ * is replaced as a whole.
+ */
+function diffJSON(before, after, path = '', ops = []) {
+    if (before === after) return ops;
+    const isObject = v => v !== null && typeof v === 'object' && !Array.isArray(v);
+
+    if (Array.isArray(before) && Array.isArray(after)) {
+        const common = Math.min(before.length, after.length);
+        for (let i = 0; i < common; i++) diffJSON(before[i], after[i], `${path}/${i}`, ops);
+        for (let i = before.length - 1; i >= after.length; i--) ops.push({ op: 'remove', path: `${path}/${i}` });
+        for (let i = before.length; i < after.length; i++) ops.push({ op: 'add', path: `${path}/-`, value: after[i] });
+    } else if (isObject(before) && isObject(after)) {
+        Object.keys(before).forEach(key => {
+            if (!(key in after)) ops.push({ op: 'remove', path: `${path}/${escapePointer(key)}` });
+        });
+        Object.keys(after).forEach(key => {
+            const child = `${path}/${escapePointer(key)}`;
+            if (key in before) diffJSON(before[key], after[key], child, ops);
+            else if (after[key] !== undefined) ops.push({ op: 'add', path: child, value: after[key] });
+        });
+    } else if (JSON.stringify(before) !== JSON.stringify(after)) {
+        ops.push({ op: 'replace', path, value: after === undefined ? null : after });
+    }
+    return ops;
+}
 
 export async function fetchUserState() {
-    return apiFetch('/api/user/state');
+    return adoptUserState(await apiFetch('/api/user/state'));
 }
 
-export async function saveStateAPI() {
-    // Only sends quest structure and daily quest state.
-    // XP / coins / level are intentionally excluded — they are
-    // computed server-side via awardXPActionAPI().
-    const payload = {
-        quests: OriaState.quests,
-        daily_quests: OriaState.daily_quests,
-        achievements: OriaState.achievements,
-        claimed_rewards: OriaState.claimed_rewards,
-        equipped_title: OriaState.equipped_title,
-    };
-    const data = await apiFetch('/api/user/update', {
+/**
+ * Take a full state from the server (GET /api/user/state or the page's
+ * bootstrap payload) as the base for the next state patch.
+ */
+export function adoptUserState(data) {
+    stateVersion = data.state_version ?? null;
+    syncedDoc = null;
+    if (stateVersion !== null) {
+        syncedDoc = {};
+        STATE_MEMBERS.forEach(key => { syncedDoc[key] = data[key]; });
+        syncedDoc = JSON.parse(JSON.stringify(syncedDoc));
+    }
+    return data;
+}
+
+// ─── Mutation queue (coalesced writes via /api/user/batch) ──────────────────
+
+// Writes are held briefly and sent together: one request, one transaction
+const FLUSH_DELAY_MS = 200;
+const FLUSH_MAX_DELAY_MS = 1000;
+
+let queuedOps = [];        // [{ op, waiters: [{ resolve, reject }] }]
+let stateWaiters = null;   // saveStateAPI() callers waiting for the next flush
+let flushTimer = null;
+let firstQueuedAt = 0;
+let inFlight = Promise.resolve();
+
+function scheduleFlush() {
+    const now = Date.now();
+    if (!flushTimer) firstQueuedAt = now;
+    clearTimeout(flushTimer);
+    const wait = Math.max(0, Math.min(FLUSH_DELAY_MS, firstQueuedAt + FLUSH_MAX_DELAY_MS - now));
+    flushTimer = setTimeout(() => flushMutations(), wait);
+}
+
+function queueMutation(op) {
+    return new Promise((resolve, reject) => {
+        // Only the last equip matters — earlier ones resolve with its result
+        const existing = op.type === 'equip_skin' && queuedOps.find(entry => entry.op.type === 'equip_skin');
+        if (existing) {
+            existing.op = op;
+            existing.waiters.push({ resolve, reject });
+        } else {
+            queuedOps.push({ op, waiters: [{ resolve, reject }] });
+        }
+        scheduleFlush();
+    });
+}
+
+function settle(waiters, result) {
+    waiters.forEach(({ resolve, reject }) => {
+        if (result.status >= 400) reject(new Error(result.error || `HTTP ${result.status}`));
+        else resolve(result);
+    });
+}
+
+async function postBatch(entries, keepalive) {
+    return apiFetch('/api/user/batch', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload)
+        body: JSON.stringify({ operations: entries.map(entry => entry.op) }),
+        keepalive
     });
+}
+
+/**
+ * Send everything queued as one batch. State saves collapse into a single
+ * operation, sent first: a JSON Patch against the last synced state, or the
+ * full state when there is no base yet or the patch is rejected.
+ */
+export function flushMutations(keepalive = false) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    const entries = queuedOps;
+    const waiters = stateWaiters;
+    queuedOps = [];
+    stateWaiters = null;
+    if (entries.length === 0 && !waiters) return inFlight;
+
+    inFlight = inFlight
+        .then(() => sendBatch(entries, waiters, keepalive))
+        .catch(err => console.error('Failed to send queued writes:', err));
+    return inFlight;
+}
+
+async function sendBatch(entries, waiters, keepalive) {
+    let doc = null;
+    let stateEntry = null;
+    if (waiters) {
+        doc = snapshotState();
+        const patch = syncedDoc && stateVersion !== null ? diffJSON(syncedDoc, doc) : null;
+        if (patch && patch.length === 0 && entries.length === 0) {
+            settle(waiters, { success: true, state_version: stateVersion });
+            return;
+        }
+        stateEntry = {
+            op: patch ? { type: 'patch_state', version: stateVersion, patch } : { type: 'update_state', ...doc },
+            waiters
+        };
+        entries = [stateEntry, ...entries];
+    }
 
+    let data;
+    try {
+        try {
+            data = await postBatch(entries, keepalive);
+        } catch (err) {
+            // The whole batch was rolled back: retry once with the full state
+            if (!stateEntry || stateEntry.op.type !== 'patch_state') throw err;
+            console.warn('State patch rejected, sending full state:', err.message);
+            stateEntry.op = { type: 'update_state', ...doc };
+            data = await postBatch(entries, keepalive);
+        }
+    } catch (err) {
+        entries.forEach(entry => entry.waiters.forEach(({ reject }) => reject(err)));
+        return;
+    }
+
+    const results = data.results;
+    // The server's state to rebase the synced document on — only safe when
+    // nobody else wrote since our last sync (else the next save sends it all)
+    let rebaseOn = data.base_version === stateVersion ? data.state : null;
+    if (stateEntry) {
+        rebaseOn = data.state;
+        if (results[0].status === 409) {
+            // Changed elsewhere (another tab, the bot): overwrite with the full state
+            results[0] = await saveFullState(doc, data.state);
+            rebaseOn = null;
+            stateVersion = results[0].state_version ?? null;
+        }
+        if (results[0].status < 400) {
+            onStateSaved(doc, results[0]);
+            syncedDoc = doc;
+        } else {
+            rebaseOn = null;
+            syncedDoc = null;
+        }
+    }
+    if (entries.some(entry => entry.op.type === 'miniquest_complete')) rebaseOn = null;
+    if (rebaseOn && syncedDoc) {
+        STATE_MEMBERS.filter(key => key !== 'quests').forEach(key => {
+            syncedDoc[key] = JSON.parse(JSON.stringify(rebaseOn[key]));
+        });
+        stateVersion = rebaseOn.state_version;
+    }
+
+    entries.forEach((entry, i) => settle(entry.waiters, results[i]));
+}
+
+async function saveFullState(doc, serverState) {
+    // Rewards claimed and achievements unlocked earlier in the batch are kept
+    ['claimed_rewards', 'achievements'].forEach(key => {
+        doc[key] = [...new Set([...(doc[key] || []), ...(serverState[key] || [])])];
+    });
+    try {
+        const data = await apiFetch('/api/user/update', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(doc)
+        });
+        return { ...data, status: 200 };
+    } catch (err) {
+        return { error: err.message, status: 500 };
+    }
+}
+
+function onStateSaved(doc, data) {
     if (data.newly_unlocked && data.newly_unlocked.length > 0) {
         data.newly_unlocked.forEach(ach => {
             if (!OriaState.achievements) OriaState.achievements = [];
             if (!OriaState.achievements.includes(ach)) {
                 OriaState.achievements.push(ach);
             }
+            if (!doc.achievements) doc.achievements = [];
+            if (!doc.achievements.includes(ach)) doc.achievements.push(ach);
             window.dispatchEvent(new CustomEvent('achievementUnlocked', { detail: { id: ach } }));
         });
     }
+}
 
-    return data;
+// Don't lose queued writes when the tab is closed or backgrounded
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') flushMutations(true);
+});
+
+// ─── Exported API functions ──────────────────────────────────────────────────
+
+export async function saveStateAPI() {
+    // Only sends quest structure and daily quest state.
+    // XP / coins / level are intentionally excluded — they are
+    // computed server-side via awardXPActionAPI().
+    // Saves are queued: every call until the next flush shares one upload.
+    return new Promise((resolve, reject) => {
+        if (!stateWaiters) stateWaiters = [];
+        stateWaiters.push({ resolve, reject });
+        scheduleFlush();
+    });
 }
 
 /**
- * Award XP via the authoritative server-side endpoint.
+ * Award XP via the authoritative server-side endpoint (queued, sent in a batch).
  * The backend validates the amount and computes the new xp/coins/level.
  * Returns: { xp, coins, level, leveled_up, new_level }
  */
 export async function awardXPActionAPI(amount) {
-    return apiFetch('/api/user/action', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ type: 'award_xp', amount })
-    });
+    return queueMutation({ type: 'award_xp', amount });
 }
 
 /**
@@ -70,34 +303,19 @@ export async function awardXPActionAPI(amount) {
  * prevents double-claiming. Returns updated coins and claimed_rewards.
  */
 export async function claimRewardAPI(level) {
-    return apiFetch('/api/rewards/claim', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ level })
-    });
+    return queueMutation({ type: 'claim_reward', level });
 }
 
 export async function refreshDailyQuestsAPI() {
-    return apiFetch('/api/user/daily_refresh', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' }
-    });
+    return runAIJob('/api/user/daily_refresh');
 }
 
 export async function generateQuizAPI(topic) {
-    return apiFetch('/api/quiz/generate', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ topic })
-    });
+    return runAIJob('/api/quiz/generate', { topic });
 }
 
 export async function explainQuizAPI(question, user_answer, correct_answer) {
-    return apiFetch('/api/quiz/explain', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question, user_answer, correct_answer })
-    });
+    return runAIJob('/api/quiz/explain', { question, user_answer, correct_answer });
 }
 
 export async function fetchChatHistoryAPI() {
@@ -105,11 +323,44 @@ export async function fetchChatHistoryAPI() {
 }
 
 export async function sendChatMessageAPI(message, isQuickQuest) {
-    return apiFetch('/api/chat', {
+    return runAIJob('/api/chat', { message: message, quick_quest: isQuickQuest });
+}
+
+/**
+ * Stream a chat reply from /api/chat/stream (Server-Sent Events).
+ * `onEvent` is called for every event: { type: 'delta' | 'quest' | 'done' | 'error', ... }
+ */
+export async function streamChatMessageAPI(message, onEvent) {
+    const res = await fetch('/api/chat/stream', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: message, quick_quest: isQuickQuest })
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({ message })
     });
+    if (!res.ok || !res.body) {
+        throw new Error(`HTTP ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('data: ')) {
+                    onEvent(JSON.parse(line.slice(6)));
+                }
+            });
+        }
+    }
 }
 
 export async function spinRouletteAPI() {
@@ -120,11 +371,7 @@ export async function spinRouletteAPI() {
 }
 
 export async function equipSkinAPI(skin_id) {
-    return apiFetch('/api/store/equip', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ skin_id })
-    });
+    return queueMutation({ type: 'equip_skin', skin_id });
 }
 
 export async function fetchLeaderboardAPI() {
@@ -1,5 +1,5 @@
 import { OriaState, setState, initTheme, toggleTheme } from './state.js';
-import { fetchUserState, fetchChatHistoryAPI, sendChatMessageAPI, saveStateAPI } from './api.js';
+import { fetchUserState, adoptUserState, fetchChatHistoryAPI, sendChatMessageAPI, streamChatMessageAPI, saveStateAPI } from './api.js';
 import {
     OriaMascot, updateDOMState, renderQuests, renderDailyQuests,
     renderProfileQuests, updateGlobalMascot, renderInventory
@@ -47,41 +47,57 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    // 2. Load History & Gamification State
-    fetchUserState().then(data => {
-        if (!data.error) {
-            setState(data);
-            updateDOMState();
-            renderQuests();
-            renderDailyQuests();
-            renderInventory();
-            renderProfileQuests();
-            loadChatHistory();
-        }
-    });
-
-    // 3. Chat Initialization
     const chatInput = document.getElementById('chat-input-text');
     const btnSend = document.getElementById('btn-send-chat');
     const messagesContainer = document.getElementById('chat-messages');
     const typingIndicator = document.getElementById('chat-typing');
 
+    // 2. Load History & Gamification State
+    // The home page embeds both (views.home); other pages fetch them
+    const bootstrapEl = document.getElementById('oria-bootstrap');
+    const bootstrap = bootstrapEl ? JSON.parse(bootstrapEl.textContent) : null;
+
+    function applyUserState(data) {
+        setState(data);
+        updateDOMState();
+        renderQuests();
+        renderDailyQuests();
+        renderInventory();
+        renderProfileQuests();
+    }
+
+    if (bootstrap) {
+        applyUserState(adoptUserState(bootstrap.state));
+        renderChatHistory(bootstrap.history);
+    } else {
+        fetchUserState().then(data => {
+            if (!data.error) {
+                applyUserState(data);
+                loadChatHistory();
+            }
+        });
+    }
+
+    // 3. Chat Initialization
     function loadChatHistory() {
         if (!messagesContainer) return;
 
         fetchChatHistoryAPI()
-            .then(data => {
-                if (data.history && data.history.length > 0) {
-                    messagesContainer.innerHTML = '';
-                    data.history.forEach(msg => {
-                        const isUser = msg.role === 'user';
-                        appendChatDOM(msg.content, isUser);
-                    });
-                }
-            })
+            .then(data => renderChatHistory(data.history))
             .catch(err => console.error("Error loading chat:", err));
     }
 
+    function renderChatHistory(history) {
+        if (!messagesContainer) return;
+        if (history && history.length > 0) {
+            messagesContainer.innerHTML = '';
+            history.forEach(msg => {
+                const isUser = msg.role === 'user';
+                appendChatDOM(msg.content, isUser);
+            });
+        }
+    }
+
     function appendChatDOM(text, isUser) {
         if (!messagesContainer) return;
         const div = document.createElement('div');
@@ -96,14 +112,19 @@ document.addEventListener('DOMContentLoaded', () => {
             div.style.background = 'white';
             div.style.borderBottomLeftRadius = '4px';
             div.style.maxWidth = '85%';
-            if (window.marked && window.marked.parse) {
-                div.innerHTML = window.DOMPurify.sanitize(window.marked.parse(text));
-            } else {
-                div.innerHTML = window.DOMPurify.sanitize(text.replace(/\n/g, '<br>'));
-            }
+            renderAIText(div, text);
         }
         messagesContainer.appendChild(div);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return div;
+    }
+
+    function renderAIText(div, text) {
+        if (window.marked && window.marked.parse) {
+            div.innerHTML = window.DOMPurify.sanitize(window.marked.parse(text));
+        } else {
+            div.innerHTML = window.DOMPurify.sanitize(text.replace(/\n/g, '<br>'));
+        }
     }
 
     function sendChatMessage() {
@@ -114,19 +135,53 @@ document.addEventListener('DOMContentLoaded', () => {
         chatInput.value = '';
         typingIndicator.classList.remove('d-none');
 
-        sendChatMessageAPI(text, false)
-            .then(data => {
+        // Render the reply token-by-token as the SSE deltas arrive
+        let bubble = null;
+        let bubbleText = '';
+        let renderPending = false;
+        let finished = false;
+
+        function flushBubble() {
+            renderPending = false;
+            if (!bubble) return;
+            renderAIText(bubble, bubbleText);
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+
+        streamChatMessageAPI(text, event => {
+            if (event.type === 'delta') {
                 typingIndicator.classList.add('d-none');
-                if (data.reply) {
-                    appendChatDOM(data.reply, false);
-                    if (data.quest_added && data.quest) {
-                        OriaState.quests.push(data.quest);
-                        renderQuests();
-                        appendChatDOM(`SYSTEM ALERT: Saved new quest "${data.quest.title}" to your active quests!`, false);
-                    }
-                } else {
-                    appendChatDOM("Error communicating with Neural Link.", false);
+                bubbleText += event.content;
+                if (!bubble) bubble = appendChatDOM(bubbleText, false);
+                if (!renderPending) {
+                    renderPending = true;
+                    requestAnimationFrame(flushBubble);
+                }
+            } else if (event.type === 'quest') {
+                OriaState.quests.push(event.quest);
+                renderQuests();
+                appendChatDOM(`SYSTEM ALERT: Saved new quest "${event.quest.title}" to your active quests!`, false);
+                // The follow-up reply streams into a fresh bubble
+                bubble = null;
+                bubbleText = '';
+            } else if (event.type === 'done') {
+                finished = true;
+                typingIndicator.classList.add('d-none');
+                if (bubble) {
+                    bubbleText = event.reply || bubbleText;
+                    flushBubble();
+                } else if (event.reply) {
+                    appendChatDOM(event.reply, false);
                 }
+            } else if (event.type === 'error') {
+                finished = true;
+                typingIndicator.classList.add('d-none');
+                appendChatDOM("Error communicating with Neural Link.", false);
+            }
+        })
+            .then(() => {
+                typingIndicator.classList.add('d-none');
+                if (!finished) appendChatDOM("Connection lost. Neural link severed.", false);
             })
             .catch(err => {
                 typingIndicator.classList.add('d-none');
@@ -974,12 +974,13 @@ function openModuleView(qIndex, tIndex) {
             const badge = e.target.nextElementSibling.querySelector('.badge-xp');
             if (badge) badge.style.display = 'none';
 
-            await addXP(10);
+            // Not awaited: the awards and the state save below go out as one batch
+            addXP(10);
 
             if (task.micro_steps.every(step => step.completed) && !task.completed) {
                 task.completed = true;
                 if (task.xp_reward) {
-                    await addXP(task.xp_reward);
+                    addXP(task.xp_reward);
                 }
             }
 
@@ -1289,7 +1290,7 @@ export async function checkQuestCompletion(qIndex) {
     if (allDone) {
         quest.completed = true;
         const masterReward = quest.xp_reward || (quest.sub_tasks.length * 50);
-        await addXP(masterReward);
+        addXP(masterReward);
 
         OriaAudio.playSuccess();
         showCyberToast('Quest Completed! 🎉', `You earned +${masterReward} XP`, 'success');
@@ -1307,7 +1308,7 @@ export async function completeTask(qIndex, tIndex) {
     if (task && !task.completed) {
         OriaAudio.playSuccess();
         task.completed = true;
-        await addXP(task.xp_reward || 50);
+        addXP(task.xp_reward || 50);
 
         await checkQuestCompletion(qIndex);
 
@@ -1697,6 +1698,41 @@ window.showStats = function (e) {
     renderLeaderboard();
 };
 
+function leaderboardRow(user, rank) {
+    const isCurrentUser = user.is_current_user;
+    const rowBlock = document.createElement('div');
+
+    // Add specific styling for current user
+    if (isCurrentUser) {
+        rowBlock.className = 'list-group-item d-flex justify-content-between align-items-center p-3 current-user-row';
+        rowBlock.style.background = 'rgba(137, 175, 240, 0.1)';
+        rowBlock.style.borderBottom = '1px solid var(--glass-border-solid)';
+    } else {
+        rowBlock.className = 'list-group-item d-flex justify-content-between align-items-center p-3 other-user-row';
+        rowBlock.style.background = 'transparent';
+        rowBlock.style.borderBottom = '1px solid var(--glass-border-solid)';
+    }
+
+    const rankClass = rank === 1 ? 'text-warning' : (rank === 2 ? 'text-secondary' : (rank === 3 ? 'text-success' : 'text-muted'));
+    const nameClass = isCurrentUser ? 'text-primary' : 'text-main';
+    // Use the title the user has explicitly equipped (from backend)
+    const title = user.equipped_title || '';
+    const titleHtml = title
+        ? `<span class="badge rounded-pill ms-1 fw-bold" style="background: var(--primary-gradient); font-size: 0.7rem;">${title}</span>`
+        : '';
+
+    rowBlock.innerHTML = `
+        <div class="d-flex align-items-center gap-3">
+            <span class="fs-4 fw-bold ${rankClass}">${rank}</span>
+            <div>
+                <h6 class="mb-0 fw-bold ${nameClass} d-flex align-items-center gap-1">${user.username}${isCurrentUser ? ` ${window.t('txt_you')}` : ''} ${title ? `<span class="badge rounded-pill fw-bold leaderboard-title-badge ${isCurrentUser ? 'leaderboard-current-user-title' : ''}" style="background: var(--primary-gradient); font-size: 0.68rem; vertical-align: middle;">${title}</span>` : (isCurrentUser ? `<span class="leaderboard-current-user-title" style="display:none;"></span>` : '')}</h6>
+                <small class="${isCurrentUser ? 'text-primary' : 'text-muted'}">Lvl ${user.level} • ${user.xp} XP •  🔥 ${user.current_streak || 0} ${window.t('txt_days')}</small>
+            </div>
+        </div>
+    `;
+    return rowBlock;
+}
+
 async function renderLeaderboard() {
     const listContainer = document.getElementById('leaderboard-list-container');
     if (!listContainer) return;
@@ -1708,39 +1744,20 @@ async function renderLeaderboard() {
         if (data.leaderboard) {
             listContainer.innerHTML = '';
             data.leaderboard.forEach((user, index) => {
-                const isCurrentUser = user.is_current_user;
-                const rowBlock = document.createElement('div');
-
-                // Add specific styling for current user
-                if (isCurrentUser) {
-                    rowBlock.className = 'list-group-item d-flex justify-content-between align-items-center p-3 current-user-row';
-                    rowBlock.style.background = 'rgba(137, 175, 240, 0.1)';
-                    rowBlock.style.borderBottom = '1px solid var(--glass-border-solid)';
-                } else {
-                    rowBlock.className = 'list-group-item d-flex justify-content-between align-items-center p-3 other-user-row';
-                    rowBlock.style.background = 'transparent';
-                    rowBlock.style.borderBottom = '1px solid var(--glass-border-solid)';
-                }
-
-                const rankClass = index === 0 ? 'text-warning' : (index === 1 ? 'text-secondary' : (index === 2 ? 'text-success' : 'text-muted'));
-                const nameClass = isCurrentUser ? 'text-primary' : 'text-main';
-                // Use the title the user has explicitly equipped (from backend)
-                const title = user.equipped_title || '';
-                const titleHtml = title
-                    ? `<span class="badge rounded-pill ms-1 fw-bold" style="background: var(--primary-gradient); font-size: 0.7rem;">${title}</span>`
-                    : '';
-
-                rowBlock.innerHTML = `
-                    <div class="d-flex align-items-center gap-3">
-                        <span class="fs-4 fw-bold ${rankClass}">${index + 1}</span>
-                        <div>
-                            <h6 class="mb-0 fw-bold ${nameClass} d-flex align-items-center gap-1">${user.username}${isCurrentUser ? ` ${window.t('txt_you')}` : ''} ${title ? `<span class="badge rounded-pill fw-bold leaderboard-title-badge ${isCurrentUser ? 'leaderboard-current-user-title' : ''}" style="background: var(--primary-gradient); font-size: 0.68rem; vertical-align: middle;">${title}</span>` : (isCurrentUser ? `<span class="leaderboard-current-user-title" style="display:none;"></span>` : '')}</h6>
-                            <small class="${isCurrentUser ? 'text-primary' : 'text-muted'}">Lvl ${user.level} • ${user.xp} XP •  🔥 ${user.current_streak || 0} ${window.t('txt_days')}</small>
-                        </div>
-                    </div>
-                `;
-                listContainer.appendChild(rowBlock);
+                listContainer.appendChild(leaderboardRow(user, user.rank ?? index + 1));
             });
+
+            // Off the board: show where the user stands, with their neighbours
+            if (data.me && !data.leaderboard.some(user => user.is_current_user)) {
+                const gap = document.createElement('div');
+                gap.className = 'list-group-item text-center text-muted p-1';
+                gap.style.background = 'transparent';
+                gap.textContent = '⋯';
+                listContainer.appendChild(gap);
+                (data.around || [data.me]).forEach(user => {
+                    listContainer.appendChild(leaderboardRow(user, user.rank));
+                });
+            }
         }
     } catch (err) {
         listContainer.innerHTML = `<div class="text-center p-3 text-danger"><small>${window.t('txt_failed_leaderboard')}</small></div>`;
@@ -1,10 +1,11 @@
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
 
 # Load the environment variables from config.env
 load_dotenv('config.env')
 
+from services.openai_client import get_client, OPENAI_MODEL
+
 def test_openai_api():
     api_key = os.environ.get("OPENAI_API_KEY")
     
@@ -16,10 +17,10 @@ def test_openai_api():
     print("✅ Found API Key. Attempting to connect to OpenAI...")
     
     try:
-        client = OpenAI(api_key=api_key)
+        client = get_client()
         
         response = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "You are a helpful assistant."},
                 {"role": "user", "content": "Say 'Neural Link Online' if you can hear me."}
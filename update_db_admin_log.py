@@ -0,0 +1,46 @@
+"""
+Migration: Add the audit log filter indexes and the AdminLogFacet table, and
+count the existing log entries into it.
+Run once: python update_db_admin_log.py
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from models import AdminLog, AdminLogFacet
+from sqlalchemy import inspect
+
+def migrate():
+    with app.app_context():
+        existing_indexes = {ix['name'] for ix in inspect(db.engine).get_indexes('admin_log')}
+        for index in AdminLog.__table__.indexes:
+            if index.name in existing_indexes:
+                print(f"ℹ️  '{index.name}' index already exists, skipping.")
+            else:
+                index.create(db.engine)
+                print(f"✅ Created '{index.name}' index.")
+
+        db.create_all()
+        # Recount from scratch: the app creates the table at startup and may
+        # have counted a few new entries already
+        AdminLogFacet.query.delete()
+        for kind, value_col, label_col in (('action', AdminLog.action, AdminLog.action),
+                                           ('admin', AdminLog.admin_id, db.func.max(AdminLog.admin_name))):
+            rows = db.session.execute(
+                db.select(value_col, label_col, db.func.count(AdminLog.id)).group_by(value_col)
+            ).all()
+            for value, label, count in rows:
+                db.session.add(AdminLogFacet(kind=kind, value=str(value), label=label, count=count))
+            print(f"✅ Counted {len(rows)} {kind} facet(s).")
+        db.session.commit()
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,60 @@
+"""
+Migration: Move chat history from the User.chat_history JSON blob into the
+append-only ChatMessage table and add the 'chat_summary_upto' column.
+Run once: python update_db_chat_messages.py
+(Users not migrated here are moved lazily on their next chat request.)
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from models import User
+from services import chat_context
+from sqlalchemy import text, inspect
+
+BATCH_SIZE = 200
+
+def migrate():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing_columns = [col['name'] for col in inspector.get_columns('user')]
+
+        with db.engine.connect() as conn:
+            if 'chat_summary_upto' not in existing_columns:
+                conn.execute(text("ALTER TABLE user ADD COLUMN chat_summary_upto INTEGER"))
+                conn.commit()
+                print("✅ Added 'chat_summary_upto' column to User table.")
+            else:
+                print("ℹ️  'chat_summary_upto' column already exists, skipping.")
+
+        db.create_all()
+        print("✅ ChatMessage table is in place.")
+
+        moved = 0
+        last_id = 0
+        while True:
+            users = User.query.filter(User.id > last_id, User.chat_history.notin_(['', '[]'])) \
+                .order_by(User.id).limit(BATCH_SIZE).all()
+            if not users:
+                break
+            for user in users:
+                if chat_context.ensure_backfilled(user):
+                    moved += 1
+            last_id = users[-1].id
+            db.session.expunge_all()
+
+        if moved:
+            print(f"✅ Moved chat history of {moved} user(s) into ChatMessage.")
+        else:
+            print("ℹ️  No chat history blobs left to migrate, skipping.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
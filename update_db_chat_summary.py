@@ -0,0 +1,33 @@
+"""
+Migration: Add the 'chat_summary' column to the User table.
+Run once: python update_db_chat_summary.py
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from sqlalchemy import text, inspect
+
+def migrate():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing_columns = [col['name'] for col in inspector.get_columns('user')]
+
+        with db.engine.connect() as conn:
+            if 'chat_summary' not in existing_columns:
+                conn.execute(text("ALTER TABLE user ADD COLUMN chat_summary TEXT"))
+                conn.commit()
+                print("✅ Added 'chat_summary' column to User table.")
+            else:
+                print("ℹ️  'chat_summary' column already exists, skipping.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
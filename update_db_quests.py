@@ -0,0 +1,49 @@
+"""
+Migration: Move quests from the User.quests JSON blob into the
+Quest / SubTask / MicroStep tables.
+Run once: python update_db_quests.py
+(Users not migrated here are moved lazily on their next request.)
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from models import User
+from services import quest_store
+
+BATCH_SIZE = 200
+
+def migrate():
+    with app.app_context():
+        db.create_all()
+        print("✅ Quest / SubTask / MicroStep tables are in place.")
+
+        moved = 0
+        last_id = 0
+        while True:
+            users = User.query.filter(User.id > last_id, User.quests.notin_(['', '[]'])) \
+                .order_by(User.id).limit(BATCH_SIZE).all()
+            if not users:
+                break
+            for user in users:
+                if quest_store.ensure_backfilled(user):
+                    moved += 1
+            db.session.commit()
+            last_id = users[-1].id
+            db.session.expunge_all()
+
+        if moved:
+            print(f"✅ Moved quests of {moved} user(s) into the new tables.")
+        else:
+            print("ℹ️  No quest blobs left to migrate, skipping.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
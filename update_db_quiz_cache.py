@@ -0,0 +1,41 @@
+"""
+Migration: Add the 'style' column to the QuizCacheEntry table (bot and web
+quizzes are cached separately) and include it in the lookup index.
+Cached quizzes of unknown style are dropped; the cache refills on demand.
+Run once: python update_db_quiz_cache.py
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from sqlalchemy import text, inspect
+
+def migrate():
+    with app.app_context():
+        db.create_all()
+        inspector = inspect(db.engine)
+        existing_columns = [col['name'] for col in inspector.get_columns('quiz_cache_entry')]
+
+        with db.engine.connect() as conn:
+            if 'style' not in existing_columns:
+                conn.execute(text("DELETE FROM quiz_cache_entry"))
+                conn.execute(text("ALTER TABLE quiz_cache_entry ADD COLUMN style VARCHAR(8) DEFAULT 'web' NOT NULL"))
+                conn.execute(text("DROP INDEX IF EXISTS idx_quizcache_key"))
+                conn.execute(text(
+                    "CREATE INDEX idx_quizcache_key ON quiz_cache_entry (topic_key, language, style, created_at)"
+                ))
+                conn.commit()
+                print("✅ Added 'style' column to QuizCacheEntry and cleared the cached quizzes.")
+            else:
+                print("ℹ️  'style' column already exists, skipping.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
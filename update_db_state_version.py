@@ -0,0 +1,34 @@
+"""
+Migration: Add the 'state_version' column to the User table (the version of
+the user's state document that /api/user/patch checks JSON Patches against).
+Run once: python update_db_state_version.py
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from sqlalchemy import text, inspect
+
+def migrate():
+    with app.app_context():
+        inspector = inspect(db.engine)
+        existing_columns = [col['name'] for col in inspector.get_columns('user')]
+
+        with db.engine.connect() as conn:
+            if 'state_version' not in existing_columns:
+                conn.execute(text("ALTER TABLE user ADD COLUMN state_version INTEGER DEFAULT 0 NOT NULL"))
+                conn.commit()
+                print("✅ Added 'state_version' column to User table.")
+            else:
+                print("ℹ️  'state_version' column already exists, skipping.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,35 @@
+"""
+Migration: Build the admin user search index (FTS5 trigram table + sync
+triggers on SQLite, pg_trgm GIN indexes on Postgres).
+Run once: python update_db_user_search.py
+(The app also creates a missing index at startup; running this again
+re-reads every user into the SQLite index.)
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from services import user_search
+
+def migrate():
+    with app.app_context():
+        if not user_search.ensure_index():
+            print("ℹ️  No search index for this database — admin search uses ILIKE.")
+            return
+        print("✅ User search index is in place.")
+
+        if db.engine.dialect.name == 'sqlite':
+            user_search.rebuild()
+            db.session.commit()
+            print("✅ Rebuilt the user_search table from the user table.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()
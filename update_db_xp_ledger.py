@@ -0,0 +1,35 @@
+"""
+Migration: Create the XP ledger tables (XPEvent, XPRollup, XPRollupCursor).
+Run once: python update_db_xp_ledger.py
+(XP earned before this has no per-day history — windowed leaderboards start
+counting from the first award after the migration.)
+"""
+import os
+
+# Importing app auto-starts the AI job workers, the scheduler and the bot —
+# this script must start none of them (they would query columns it may not
+# have added yet).
+os.environ['AI_JOB_WORKERS'] = '0'
+os.environ['SCHEDULER_ENABLED'] = '0'
+os.environ['BOT_TOKEN'] = ''
+
+from app import app, db
+from sqlalchemy import inspect
+
+TABLES = ('xp_event', 'xp_rollup', 'xp_rollup_cursor')
+
+def migrate():
+    with app.app_context():
+        existing_tables = inspect(db.engine).get_table_names()
+
+        db.create_all()
+        for table in TABLES:
+            if table in existing_tables:
+                print(f"ℹ️  '{table}' table already exists, skipping.")
+            else:
+                print(f"✅ Created '{table}' table.")
+
+        print("\n🎉 Migration complete!")
+
+if __name__ == '__main__':
+    migrate()